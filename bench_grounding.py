@@ -0,0 +1,195 @@
+"""
+KG Grounding 性能基准：trigram 索引 vs. 线性 extractOne
+
+用法:
+    python bench_grounding.py                       # 默认 10k / 100k / 1M
+    python bench_grounding.py --sizes 10000 100000 --queries 200
+    python bench_grounding.py --linear-max 100000   # 只在 <=100k 的词表上跑线性扫描对照
+    python bench_grounding.py --processes 1 2 4     # 多进程批量校准的吞吐与每个工作进程的内存
+
+线性扫描在 1M 词表上单次查询需要数十秒，默认只在 <= 100k 的词表上跑。
+"""
+import argparse
+import random
+import string
+import sys
+import os
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from fuzzywuzzy import process
+from src.fuzzy_index import NgramIndex
+from src.grounding_pool import GroundingPool
+from src import kg_snapshot
+
+# 用来拼接合成词表的地质学词根，让词的分布更接近真实图谱
+ROOTS = [
+    "granite", "basalt", "andesite", "rhyolite", "gabbro", "peridotite", "schist",
+    "gneiss", "marble", "quartz", "feldspar", "olivine", "pyroxene", "mantle",
+    "crust", "ridge", "basin", "fault", "plate", "tectonics", "magma", "lava",
+    "sediment", "volcano", "zircon", "isotope", "subduction", "orogeny", "craton",
+]
+SUFFIXES = ["", " rock", " formation", " province", " complex", " zone", " belt", " suite"]
+
+
+def make_vocab(size, seed=42):
+    """生成 size 个互不相同的合成术语"""
+    rng = random.Random(seed)
+    vocab = set()
+    while len(vocab) < size:
+        word = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 8)))
+        parts = [rng.choice(ROOTS).capitalize(), word]
+        rng.shuffle(parts)
+        vocab.add(" ".join(parts) + rng.choice(SUFFIXES))
+    return list(vocab)
+
+
+def make_typo(term, rng):
+    """随机删除/替换/交换一个字符，模拟用户拼写错误"""
+    chars = list(term)
+    i = rng.randrange(len(chars))
+    op = rng.choice(["delete", "replace", "swap"])
+    if op == "delete" and len(chars) > 3:
+        del chars[i]
+    elif op == "swap" and i < len(chars) - 1:
+        chars[i], chars[i + 1] = chars[i + 1], chars[i]
+    else:
+        chars[i] = rng.choice(string.ascii_lowercase)
+    return "".join(chars)
+
+
+def bench(size, n_queries, linear_max):
+    rng = random.Random(size)
+    vocab = make_vocab(size)
+    queries = [make_typo(rng.choice(vocab), rng) for _ in range(n_queries)]
+
+    t0 = time.perf_counter()
+    index = NgramIndex.build(vocab)
+    build_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    indexed = [index.extract_one(q) for q in queries]
+    index_ms = (time.perf_counter() - t0) / n_queries * 1000
+
+    # 批量校准必须与逐个校准给出完全相同的结果 (同一个打分器决定)
+    t0 = time.perf_counter()
+    batched = index.extract_batch(queries)
+    batch_ms = (time.perf_counter() - t0) / n_queries * 1000
+    batch_same = sum(a == b for a, b in zip(indexed, batched)) / n_queries
+
+    row = {"size": size, "build_s": build_s, "index_ms": index_ms, "batch_ms": batch_ms,
+           "batch_same": batch_same, "linear_ms": None, "agree": None}
+
+    if size <= linear_max:
+        # 线性扫描很慢，只抽一部分查询做对照
+        sample = queries[:max(1, min(n_queries, 20))]
+        t0 = time.perf_counter()
+        linear = [process.extractOne(q, vocab) for q in sample]
+        row["linear_ms"] = (time.perf_counter() - t0) / len(sample) * 1000
+        # 另外几类查询也一起对照：
+        # - 两个字母的缩写 (元素/矿物符号) 没有 trigram，走单独的路径
+        # - 词序颠倒的术语 ("zircon granite dating")，靠 token_sort / token_set 得分
+        # - 几个词根拼起来的多词查询，最佳匹配往往与查询共享的 trigram 并不多
+        extra = [rng.choice(vocab)[:2] for _ in range(5)]
+        extra += [" ".join(reversed(rng.choice(vocab).split())) for _ in range(5)]
+        extra += [" ".join(rng.sample(ROOTS, 2) + [rng.choice(vocab).split()[-1]]) for _ in range(5)]
+        linear += [process.extractOne(q, vocab) for q in extra]
+        indexed = indexed[:len(sample)] + [index.extract_one(q) for q in extra]
+        # 一致性：匹配词和分数都必须相同 (同分时两边都取词表里靠前的词)
+        row["agree"] = sum(a == b for a, b in zip(indexed, linear)) / len(linear)
+
+    return row
+
+
+def worker_memory_mb(pid):
+    """工作进程的 PSS (共享页按进程数均摊) 与私有内存，单位 MB；只支持 Linux"""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[1].isdigit():
+                    fields[parts[0].rstrip(':')] = int(parts[1])
+    except OSError:
+        return None, None
+    private = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    return fields.get("Pss", 0) / 1024, private / 1024
+
+
+def bench_processes(size, n_queries, process_counts, cache_dir):
+    """
+    把词表写成 mmap 快照，用 GroundingPool 批量校准，报告吞吐与每个工作进程的内存。
+    processes=0 表示在当前进程里直接 extract_batch 作为对照。
+    """
+    rng = random.Random(size)
+    vocab = make_vocab(size)
+    queries = [make_typo(rng.choice(vocab), rng) for _ in range(n_queries)]
+
+    kg_snapshot.Config.KG_CACHE_DIR = cache_dir
+    data_path = os.path.join(cache_dir, f"bench_{size}.parquet")
+    os.makedirs(cache_dir, exist_ok=True)
+    if not os.path.exists(data_path):
+        # save() 只需要源文件的 stat/哈希，写一个占位文件即可
+        with open(data_path, "wb") as f:
+            f.write(str(size).encode())
+    terms = kg_snapshot.TermTable.from_terms(vocab)
+    kg_snapshot.save(data_path, terms, NgramIndex.build(terms))
+    _, index, _ = kg_snapshot.load(data_path)
+
+    rows = []
+    for processes in process_counts:
+        row = {"processes": processes, "pss_mb": None, "private_mb": None}
+        if processes == 0:
+            t0 = time.perf_counter()
+            index.extract_batch(queries)
+            row["qps"] = n_queries / (time.perf_counter() - t0)
+        else:
+            pool = GroundingPool(index, processes)
+            # 预热：等所有工作进程启动并挂载好词表
+            pool.extract_batch(queries[:processes * 4])
+            t0 = time.perf_counter()
+            pool.extract_batch(queries)
+            row["qps"] = n_queries / (time.perf_counter() - t0)
+            mem = [worker_memory_mb(pid) for pid in pool.worker_pids()]
+            if mem and mem[0][0] is not None:
+                row["pss_mb"] = sum(m[0] for m in mem) / len(mem)
+                row["private_mb"] = sum(m[1] for m in mem) / len(mem)
+            pool.close()
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="KG grounding latency benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--linear-max", type=int, default=100_000)
+    parser.add_argument("--processes", type=int, nargs="+", default=None,
+                        help="测试多进程批量校准的进程数 (0 = 当前进程)")
+    parser.add_argument("--cache-dir", default="data/.kg_cache/bench")
+    args = parser.parse_args()
+
+    if args.processes:
+        print(f"CPU cores: {os.cpu_count()}")
+        print(f"{'vocab':>9} | {'procs':>5} | {'queries/s':>9} | {'PSS/worker(MB)':>14} | {'private/worker(MB)':>18}")
+        print("-" * 68)
+        for size in args.sizes:
+            for r in bench_processes(size, args.queries, args.processes, args.cache_dir):
+                pss = f"{r['pss_mb']:.1f}" if r["pss_mb"] is not None else "-"
+                private = f"{r['private_mb']:.1f}" if r["private_mb"] is not None else "-"
+                print(f"{size:>9} | {r['processes']:>5} | {r['qps']:>9.1f} | {pss:>14} | {private:>18}")
+        return
+
+    print(f"{'vocab':>9} | {'build(s)':>8} | {'index(ms/q)':>11} | {'batch(ms/q)':>11} | {'batch = one':>11} | "
+          f"{'linear(ms/q)':>12} | {'agree':>11}")
+    print("-" * 92)
+    for size in args.sizes:
+        r = bench(size, args.queries, args.linear_max)
+        linear = f"{r['linear_ms']:.1f}" if r["linear_ms"] is not None else "-"
+        agree = f"{r['agree']:.0%}" if r["agree"] is not None else "-"
+        print(f"{r['size']:>9} | {r['build_s']:>8.2f} | {r['index_ms']:>11.2f} | {r['batch_ms']:>11.2f} | "
+              f"{r['batch_same']:>11.0%} | {linear:>12} | {agree:>11}")
+
+
+if __name__ == "__main__":
+    main()
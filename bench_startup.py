@@ -0,0 +1,270 @@
+"""
+KGLinker 启动耗时基准：旧的 pandas 去重流程 vs. 快照冷启动/热启动
+
+用法:
+    python bench_startup.py                  # 默认 1M 条三元组
+    python bench_startup.py --triples 200000
+    python bench_startup.py --memory         # 词表构建的峰值 RSS / 常驻内存: pandas+set vs. Arrow 流式
+    python bench_startup.py --first-result   # 交互式启动: 同步加载 vs. 快速启动 (FAST_START)，
+                                             # 到第一个提示符 / 到第一条结果的耗时 (Mock LLM / Acemap)
+    python bench_startup.py --ingest 0.01    # 增量导入占基础数据 1% 的分片 vs. 全量重建，以及后台合并的耗时
+
+会在临时目录生成一个合成 GAKG parquet，并把快照缓存也放在临时目录，不影响 data/。
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import pandas as pd
+from bench_grounding import make_vocab
+from src.config import Config
+
+RELATIONS = ["is_a", "related_to", "part_of", "synonym_of"]
+
+# --first-result 的子进程脚本：从解释器里第一行代码开始计时 (包含导入)，
+# 与 interactive_demo.py 一样初始化 Agent，等待 think 秒 (模拟用户输入)，
+# 再跑一条需要 LLM + KG 校准的查询并检索
+FIRST_RESULT_SCRIPT = """
+import time
+t0 = time.perf_counter()
+import json, sys
+sys.path.append(sys.argv[1])
+from src.agent import SearchAgent, search_keywords, expansion_keywords
+from src.config import Config
+from src.retrieval import fused_search
+agent = SearchAgent(fast_start=Config.FAST_START)
+t_prompt = time.perf_counter() - t0
+time.sleep(float(sys.argv[3]))
+query = sys.argv[2]
+t1 = time.perf_counter()
+output = agent.parse(query)
+fused = fused_search(agent.acemap, search_keywords(output, query), output["filters"],
+                     expansions=expansion_keywords(output), per_keyword=20, limit=20)
+print(json.dumps({"prompt_s": t_prompt, "query_s": time.perf_counter() - t1,
+                  "result_s": time.perf_counter() - t0, "keywords": search_keywords(output, query)}))
+"""
+
+
+def make_kg_parquet(path, n_triples, seed=42):
+    """生成 subject/relation/object/paperid 结构的合成三元组 (词表约为三元组数的一半)"""
+    rng = random.Random(seed)
+    vocab = make_vocab(max(10, n_triples // 2), seed=seed)
+    df = pd.DataFrame({
+        "subject": [rng.choice(vocab) for _ in range(n_triples)],
+        "relation": [rng.choice(RELATIONS) for _ in range(n_triples)],
+        "object": [rng.choice(vocab) for _ in range(n_triples)],
+        "paperid": [rng.randrange(10**9) for _ in range(n_triples)],
+    })
+    df.to_parquet(path, engine='pyarrow', index=False)
+
+
+def legacy_load(path):
+    """基线实现：每次启动都 pandas 读取 + set 去重 + list"""
+    df = pd.read_parquet(path, engine='pyarrow', columns=['subject', 'object'])
+    vocab_set = set(df['subject'].dropna().unique()) | set(df['object'].dropna().unique())
+    return list(vocab_set)
+
+
+def rss_mb():
+    """当前进程的常驻内存 (MB)，读 /proc，只支持 Linux"""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def peak_rss_mb():
+    """进程的 RSS 峰值 (VmHWM)；ru_maxrss 在 Linux 上会从父进程继承，不能用"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def measure_vocab_memory(method, path):
+    """
+    在子进程里调用：构建词表并输出 JSON {"peak_mb", "steady_mb", "terms"}。
+    peak 是相对构建前基线的峰值增量，steady 是构建完成、临时对象回收后仍占用的内存。
+    """
+    from src import kg_snapshot
+
+    gc.collect()
+    base = rss_mb()
+    if method == "legacy":
+        vocab = legacy_load(path)
+    else:
+        vocab = kg_snapshot.read_term_table(path)
+    gc.collect()
+    steady = rss_mb() - base
+    peak = peak_rss_mb() - base
+    print(json.dumps({"peak_mb": peak, "steady_mb": steady, "terms": len(vocab)}))
+
+
+def compare_memory(path):
+    """每种方式各起一个干净的子进程，避免 ru_maxrss 互相影响"""
+    print(f"{'method':>22} | {'terms':>9} | {'peak +MB':>9} | {'steady +MB':>10}")
+    print("-" * 60)
+    for method, label in [("legacy", "pandas + set + list"), ("arrow", "Arrow streaming")]:
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--measure", method, str(path)],
+                             capture_output=True, text=True, check=True).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        print(f"{label:>22} | {r['terms']:>9} | {r['peak_mb']:>9.1f} | {r['steady_mb']:>10.1f}")
+
+
+def compare_first_result(data_path, cache_dir, llm_latency, think, runs=3):
+    """
+    同步加载 vs. 快速启动，快照热启动 / 冷启动 (parquet 刚更新) 各测一遍；
+    每种组合起 runs 个干净的子进程，取中位数。
+    prompt = 脚本开始到 SearchAgent 构造完成 (交互演示显示提示符的时刻)，
+    query  = 用户提交第一条查询到检索结果返回，
+    result = 脚本开始到第一条结果 (含 think 秒的模拟输入时间)。
+    """
+    from src.kg_linker import KGLinker
+    from src.mock_servers import MockOpenAIServer, MockAcemapServer
+
+    Config.DATA_PATH = data_path
+    Config.KG_CACHE_DIR = cache_dir
+    linker = KGLinker()  # 先把快照建好，子进程里都是热启动
+    query = linker.vocab[len(linker.vocab) // 3][:-1]  # 去掉最后一个字母，词表里没有，规则解析不了
+    linker.close()
+
+    with MockOpenAIServer(latency=llm_latency) as llm, MockAcemapServer() as acemap:
+        env = dict(os.environ, GAKG_PATH=str(data_path), KG_CACHE_DIR=str(cache_dir),
+                   OPENAI_API_KEY="bench", OPENAI_BASE_URL=llm.base_url, ACEMAP_API_URL=acemap.search_url,
+                   INTENT_CACHE="off", GROUNDING_MEMO="off", DEBUG_LOG="off")
+        root = os.path.dirname(os.path.abspath(__file__))
+        print(f"query: {query!r}, LLM latency {llm_latency}s, think time {think}s, median of {runs} runs")
+        print(f"{'snapshot':>8} | {'mode':>10} | {'first prompt':>12} | {'first query':>11} | {'first result':>12}")
+        print("-" * 66)
+        for snapshot in ("warm", "cold"):
+            for mode in ("off", "on"):
+                samples = []
+                for _ in range(runs):
+                    if snapshot == "cold":
+                        shutil.rmtree(cache_dir, ignore_errors=True)
+                    out = subprocess.run([sys.executable, "-c", FIRST_RESULT_SCRIPT, root, query, str(think)],
+                                         env=dict(env, FAST_START=mode), capture_output=True, text=True,
+                                         check=True)
+                    samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+                median = lambda key: sorted(s[key] for s in samples)[len(samples) // 2]
+                label = "fast start" if mode == "on" else "sync load"
+                print(f"{snapshot:>8} | {label:>10} | {median('prompt_s'):>10.3f} s | {median('query_s'):>9.3f} s | "
+                      f"{median('result_s'):>10.3f} s")
+
+
+def compare_ingest(data_path, cache_dir, n_triples, fraction):
+    """全量重建 (基础 + 分片) vs. 只为分片构建增量层，以及把增量层合并进快照；导入期间测一下查询延迟"""
+    import threading
+    from bench_grounding import make_typo
+    from src.kg_linker import KGLinker
+
+    shard_path = data_path.with_name("gakg_bench_shard.parquet")
+    make_kg_parquet(shard_path, max(10, int(n_triples * fraction)), seed=7)
+    combined_path = data_path.with_name("gakg_bench_all.parquet")
+    pd.concat([pd.read_parquet(data_path), pd.read_parquet(shard_path)]).to_parquet(combined_path, index=False)
+
+    Config.KG_CACHE_DIR = cache_dir
+    Config.GROUNDING_MEMO = "off"
+    Config.DATA_PATH = combined_path
+    _, t_full = timed(KGLinker)
+    Config.DATA_PATH = data_path
+    linker = KGLinker()
+
+    # 导入在后台线程进行，同时不断做校准，记录期间的单次校准延迟
+    rng = random.Random(1)
+    queries = [make_typo(linker.vocab[rng.randrange(len(linker.vocab))], rng) for _ in range(200)]
+    latencies, done = [], threading.Event()
+
+    def serve():
+        i = 0
+        while not done.is_set():
+            t0 = time.perf_counter()
+            linker.ground_keyword(queries[i % len(queries)])
+            latencies.append(time.perf_counter() - t0)
+            i += 1
+
+    server = threading.Thread(target=serve)
+    server.start()
+    added, t_ingest = timed(lambda: linker.ingest(shard_path))
+    done.set()
+    server.join()
+    _, t_compact = timed(linker.compact)
+    latencies.sort()
+
+    print()
+    print(f"shard size                        : {fraction:.1%} of {n_triples} triples, {len(added)} shard ingested")
+    print(f"full rebuild (base + shard)       : {t_full:8.3f} s")
+    print(f"incremental ingest (delta layer)  : {t_ingest:8.3f} s  ({t_ingest / t_full:.1%} of rebuild)")
+    print(f"compaction (merge into snapshot)  : {t_compact:8.3f} s")
+    print(f"grounding during ingest           : {len(latencies)} lookups, "
+          f"p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, max {latencies[-1] * 1000:.2f} ms")
+    linker.close()
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="KGLinker startup benchmark")
+    parser.add_argument("--triples", type=int, default=1_000_000)
+    parser.add_argument("--memory", action="store_true", help="比较词表构建的内存占用")
+    parser.add_argument("--first-result", action="store_true",
+                        help="比较同步加载与快速启动的首个提示符 / 首条结果耗时")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="--first-result 时 Mock LLM 的延迟 (秒)")
+    parser.add_argument("--ingest", type=float, metavar="FRACTION",
+                        help="比较增量导入 (分片占基础数据的比例) 与全量重建")
+    parser.add_argument("--think", type=float, default=2.0,
+                        help="--first-result 时模拟用户输入第一条查询的时间 (秒)")
+    parser.add_argument("--measure", nargs=2, metavar=("METHOD", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure_vocab_memory(*args.measure)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = Path(tmp) / "gakg_bench.parquet"
+        print(f"Generating {args.triples} synthetic triples...")
+        make_kg_parquet(data_path, args.triples)
+
+        if args.memory:
+            compare_memory(data_path)
+            return
+        if args.ingest:
+            compare_ingest(data_path, Path(tmp) / "kg_cache", args.triples, args.ingest)
+            return
+        if args.first_result:
+            compare_first_result(data_path, Path(tmp) / "kg_cache", args.llm_latency, args.think)
+            return
+
+        Config.DATA_PATH = data_path
+        Config.KG_CACHE_DIR = Path(tmp) / "kg_cache"
+        from src.kg_linker import KGLinker
+
+        vocab, t_legacy = timed(lambda: legacy_load(data_path))
+        _, t_cold = timed(KGLinker)
+        linker, t_warm = timed(KGLinker)
+
+        print()
+        print(f"vocab size                        : {len(vocab)}")
+        print(f"legacy (pandas + set, no index)   : {t_legacy:8.3f} s")
+        print(f"snapshot cold start (build+write) : {t_cold:8.3f} s")
+        print(f"snapshot warm start (mmap)        : {t_warm:8.3f} s")
+        print(f"first lookup after warm start     : {timed(lambda: linker.ground_keyword('Grnite'))[1] * 1000:8.2f} ms")
+        hub = linker.vocab[len(linker.vocab) // 2]
+        print(f"2-hop expand after warm start     : {timed(lambda: linker.expand(hub, depth=2, limit=50))[1] * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""
+离线基准套件：SearchAgent 跑在本地 Mock LLM / Mock Acemap 和合成 KG 上，结果可复现、可对比。
+
+evaluate.py / compare_search.py 连的是线上服务，耗时里混着网络抖动。这里全部换成本地替身：
+- 合成 GAKG parquet (--triples 控制规模)，快照缓存放在临时目录
+- MockOpenAIServer 回放录制好的意图 (默认按查询模板生成，也可以用 --recordings 指定 JSONL)
+- MockAcemapServer 按关键词确定性地生成论文，延迟可配
+
+分阶段报告吞吐、p50/p95/p99 延迟和内存:
+    startup   SearchAgent 初始化 (快照冷构建)
+    parse     agent.parse (规则/LLM 提取 + KG 校准)，逐条串行
+    ground    kg.ground_keywords，逐条串行
+    search    fused_search (多关键词流式检索 + 过滤 + RRF)，逐条串行
+    pipeline  agent.batch(search=True) 并发跑完整条流水线
+
+用法:
+    python bench_suite.py                                   # 默认 20 万三元组、200 条查询
+    python bench_suite.py --triples 1000000 --queries 500 --llm-latency 0.2
+    python bench_suite.py --save-baseline                   # 把本次结果存为基线
+    python bench_suite.py --baseline bench_baseline.json    # 与基线对比，回退超过 --tolerance 时返回码为 1
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import numpy as np
+import pandas as pd
+from bench_grounding import make_typo
+from bench_startup import make_kg_parquet, rss_mb, peak_rss_mb
+from src.config import Config
+from src.mock_servers import MockOpenAIServer, MockAcemapServer, recorded_responder
+from src import tracing
+
+STAGES = ["startup", "parse", "ground", "search", "pipeline"]
+
+# 与基线对比的指标：(字段, 越大越好?)
+COMPARED_METRICS = [
+    ("throughput_qps", True),
+    ("p50_ms", False),
+    ("p95_ms", False),
+    ("p99_ms", False),
+    ("peak_rss_mb", False),
+]
+
+INSTITUTIONS = [
+    ("MIT", "Massachusetts Institute of Technology"),
+    ("CAS", "Chinese Academy of Sciences"),
+    ("Peking University", "Peking University"),
+]
+
+
+def make_queries(terms, n, seed=42, typo_ratio=0.7):
+    """
+    按模板生成 n 条查询及其"录制"意图 {查询: 意图}。
+    typo_ratio 的关键词带拼写错误 (需要 LLM + KG 校准)，其余是词表原词 (规则解析可能直接命中)。
+    """
+    rng = random.Random(seed)
+    recordings = {}
+    while len(recordings) < n:
+        picked = rng.sample(terms, rng.choice([1, 1, 2]))
+        keywords = [make_typo(t, rng) if rng.random() < typo_ratio else t for t in picked]
+        abbr, institution = rng.choice(INSTITUTIONS)
+        year = rng.randint(2005, 2022)
+        template = rng.randrange(4)
+        intent = {"keywords": keywords, "institution": None, "author": None,
+                  "year_start": None, "year_end": None}
+        if template == 0:
+            query = f"Find papers about {' and '.join(keywords)}"
+        elif template == 1:
+            query = f"{' and '.join(keywords)} research from {abbr} since {year}"
+            intent.update(institution=institution, year_start=year)
+        elif template == 2:
+            query = f"Recent studies on {' and '.join(keywords)}"
+            intent.update(year_start=2020)
+        else:
+            query = f"帮我找关于 {' 和 '.join(keywords)} 的论文"
+        recordings[query] = intent
+    return recordings
+
+
+def load_recordings(path):
+    """JSONL，每行 {"query": ..., "intent": {...}}"""
+    recordings = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                recordings[item["query"]] = item["intent"]
+    return recordings
+
+
+def reset_peak_rss():
+    """把 VmHWM 重置为当前 RSS (Linux >= 4.0)，这样可以分阶段测峰值；不支持时忽略"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def summarize(latencies, wall_s, rss_before):
+    lat = np.asarray(latencies, dtype=np.float64) * 1000
+    return {
+        "n": int(lat.size),
+        "throughput_qps": round(lat.size / wall_s, 2) if wall_s > 0 else None,
+        "mean_ms": round(float(lat.mean()), 3) if lat.size else None,
+        "p50_ms": round(float(np.percentile(lat, 50)), 3) if lat.size else None,
+        "p95_ms": round(float(np.percentile(lat, 95)), 3) if lat.size else None,
+        "p99_ms": round(float(np.percentile(lat, 99)), 3) if lat.size else None,
+        "rss_mb": round(rss_mb(), 1),
+        "rss_delta_mb": round(rss_mb() - rss_before, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def run_serial(fn, items):
+    """逐条执行 fn(item)，返回 (结果, 每条耗时, 总耗时, 起始 RSS)"""
+    reset_peak_rss()
+    rss_before = rss_mb()
+    results, latencies = [], []
+    start = time.perf_counter()
+    for item in items:
+        t0 = time.perf_counter()
+        results.append(fn(item))
+        latencies.append(time.perf_counter() - t0)
+    return results, latencies, time.perf_counter() - start, rss_before
+
+
+def run_suite(args):
+    from src.agent import SearchAgent, search_keywords, expansion_keywords
+    from src.retrieval import fused_search
+
+    stages = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = Path(tmp) / "gakg_bench.parquet"
+        print(f"Generating {args.triples} synthetic triples...")
+        make_kg_parquet(data_path, args.triples, seed=args.seed)
+        terms = sorted(set(pd.read_parquet(data_path, columns=["subject"])["subject"]))
+
+        recordings = load_recordings(args.recordings) if args.recordings else \
+            make_queries(terms, args.queries, seed=args.seed)
+        queries = list(recordings)[:args.queries]
+
+        # 全部走本地替身，并关掉会让重复运行结果不可比的缓存
+        Config.DATA_PATH = data_path
+        Config.KG_CACHE_DIR = Path(tmp) / "kg_cache"
+        Config.INTENT_CACHE = "off"
+        Config.ACEMAP_CACHE_SIZE = 0
+        # 校准结果缓存默认落盘 (KG_CACHE_DIR)：开着的话 ground 阶段测的是缓存命中而不是模糊匹配
+        Config.GROUNDING_MEMO = "off"
+        Config.API_KEY = Config.API_KEY or "bench"
+        tracing.set_debug(False)
+
+        llm = MockOpenAIServer(latency=args.llm_latency, responder=recorded_responder(recordings),
+                               chunk_delay=args.llm_chunk_delay)
+        acemap = MockAcemapServer(latency=args.acemap_latency)
+        with llm, acemap:
+            Config.BASE_URL = llm.base_url
+            Config.ACEMAP_API_URL = acemap.search_url
+
+            reset_peak_rss()
+            rss_before = rss_mb()
+            t0 = time.perf_counter()
+            agent = SearchAgent(concurrency=args.concurrency)
+            stages["startup"] = summarize([time.perf_counter() - t0], time.perf_counter() - t0, rss_before)
+
+            print(f"Running {len(queries)} queries (LLM latency {args.llm_latency}s, "
+                  f"Acemap latency {args.acemap_latency}s)...")
+            outputs, lat, wall, rss_before = run_serial(agent.parse, queries)
+            stages["parse"] = summarize(lat, wall, rss_before)
+
+            raw = [o["search_params"]["keywords_raw"] for o in outputs]
+            _, lat, wall, rss_before = run_serial(agent.kg.ground_keywords, raw)
+            stages["ground"] = summarize(lat, wall, rss_before)
+
+            def search(pair):
+                query, output = pair
+                return fused_search(agent.acemap, search_keywords(output, query), output["filters"],
+                                    expansions=expansion_keywords(output), per_keyword=20, limit=20)
+
+            _, lat, wall, rss_before = run_serial(search, list(zip(queries, outputs)))
+            stages["search"] = summarize(lat, wall, rss_before)
+
+            # 并发流水线：单条延迟取 tracing 里的 agent.aparse 样本
+            tracing.TRACER.reset()
+            reset_peak_rss()
+            rss_before = rss_mb()
+            t0 = time.perf_counter()
+            agent.batch(queries, search=True, stream=Config.LLM_STREAM)
+            wall = time.perf_counter() - t0
+            hist = tracing.TRACER.histograms.get("agent.aparse")
+            stages["pipeline"] = summarize(list(hist.recent) if hist else [], wall, rss_before)
+            stages["pipeline"]["n"] = len(queries)
+            stages["pipeline"]["throughput_qps"] = round(len(queries) / wall, 2)
+
+            counters = tracing.TRACER.snapshot()["counters"]
+            agent.kg.close()
+
+    return {
+        "meta": {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "params": {k: v for k, v in vars(args).items()
+                       if k not in ("output", "baseline", "save_baseline")},
+            "vocab_size": len(terms),
+            "llm_requests": llm.request_count,
+            "acemap_requests": acemap.request_count,
+        },
+        "stages": stages,
+        "pipeline_counters": counters,
+    }
+
+
+def compare(current, baseline, tolerance):
+    """返回 [(阶段, 指标, 基线值, 当前值, 变化比例, 是否回退)]"""
+    rows = []
+    for stage in STAGES:
+        cur, base = current["stages"].get(stage), baseline.get("stages", {}).get(stage)
+        if not cur or not base:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS:
+            old, new = base.get(metric), cur.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            regressed = change < -tolerance if higher_is_better else change > tolerance
+            rows.append((stage, metric, old, new, change, regressed))
+    return rows
+
+
+def print_report(result):
+    cols = ["n", "throughput_qps", "p50_ms", "p95_ms", "p99_ms", "rss_delta_mb", "peak_rss_mb"]
+    df = pd.DataFrame.from_dict(result["stages"], orient="index")[cols]
+    print()
+    print(df.to_string())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline SearchAgent benchmark suite")
+    parser.add_argument("--triples", type=int, default=200_000, help="合成 KG 的三元组数")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--recordings", default=None, help="录制的意图 (JSONL: query / intent)，默认按模板生成")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Mock LLM 每次请求的延迟 (秒)")
+    parser.add_argument("--llm-chunk-delay", type=float, default=0.0, help="流式输出每块的间隔 (秒)")
+    parser.add_argument("--acemap-latency", type=float, default=0.02, help="Mock Acemap 每次请求的延迟 (秒)")
+    parser.add_argument("--concurrency", type=int, default=16, help="pipeline 阶段同时处理的查询数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", default=None, help="与这个基线 JSON 对比")
+    parser.add_argument("--save-baseline", nargs="?", const="bench_baseline.json", default=None,
+                        help="把本次结果另存为基线 (默认 bench_baseline.json)")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="允许的相对变化，超过即视为回退 (默认 20%%)")
+    args = parser.parse_args()
+
+    result = run_suite(args)
+    print_report(result)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 结果已保存至 {args.output}")
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"✅ 基线已保存至 {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(result, baseline, args.tolerance)
+        print(f"\n📊 与基线对比 ({args.baseline}, 容差 {args.tolerance:.0%}):")
+        print(f"{'stage':>9} | {'metric':>14} | {'baseline':>10} | {'current':>10} | {'change':>8} |")
+        print("-" * 68)
+        for stage, metric, old, new, change, regressed in rows:
+            flag = "❌ REGRESSION" if regressed else ""
+            print(f"{stage:>9} | {metric:>14} | {old:>10.2f} | {new:>10.2f} | {change:>+7.1%} | {flag}")
+        if any(r[-1] for r in rows):
+            print("\n❌ 检测到性能回退")
+            sys.exit(1)
+        print("\n✅ 没有超过容差的回退")
+
+
+if __name__ == "__main__":
+    main()
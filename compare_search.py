@@ -1,4 +1,4 @@
-import requests
+import argparse
 import pandas as pd
 import json
 import sys
@@ -8,69 +8,54 @@ import io
 # === 1. 环境与路径设置 ===
 # 确保能导入 src 目录下的模块
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from src.agent import SearchAgent
+from src.agent import SearchAgent, search_keywords, expansion_keywords
+from src.acemap_client import AcemapError
+from src.filters import describe
+from src.retrieval import fused_search
+from src.config import Config
+from src.results import ResultSet, SORT_KEYS
+from src.query_runner import MarkdownSink, inline_cases, load_cases, run_bounded
 
 # === 2. 配置 ===
-ACEMAP_API_URL = "https://acemap.info/api/v1/work/search"
 REPORT_FILE = "search_report.md"  # 结果将保存到这个文件
 
-# 用于缓存输出日志，最后统一写入文件
-log_buffer = []
+REPORT_HEADER = "# Acemap Search Agent 测试报告\n\n本报告对比了原始搜索与 Agent 增强搜索在不同场景下的表现。\n"
 
-def log(text=""):
-    """同时打印到终端和缓存到文件"""
-    print(text)
-    log_buffer.append(text)
-
-# ==========================================
-# 3. API 调用 (保持之前修复后的版本)
-# ==========================================
-def call_acemap_api(keyword, limit=10):
-    if not keyword:
-        return 0, []
-
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-    }
-
-    params = {
-        "keyword": keyword,
-        "page": 1,
-        "size": limit,
-        "order": "desc"
-    }
-    
-    try:
-        response = requests.get(ACEMAP_API_URL, params=params, headers=headers, timeout=10)
-        if response.status_code != 200:
-            return 0, []
-
-        data = response.json()
-        
-        # 适配 Acemap 新版 JSON 结构 {"results": [...]}
-        if "results" in data:
-            papers = data["results"]
-            total = data.get("meta", {}).get("count", len(papers))
-            return total, papers
-        else:
-            return 0, []
-    except Exception:
-        return 0, []
+# 默认测试集 (未指定 --queries 文件时使用)
+DEFAULT_CASES = [
+    # 目的: 展示 GAKG 的 Grounding 能力
+    ("Case 1: 拼写错误纠正 (KG Grounding)", "recent papers about Grnite"),
+    # 目的: 展示 LLM 的意图提取 + 客户端年份过滤
+    ("Case 2: 复杂意图与时间过滤 (Logic & Filtering)", "Find papers on Basalt from 2023"),
+    # 目的: 展示 LLM 将中文口语转化为英文学术术语的能力 (Agent 会将其翻译为 "Plate tectonics")
+    ("Case 3: 跨语言/专业术语映射 (Translation)", "帮我找关于板块构造的论文"),
+    # 如果你的图谱里有 MORB -> Mid-Ocean Ridge Basalt 的关系
+    ("Case 4: 术语缩写还原 (Normalization)", "Papers about MORB"),
+]
 
 # ==========================================
-# 4. 核心对比逻辑 (增强版)
+# 3. 核心对比逻辑 (增强版)
 # ==========================================
 def run_comparison(case_name, user_query, agent):
+    """跑一个用例，返回该用例的 Markdown 段落 (并发执行时各用例互不干扰，由主线程统一输出)"""
+    lines = []
+    log = lines.append
+
     log(f"\n## 测试场景: {case_name}")
     log(f"**用户查询:** `{user_query}`\n")
 
     # --- 场景 A: Before (直接搜原句) ---
     log("### 🔴 Before: 原始搜索")
-    total_raw, papers_raw = call_acemap_api(user_query, limit=5)
+    try:
+        total_raw, papers_raw = agent.acemap.search(user_query, limit=5)
+    except AcemapError as e:
+        # 请求失败和 0 结果分开报告
+        total_raw, papers_raw = None, []
+        log(f"> **结果:** 检索出错 ({e})")
     
     if total_raw == 0:
-        log(f"> **结果:** 0 篇 (搜索失败)")
-    else:
+        log(f"> **结果:** 0 篇 (无结果)")
+    elif total_raw:
         log(f"> **结果:** {total_raw} 篇 (可能包含无关结果)")
         # 简单展示前2篇标题
         for i, p in enumerate(papers_raw[:2]):
@@ -85,7 +70,7 @@ def run_comparison(case_name, user_query, agent):
         agent_output = agent.parse(user_query)
     except Exception as e:
         log(f"❌ Agent Error: {e}")
-        return
+        return "\n".join(lines)
 
     # 获取参数
     params = agent_output.get('search_params', {})
@@ -94,45 +79,40 @@ def run_comparison(case_name, user_query, agent):
     grounded_kws = params.get('keywords_grounded', [])
     raw_kws = params.get('keywords_raw', [])
     
-    # 2. 选词策略
-    best_keyword = user_query
+    # 2. 选词策略：检索全部校准后的关键词，而不是只取第一个
+    search_kws = search_keywords(agent_output, user_query)
     strategy = "原句兜底"
     
     if grounded_kws:
-        best_keyword = grounded_kws[0]
         strategy = "**KG校准 (Grounding)** ✨"
     elif raw_kws:
-        best_keyword = raw_kws[0]
         strategy = "**LLM提取 (Extraction)**"
         
     log(f"- **策略:** {strategy}")
-    log(f"- **优化关键词:** `{user_query}` -> `{best_keyword}`")
-    
-    # 3. API 召回
-    # 为了演示过滤效果，我们多召回一些数据 (limit=20)
-    total_opt, papers_opt = call_acemap_api(best_keyword, limit=20)
-    log(f"- **初步召回:** {total_opt} 篇")
-
-    # 4. 客户端智能过滤 (Client-side Filtering)
-    year_start = filters.get('year_start')
-    institution = filters.get('institution')
-    
-    final_papers = []
+    log(f"- **优化关键词:** `{user_query}` -> {', '.join(f'`{kw}`' for kw in search_kws)}")
+    expanded_kws = expansion_keywords(agent_output)
+    if expanded_kws:
+        log(f"- **KG 扩展:** {', '.join(f'`{kw}`' for kw in expanded_kws)}")
     
-    if year_start:
-        log(f"- **执行过滤:** 年份 >= {year_start}")
-        for p in papers_opt:
-            p_year = p.get('publication_year')
-            # 只有年份存在且符合要求才保留
-            if p_year and int(p_year) >= int(year_start):
-                final_papers.append(p)
-    else:
-        final_papers = papers_opt
-        
-    # (可选) 机构过滤逻辑
-    # 注意：Acemap API 返回列表通常不含机构信息，这里仅做逻辑演示
-    if institution:
-         log(f"- **意图识别到的机构:** {institution} (注: 因API限制，本步骤仅做展示，暂未执行严格过滤)")
+    # 3. API 召回 + 4. 客户端智能过滤 (Client-side Filtering)
+    # 每个关键词流式分页：逐页拉取、边拉边按年份/作者/机构过滤，凑够 20 篇就停止，
+    # 多个关键词并发检索，再用 RRF (倒数排名融合) 合并去重
+    condition = describe(filters)
+    if condition:
+        log(f"- **执行过滤:** {condition}")
+    # 注意：Acemap 列表接口通常不含作者/机构信息，缺少这些信息的论文会被保留
+    try:
+        fused = fused_search(agent.acemap, search_kws, filters, expansions=expansion_keywords(agent_output),
+                             per_keyword=20, limit=20)
+    except AcemapError as e:
+        log(f"- **检索出错:** {e}")
+        log("\n---\n")
+        return "\n".join(lines)
+    for kw, total in fused["totals"].items():
+        log(f"- **初步召回:** `{kw}` {total} 篇")
+    for kw, err in fused["errors"].items():
+        log(f"- **检索出错:** `{kw}` {err}")
+    final_papers = fused["papers"]
 
     # 5. 生成结果表格
     if not final_papers:
@@ -140,68 +120,60 @@ def run_comparison(case_name, user_query, agent):
     else:
         log(f"> **✅ 最终推荐:** {len(final_papers)} 篇 (Top 5 展示)")
         
-        table_data = []
-        for p in final_papers[:5]:
-            title = p.get('display_name') or p.get('title') or "No Title"
-            table_data.append({
-                "Title": title[:50] + "...", # 截断标题
-                "Year": p.get('publication_year', 'N/A'),
-                "Cited": p.get('cited_by_count', 0)
-            })
-            
-        # 使用 Pandas 生成 Markdown 表格
-        df = pd.DataFrame(table_data)
+        # 使用 Pandas 生成 Markdown 表格 (截断过长的标题)
+        df = pd.DataFrame(ResultSet(final_papers).preview(5, title_width=50))
         log("\n" + df.to_markdown(index=False))
 
     log("\n---\n")
+    return "\n".join(lines)
 
 # ==========================================
-# 5. 主程序入口
+# 4. 主程序入口
 # ==========================================
-if __name__ == "__main__":
+def main():
+    parser = argparse.ArgumentParser(description="Before/after search comparison report")
+    parser.add_argument("--queries", default=None,
+                        help="查询文件 (JSONL / CSV / TXT)，默认使用内置的 4 个用例")
+    parser.add_argument("--workers", type=int, default=4, help="同时运行的用例数")
+    parser.add_argument("--output", default=REPORT_FILE)
+    parser.add_argument("--sort", choices=SORT_KEYS, default=None,
+                        help="结果排序 (默认 RESULT_SORT): score 相关度 / cited 被引数 / year 年份")
+    parser.add_argument("--resume", action="store_true",
+                        help="在已有报告后追加，跳过报告里已完成的用例")
+    args = parser.parse_args()
+
+    cases = load_cases(args.queries) if args.queries else inline_cases(DEFAULT_CASES)
+    if args.sort:
+        Config.RESULT_SORT = args.sort
+
     # 初始化 Agent (只加载一次 KG)
     print("🚀 初始化 Agent 中... (加载 Parquet 可能需要几秒)")
     agent = SearchAgent()
-    
-    # 准备报告头
-    log("# Acemap Search Agent 测试报告\n")
-    log("本报告对比了原始搜索与 Agent 增强搜索在不同场景下的表现。\n")
 
-    # === 测试用例 1: 拼写错误与术语校准 ===
-    # 目的: 展示 GAKG 的 Grounding 能力
-    run_comparison(
-        case_name="Case 1: 拼写错误纠正 (KG Grounding)",
-        user_query="recent papers about Grnite",
-        agent=agent
-    )
-    
-    # === 测试用例 2: 多条件复杂逻辑 ===
-    # 目的: 展示 LLM 的意图提取 + 客户端年份过滤
-    run_comparison(
-        case_name="Case 2: 复杂意图与时间过滤 (Logic & Filtering)",
-        user_query="Find papers on Basalt from 2023",
-        agent=agent
-    )
-
-    # === 测试用例 3: 跨语言检索 ===
-    # 目的: 展示 LLM 将中文口语转化为英文学术术语的能力
-    run_comparison(
-        case_name="Case 3: 跨语言/专业术语映射 (Translation)",
-        user_query="帮我找关于板块构造的论文", 
-        # Agent 会将其翻译为 "Plate tectonics"
-        agent=agent
-    )
-
-    # === 测试用例 4: 术语消歧/缩写还原 (可选) ===
-    # 如果你的图谱里有 MORB -> Mid-Ocean Ridge Basalt 的关系
-    run_comparison(
-        case_name="Case 4: 术语缩写还原 (Normalization)",
-        user_query="Papers about MORB", 
-        agent=agent
-    )
-
-    # 保存报告
-    with open(REPORT_FILE, "w", encoding="utf-8") as f:
-        f.write("\n".join(log_buffer))
-    
-    print(f"✅ 测试完成！完整报告已保存至: {os.path.abspath(REPORT_FILE)}")
\ No newline at end of file
+    # 每个用例跑完立即追加到报告，中断后用 --resume 接着跑
+    with MarkdownSink(args.output, REPORT_HEADER, resume=args.resume) as report:
+        todo = [c for c in cases if c["id"] not in report.done]
+        if len(todo) < len(cases):
+            print(f"⏭️ 跳过已完成的 {len(cases) - len(todo)} 个用例")
+        try:
+            for n, (case, section, error) in enumerate(
+                    run_bounded(lambda c: run_comparison(c["name"], c["query"], agent), todo, args.workers), 1):
+                if error is not None:
+                    # 不写入报告，--resume 时会重跑
+                    print(f"[{n}/{len(todo)}] ❌ {case['name']} 出错: {error}")
+                    continue
+                print(section)
+                print(f"[{n}/{len(todo)}] {case['name']} 完成")
+                report.write(case["id"], section)
+        except KeyboardInterrupt:
+            print(f"\n⏸️ 已中断，已完成的用例都在报告里，使用 --resume 继续")
+            return
+
+    print(f"✅ 测试完成！完整报告已保存至: {os.path.abspath(args.output)}")
+    print(f"📡 Acemap 请求统计: {agent.acemap.stats.snapshot()}")
+    if agent.rules is not None:
+        print(f"🧭 意图路由 (本地规则 / LLM): {agent.rules.stats()}")
+
+
+if __name__ == "__main__":
+    main()
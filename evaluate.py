@@ -1,7 +1,11 @@
+import argparse
+import json
 import pandas as pd
 import time
 from src.agent import SearchAgent
 from src.config import Config
+from src import tracing
+from src.query_runner import CSVSink, inline_cases, load_cases, run_bounded
 
 # 为了让表格显示好看，调整 Pandas 显示设置
 pd.set_option('display.max_colwidth', 40)
@@ -34,85 +38,164 @@ def highlight_diff(row):
         return "✅ 已修正"
     return "-"
 
-def run_test_suite():
-    print(f"🚀 正在初始化 Agent (模型: {Config.MODEL_NAME})...")
-    agent = SearchAgent()
-    
-    # === 定义你的测试集 ===
-    test_cases = [
-        # 1. 基础正常 Case
-        "Find papers about Granite from MIT",
-        
-        # 2. 拼写错误 Case (这是你的得分亮点！)
-        "Research on Grnite and Bsallt",  # Granite, Basalt
-        "Sdimetary basin analysis",       # Sedimentary basin
-        
-        # 3. 复杂意图 Case
-        "Recent articles by author John Smith on Plate Tctnics",
-        
-        # 4. 中文输入 Case (测试 LLM 翻译 + KG 映射)
-        "帮我找关于 火成岩 的论文", 
-        
-        # 5. 干扰项 Case (测试是否胡乱匹配)
-        "Papers about UnknowxxxxThing", # 图谱里肯定没有这个词
-    ]
-    
-    results = []
-
-    print(f"📋 开始执行测试，共 {len(test_cases)} 条...\n")
-    
-    for i, query in enumerate(test_cases):
-        print(f"Testing [{i+1}/{len(test_cases)}]: {query} ...")
+# 默认测试集 (未指定 --queries 文件时使用)
+DEFAULT_CASES = [
+    # 1. 基础正常 Case
+    "Find papers about Granite from MIT",
+
+    # 2. 拼写错误 Case (这是你的得分亮点！)
+    "Research on Grnite and Bsallt",  # Granite, Basalt
+    "Sdimetary basin analysis",       # Sedimentary basin
+
+    # 3. 复杂意图 Case
+    "Recent articles by author John Smith on Plate Tctnics",
+
+    # 4. 中文输入 Case (测试 LLM 翻译 + KG 映射)
+    "帮我找关于 火成岩 的论文",
+
+    # 5. 干扰项 Case (测试是否胡乱匹配)
+    "Papers about UnknowxxxxThing", # 图谱里肯定没有这个词
+]
+
+REPORT_COLUMNS = ['ID', 'Status', 'Query', 'Raw_Keywords', 'Final_Keywords', 'Other_Info', 'Time(s)']
+# 用例数不超过这个值时在终端打印完整表格，否则只打印汇总
+SMALL_REPORT_ROWS = 50
+
+
+def evaluate_chunk(agent, chunk, batch_size=0):
+    """
+    评估一组用例，返回报告行。batch_size > 0 时 chunk 里的查询用一个批量 Prompt 提取意图，
+    Time(s) 里的 LLM 耗时按条数均摊；否则 chunk 只有一条，逐条调用 extract_intent。
+    """
+    batch_intents, batch_share = None, 0.0
+    if batch_size > 0:
+        start_time = time.time()
+        batch_intents = agent.llm.extract_intents_batch([c["query"] for c in chunk], batch_size=batch_size)
+        batch_share = (time.time() - start_time) / len(chunk)
+
+    rows = []
+    for i, case in enumerate(chunk):
+        query = case["query"]
         start_time = time.time()
-        
+
         # --- 核心调用 ---
-        # 注意：为了对比，我们需要修改一下 src/agent.py 
-        # 让它把 raw_intent 也返回出来，或者我们在测试里分步调用
         # 这里演示分步调用以获取中间结果：
-        
+
         # 1. LLM 原始提取
-        raw_intent = agent.llm.extract_intent(query)
+        raw_intent = batch_intents[i] if batch_intents else agent.llm.extract_intent(query)
         raw_kws = raw_intent.get('keywords', [])
-        
-        # 2. KG 校准
-        final_keywords = []
-        for kw in raw_kws:
-            # 这里调用 agent 内部的 kg 模块
-            final_keywords.append(agent.kg.ground_keyword(kw))
-            
+
+        # 2. KG 校准 (批量接口，一次调用校准全部关键词)
+        if isinstance(raw_kws, str):
+            raw_kws = [raw_kws]
+        final_keywords = agent.kg.ground_keywords(raw_kws)
+
         final_intent = raw_intent.copy()
         final_intent['keywords'] = final_keywords
         # ----------------
-        
-        duration = time.time() - start_time
-        
-        results.append({
+
+        duration = time.time() - start_time + batch_share
+
+        row = {
+            "ID": case["id"],
             "Query": query,
             "Raw_Keywords": raw_kws,
             "Final_Keywords": final_keywords,
             "Other_Info": f"Inst: {final_intent.get('institution')}, Time: {final_intent.get('year_start')}",
             "Time(s)": round(duration, 2)
-        })
-
-    # 生成报告
-    df_result = pd.DataFrame(results)
-    
-    # 添加一列状态，看是否触发了校准
-    df_result['Status'] = df_result.apply(highlight_diff, axis=1)
-    
-    # 调整列顺序
-    cols = ['Status', 'Query', 'Raw_Keywords', 'Final_Keywords', 'Other_Info', 'Time(s)']
-    df_result = df_result[cols]
-    
+        }
+        # 添加一列状态，看是否触发了校准
+        row['Status'] = highlight_diff(row)
+        rows.append(row)
+    return rows
+
+
+def run_test_suite(batch_size=0, metrics_path=None, queries_path=None, workers=4,
+                   output="test_report.csv", resume=False):
+    """
+    batch_size > 0 时用批量 Prompt 提取意图 (每批 batch_size 条，各批并发)；
+    metrics_path 不为空时把分阶段耗时/计数器 (tracing) 导出为 JSON。
+    queries_path 指定查询文件 (JSONL / CSV / TXT)，否则使用内置测试集；
+    每条结果跑完立即追加到 output，resume=True 时跳过 output 里已有的用例。
+    """
+    print(f"🚀 正在初始化 Agent (模型: {Config.MODEL_NAME})...")
+    agent = SearchAgent()
+
+    cases = load_cases(queries_path) if queries_path else inline_cases(DEFAULT_CASES)
+    sink = CSVSink(output, REPORT_COLUMNS, id_column="ID", resume=resume)
+    todo = [c for c in cases if c["id"] not in sink.done]
+    if len(todo) < len(cases):
+        print(f"⏭️ 跳过已完成的 {len(cases) - len(todo)} 条")
+
+    print(f"📋 开始执行测试，共 {len(todo)} 条 (并发 {workers})...\n")
+
+    # 批量模式：请求数和 Prompt 长度都降到原来的 1/batch_size 左右
+    size = batch_size if batch_size > 0 else 1
+    chunks = [todo[i:i + size] for i in range(0, len(todo), size)]
+
+    # 结果边跑边写，只保留汇总计数，几千条查询也不占内存
+    finished, corrected, total_time, failed = 0, 0, 0.0, 0
+    small_report = []
+    try:
+        for chunk, rows, error in run_bounded(lambda c: evaluate_chunk(agent, c, batch_size), chunks, workers):
+            if error is not None:
+                failed += len(chunk)
+                print(f"❌ {len(chunk)} 条出错 ({chunk[0]['query']} ...): {error}")
+                continue
+            for row in rows:
+                sink.write(row)
+                finished += 1
+                corrected += row['Status'] != "-"
+                total_time += row['Time(s)']
+                if finished <= SMALL_REPORT_ROWS:
+                    small_report.append(row)
+                print(f"Testing [{finished}/{len(todo)}]: {row['Query']} -> {row['Final_Keywords']} ({row['Time(s)']}s)")
+    except KeyboardInterrupt:
+        print(f"\n⏸️ 已中断，已完成的 {finished} 条已保存至 {output}，使用 --resume 继续")
+    finally:
+        sink.close()
+
+    # 生成报告 (用例不多时直接打印表格)
     print("\n" + "="*50)
     print("📊 测试结果报告")
     print("="*50)
-    print(df_result)
-    
-    # 导出为 CSV 方便放入报告
-    df_result.to_csv("test_report.csv", index=False, encoding='utf-8-sig')
-    print("\n✅ 结果已保存至 test_report.csv")
+    if small_report and finished <= SMALL_REPORT_ROWS:
+        df_result = pd.DataFrame(small_report)
+        print(df_result[REPORT_COLUMNS[1:]])
+    print(f"完成 {finished} 条，已修正 {corrected} 条，失败 {failed} 条，"
+          f"平均耗时 {total_time / finished if finished else 0:.2f}s")
+
+    print(f"\n✅ 结果已保存至 {output}")
+
+    # 意图缓存命中情况 (重复查询省下的 LLM 调用)
+    if agent.llm.cache is not None:
+        print(f"🗄️ 意图缓存统计: {agent.llm.cache.stats()}")
+
+    # 分阶段耗时 (LLM 请求 / JSON 解析 / KG 校准 / ...)
+    metrics = tracing.TRACER.snapshot()
+    if metrics["histograms"]:
+        stages = pd.DataFrame.from_dict(metrics["histograms"], orient="index")
+        print("\n⏱️ 分阶段耗时 (ms):")
+        print(stages[["count", "p50_ms", "p95_ms", "p99_ms", "max_ms"]])
+    if metrics["counters"]:
+        print(f"🔢 计数器: {metrics['counters']}")
+    if metrics_path:
+        with open(metrics_path, "w", encoding="utf-8") as f:
+            json.dump(metrics, f, ensure_ascii=False, indent=2)
+        print(f"✅ 埋点数据已保存至 {metrics_path}")
 
 if __name__ == "__main__":
     # create_mock_kg_if_needed() # 如果你还没有真实数据，取消这行注释
-    run_test_suite()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Intent extraction + KG grounding evaluation")
+    parser.add_argument("--batch-size", type=int, default=0,
+                        help="批量提取意图时每个 Prompt 的查询数 (0 = 每条查询单独请求)")
+    parser.add_argument("--metrics", default=None,
+                        help="把分阶段耗时/计数器导出到这个 JSON 文件")
+    parser.add_argument("--queries", default=None,
+                        help="查询文件 (JSONL / CSV / TXT)，默认使用内置测试集")
+    parser.add_argument("--workers", type=int, default=4, help="同时评估的查询数 (批量模式下为批数)")
+    parser.add_argument("--output", default="test_report.csv")
+    parser.add_argument("--resume", action="store_true",
+                        help="在已有结果后追加，跳过 output 里已完成的查询")
+    args = parser.parse_args()
+    run_test_suite(args.batch_size, args.metrics, args.queries, args.workers, args.output, args.resume)
\ No newline at end of file
@@ -1,51 +1,23 @@
-import requests
-import pandas as pd
+import time
+
+# 从脚本启动开始计时，用于报告"到第一个提示符"和"到第一条结果"的耗时
+SCRIPT_START = time.perf_counter()
+
 import json
 import sys
 import os
-import time
+from concurrent.futures import wait
 
 # === 1. 环境设置 ===
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from src.agent import SearchAgent
-
-# === 2. 配置 ===
-ACEMAP_API_URL = "https://acemap.info/api/v1/work/search"
+from src.agent import SearchAgent, search_keywords, expansion_keywords
+from src.acemap_client import AcemapError
+from src.config import Config
+from src.retrieval import fused_search
+from src.results import ResultSet
 
 # ==========================================
-# 3. API 调用函数 (复用之前的稳定版本)
-# ==========================================
-def call_acemap_api(keyword, limit=10):
-    if not keyword:
-        return 0, []
-
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-    }
-
-    params = {
-        "keyword": keyword,
-        "page": 1,
-        "size": limit,
-        "order": "desc"
-    }
-    
-    try:
-        response = requests.get(ACEMAP_API_URL, params=params, headers=headers, timeout=10)
-        if response.status_code != 200:
-            return 0, []
-
-        data = response.json()
-        if "results" in data:
-            papers = data["results"]
-            total = data.get("meta", {}).get("count", len(papers))
-            return total, papers
-        return 0, []
-    except Exception:
-        return 0, []
-
-# ==========================================
-# 4. 交互式主逻辑
+# 2. 交互式主逻辑
 # ==========================================
 def start_interactive_session():
     print("\n" + "="*60)
@@ -54,16 +26,19 @@ def start_interactive_session():
     print("正在初始化 Agent (加载知识图谱)... 请稍候...")
     
     # 初始化 Agent (耗时操作只做一次)
+    # 快速启动时 KG 在后台加载，第一次校准时才等待，与第一个查询的 LLM 调用重叠
     start_time = time.time()
     try:
-        agent = SearchAgent()
-        print(f"✅ 初始化完成! (耗时: {time.time() - start_time:.2f}s)")
+        agent = SearchAgent(fast_start=Config.FAST_START)
+        print(f"✅ 初始化完成! (耗时: {time.time() - start_time:.2f}s, "
+              f"距启动 {time.perf_counter() - SCRIPT_START:.2f}s)")
     except Exception as e:
         print(f"❌ 初始化失败: {e}")
         return
 
     print("\n💡 提示: 输入 'q', 'exit', 'quit' 可退出程序")
     print("-" * 60)
+    first_result = True
 
     while True:
         # 1. 获取用户输入
@@ -83,8 +58,17 @@ def start_interactive_session():
         print(f"\n🔄 正在分析意图...")
         
         # 2. Agent 解析
+        # 流式模式：LLM 一吐出 keywords 就校准并在后台预取第一页结果，
+        # 模型还在生成过滤条件时检索已经开始了
+        query_start = time.time()
+        prefetched = []
+
+        def on_keywords(keywords):
+            print(f"   [流式] 关键词已就绪 ({time.time() - query_start:.2f}s): {keywords}")
+            prefetched.extend(agent.prefetch(keywords))
+
         try:
-            agent_output = agent.parse(user_query)
+            agent_output = agent.parse(user_query, on_keywords=on_keywords if Config.LLM_STREAM else None)
         except Exception as e:
             print(f"❌ Agent 解析出错: {e}")
             continue
@@ -96,62 +80,55 @@ def start_interactive_session():
         grounded_kws = params.get('keywords_grounded', [])
         raw_kws = params.get('keywords_raw', [])
         
-        # 4. 确定搜索策略
-        best_keyword = user_query
+        # 4. 确定搜索策略：检索全部校准后的关键词
+        search_kws = search_keywords(agent_output, user_query)
         strategy = "原句兜底"
         
         if grounded_kws:
-            best_keyword = grounded_kws[0]
             strategy = "✨ KG 知识校准 (Grounding)"
         elif raw_kws:
-            best_keyword = raw_kws[0]
             strategy = "🧠 LLM 意图提取"
         
         # 5. 展示 Agent 的思考过程 (这是得分点！)
         print(f"   [策略]: {strategy}")
-        if best_keyword != user_query:
-            print(f"   [优化]: '{user_query}' ==> '{best_keyword}'")
+        if search_kws != [user_query]:
+            print(f"   [优化]: '{user_query}' ==> {search_kws}")
+        if expansion_keywords(agent_output):
+            print(f"   [扩展]: {expansion_keywords(agent_output)}")
         
-        if filters.get('year_start') or filters.get('institution'):
+        if any(filters.values()):
             print(f"   [过滤]: {json.dumps(filters, ensure_ascii=False)}")
 
-        # 6. 执行搜索
+        # 6. 执行搜索 + 7. 客户端过滤
+        # 各关键词并发流式检索 (边翻页边过滤)，再用 RRF 融合去重
         print(f"🔍 正在检索 Acemap 数据库...")
-        total, papers = call_acemap_api(best_keyword, limit=20) # 多取一点用于过滤
-        
-        # 7. 执行客户端过滤
-        year_start = filters.get('year_start')
-        final_papers = []
-        
-        for p in papers:
-            keep = True
-            # 年份过滤
-            if year_start:
-                p_year = p.get('publication_year')
-                if not (p_year and int(p_year) >= int(year_start)):
-                    keep = False
-            
-            if keep:
-                final_papers.append(p)
+        # 等预取完成 (大多已经结束)，避免对同一页重复请求
+        wait(prefetched)
+        try:
+            fused = fused_search(agent.acemap, search_kws, filters, expansions=expansion_keywords(agent_output),
+                                 per_keyword=20, limit=20)
+        except AcemapError as e:
+            # 检索失败与"没有结果"区分开提示
+            print(f"❌ Acemap 检索失败: {e}")
+            continue
+        for kw, err in fused["errors"].items():
+            print(f"   ⚠️ '{kw}' 检索失败: {err}")
+        final_papers = fused["papers"]
         
         # 8. 展示结果
+        print(f"⏱️ 查询总耗时: {time.time() - query_start:.2f}s")
+        if first_result:
+            first_result = False
+            print(f"   (首条结果距启动 {time.perf_counter() - SCRIPT_START:.2f}s，含等待输入的时间)")
         print("-" * 60)
         if not final_papers:
             print("⚠️ 未找到符合条件的论文 (可能条件过于严格)。")
         else:
             print(f"✅ 找到 {len(final_papers)} 篇相关论文 (展示 Top 5):")
             
-            table_data = []
-            for p in final_papers[:5]:
-                title = p.get('display_name') or p.get('title') or "No Title"
-                table_data.append({
-                    "Year": p.get('publication_year', '-'),
-                    "Cited": p.get('cited_by_count', 0),
-                    "Title": title
-                })
-            
-            # 打印表格
-            df = pd.DataFrame(table_data)
+            # 打印表格 (pandas 导入较慢，用到时再导入)
+            import pandas as pd
+            df = pd.DataFrame(ResultSet(final_papers).preview(5), columns=["Year", "Cited", "Title"])
             print(df.to_markdown(index=False))
         print("-" * 60)
 
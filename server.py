@@ -0,0 +1,217 @@
+"""
+SearchAgent HTTP 服务：常驻进程，知识图谱只加载一次，所有请求共享同一份只读索引。
+
+启动:
+    python server.py --host 127.0.0.1 --port 8000
+
+接口 (JSON):
+    POST /parse    {"query": "..."} 或 {"queries": ["...", ...]}   -> 意图解析 + KG 校准
+    POST /search   同上，可选 "limit": 20                           -> 解析 + 多关键词检索 + 过滤
+    POST /ingest   重新扫描 KG_SHARDS，后台把新分片构建成增量层 (不阻塞查询)  -> 202
+    GET  /health   存活检查与词表规模
+    GET  /stats    意图缓存 / 本地规则路由比例 / Acemap 请求统计 / KG 分层与校准缓存 / 请求合并 / 分阶段耗时 (JSON)
+    GET  /metrics  分阶段耗时直方图与计数器 (Prometheus 文本格式)
+
+只依赖标准库：ThreadingHTTPServer 负责收发请求，所有请求的流水线都提交到
+同一个后台 asyncio 事件循环上执行，LLM 连接池和线程池在请求之间复用。
+[Debug] 调试日志默认关闭，需要时设置 DEBUG_LOG=on。
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from src.agent import SearchAgent
+from src.config import Config
+from src import tracing
+
+# 单个请求体里最多允许的查询数
+MAX_BATCH = 1000
+
+# /search 默认每个查询返回的论文数
+DEFAULT_LIMIT = 20
+
+
+class AgentService:
+    """持有唯一的 SearchAgent 和后台事件循环"""
+
+    def __init__(self, agent=None):
+        self.agent = agent or SearchAgent()
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="agent-loop", daemon=True)
+        self._thread.start()
+        self.started_at = time.time()
+
+    def run(self, coro, timeout=None):
+        """在后台事件循环上执行协程，阻塞等待结果 (供请求处理线程调用)"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def handle(self, path, body):
+        queries = body.get("queries")
+        if queries is None:
+            query = body.get("query")
+            if not isinstance(query, str) or not query.strip():
+                raise ValueError("Body must contain a non-empty 'query' or a 'queries' list")
+            queries, single = [query], True
+        else:
+            if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+                raise ValueError("'queries' must be a list of strings")
+            if len(queries) > MAX_BATCH:
+                raise ValueError(f"At most {MAX_BATCH} queries per request")
+            single = False
+
+        search = path == "/search"
+        limit = body.get("limit", DEFAULT_LIMIT)
+        # bool 是 int 的子类，单独排除
+        if search and (not isinstance(limit, int) or isinstance(limit, bool) or limit < 0):
+            raise ValueError("'limit' must be a non-negative integer")
+        results = self.run(self.agent.abatch(queries, search=search, stream=Config.LLM_STREAM))
+        if single and "error" in results[0]:
+            # 单条查询出错按服务端错误返回；批量请求里出错的查询保留 {"query", "error"}
+            raise RuntimeError(results[0]["error"])
+        if search:
+            for r in results:
+                if "results" in r:
+                    r["results"]["papers"] = r["results"]["papers"][:limit]
+                    r["results"]["scores"] = r["results"]["scores"][:limit]
+        return results[0] if single else {"results": results}
+
+    def health(self):
+        return {
+            "status": "ok",
+            "vocab_size": len(self.agent.kg.vocab),
+            "uptime_s": round(time.time() - self.started_at, 1),
+        }
+
+    def stats(self):
+        cache = self.agent.llm.cache
+        memo = self.agent.kg.memo
+        return {
+            "intent_cache": cache.stats() if cache is not None else None,
+            "intent_rules": self.agent.rules.stats() if self.agent.rules is not None else None,
+            "acemap": self.agent.acemap.stats.snapshot(),
+            "kg_layers": self.agent.kg.layer_stats(),
+            "grounding_memo": memo.stats() if memo is not None else None,
+            "single_flight": self.agent.flight_stats(),
+            "tracing": tracing.TRACER.snapshot(),
+        }
+
+    def ingest(self):
+        """只导入服务端配置的分片目录 (KG_SHARDS)，不接受请求里传来的路径"""
+        if not Config.KG_SHARDS:
+            raise ValueError("KG_SHARDS is not configured")
+        files = self.agent.kg.ingest(Config.KG_SHARDS, background=True)
+        return {"checking": [str(f) for f in files]}
+
+    def close(self):
+        # LLM 连接池绑定在后台循环上，先在循环里关掉再停循环
+        try:
+            self.run(self.agent.aclose(), timeout=5)
+        except Exception as e:
+            print(f"[Server Warning] Failed to close LLM client: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.agent.close()
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        # 复用 TCP 连接
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            print(f"[Server] {self.address_string()} {format % args}")
+
+        def _send(self, status, payload, content_type="application/json; charset=utf-8"):
+            if isinstance(payload, str):
+                body = payload.encode("utf-8")
+            else:
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send(200, service.health())
+            elif self.path == "/stats":
+                self._send(200, service.stats())
+            elif self.path == "/metrics":
+                self._send(200, tracing.TRACER.prometheus(), "text/plain; version=0.0.4; charset=utf-8")
+            else:
+                self._send(404, {"error": "not found"})
+
+        def _read_body(self):
+            """
+            读完整个请求体 (不论路径是否需要)，否则剩下的字节会被当成下一个请求解析。
+            Content-Length 不合法时无法确定请求边界，回复后关闭连接。
+            """
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                if length < 0:
+                    raise ValueError
+            except ValueError:
+                self.close_connection = True
+                self._send(400, {"error": "Invalid Content-Length"})
+                return None
+            return self.rfile.read(length)
+
+        def do_POST(self):
+            data = self._read_body()
+            if data is None:
+                return
+            if self.path == "/ingest":
+                try:
+                    self._send(202, service.ingest())
+                except ValueError as e:
+                    self._send(400, {"error": str(e)})
+                return
+            if self.path not in ("/parse", "/search"):
+                self._send(404, {"error": "not found"})
+                return
+            try:
+                body = json.loads(data or b"{}")
+                if not isinstance(body, dict):
+                    raise ValueError("Body must be a JSON object")
+                self._send(200, service.handle(self.path, body))
+            except ValueError as e:
+                self._send(400, {"error": str(e)})
+            except Exception as e:
+                print(f"[Server Error] {e}")
+                self._send(500, {"error": str(e)})
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SearchAgent HTTP service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    # 服务端默认不打印每个请求的 [Debug] 行，显式设置了 DEBUG_LOG 时按配置
+    if "DEBUG_LOG" not in os.environ:
+        tracing.set_debug(False)
+
+    print("🚀 正在加载知识图谱并初始化 Agent (只做一次)...")
+    service = AgentService()
+    httpd = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    httpd.daemon_threads = True
+    print(f"✅ 服务已启动: http://{args.host}:{args.port}  (POST /parse, /search, /ingest; GET /health, /stats, /metrics)")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\n服务已停止。")
+    finally:
+        httpd.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
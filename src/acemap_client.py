@@ -0,0 +1,327 @@
+# src/acemap_client.py
+"""
+Acemap 检索客户端 (所有入口脚本共用)。
+
+原来每个脚本里各有一份 call_acemap_api：每次裸调 requests.get，没有连接复用、
+没有重试，任何异常都被吞成 (0, [])，失败和"确实没有结果"无法区分。
+这里统一成一个 AcemapClient：
+- requests.Session + 连接池，keep-alive 复用 TCP/TLS 连接
+- 可配置的连接/读取超时
+- 5xx / 429 / 网络错误按指数退避重试 (尊重 Retry-After)
+- 重试耗尽后抛出 AcemapError，而不是返回空结果
+- 记录每次请求的耗时与错误计数
+- 可选的响应缓存 (见 response_cache.py)，重复检索不再走网络
+- 同时在途的相同请求合并成一次 (single-flight)
+"""
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .config import Config
+from . import response_cache
+from . import tracing
+from .single_flight import SingleFlight
+from .results import ResultSet, loads
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+}
+
+# 这些状态码视为临时故障，值得重试
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class AcemapError(Exception):
+    """检索失败 (重试耗尽、非 200 响应或响应格式不对)"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class AcemapStats:
+    """请求计数与耗时统计 (线程安全)，latencies 只保留最近 window 条"""
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self.errors_by_kind = {}
+        self.latencies = deque(maxlen=window)
+        # 响应缓存: hit (新鲜命中) / revalidated (304 续期) / miss
+        self.cache = {"hit": 0, "revalidated": 0, "miss": 0}
+
+    def record(self, latency, error_kind=None):
+        tracing.observe("acemap.http", latency)
+        if error_kind:
+            tracing.count("acemap.error." + error_kind)
+        with self._lock:
+            self.requests += 1
+            self.latencies.append(latency)
+            if error_kind:
+                self.errors += 1
+                self.errors_by_kind[error_kind] = self.errors_by_kind.get(error_kind, 0) + 1
+
+    def record_cache(self, outcome):
+        tracing.count("acemap_cache." + outcome)
+        with self._lock:
+            self.cache[outcome] += 1
+
+    def record_retry(self):
+        tracing.count("acemap.retry")
+        with self._lock:
+            self.retries += 1
+
+    def snapshot(self):
+        with self._lock:
+            lat = sorted(self.latencies)
+            pick = lambda q: round(lat[min(len(lat) - 1, int(q * len(lat)))] * 1000, 1) if lat else None
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "errors": self.errors,
+                "errors_by_kind": dict(self.errors_by_kind),
+                "latency_ms_p50": pick(0.50),
+                "latency_ms_p95": pick(0.95),
+                "latency_ms_max": round(lat[-1] * 1000, 1) if lat else None,
+                "cache": dict(self.cache),
+            }
+
+
+class AcemapClient:
+    def __init__(self, base_url=None, timeout=None, max_retries=None, backoff=None, pool_size=None,
+                 cache=None):
+        self.base_url = base_url or Config.ACEMAP_API_URL
+        # (连接超时, 读取超时)
+        self.timeout = timeout or (Config.ACEMAP_CONNECT_TIMEOUT, Config.ACEMAP_READ_TIMEOUT)
+        self.max_retries = Config.ACEMAP_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = Config.ACEMAP_BACKOFF if backoff is None else backoff
+        pool_size = pool_size or Config.ACEMAP_POOL_SIZE
+
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.stats = AcemapStats()
+        # 分页预取用的线程池 (按需创建)
+        self._prefetch_pool = None
+        # 响应缓存：未显式传入时按 Config.ACEMAP_CACHE_* 创建 (SIZE=0 表示关闭)，
+        # 传 cache=False 强制不缓存
+        if cache is None:
+            cache = response_cache.from_config(Config)
+        self.cache = None if cache is False else cache
+        # 并发的相同检索 (同关键词、同页) 只发一次请求
+        self.flight = SingleFlight("acemap")
+
+    def close(self):
+        if self._prefetch_pool is not None:
+            self._prefetch_pool.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _sleep_before_retry(self, attempt, response=None):
+        """指数退避 + 抖动；429/503 带 Retry-After 时按服务端要求等待"""
+        delay = self.backoff * (2 ** attempt) * (0.5 + random.random())
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+        self.stats.record_retry()
+        time.sleep(delay)
+
+    def _get(self, params, headers=None):
+        """
+        带重试的 GET，返回 (状态码, 解析后的 JSON, 响应头)；
+        状态码只会是 200 或 304 (条件请求命中)，其它情况抛 AcemapError
+        """
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            response = None
+            try:
+                response = self.session.get(self.base_url, params=params, headers=headers,
+                                            timeout=self.timeout)
+            except requests.Timeout as e:
+                self.stats.record(time.perf_counter() - start, "timeout")
+                last_error = AcemapError(f"Acemap request timed out: {e}")
+            except requests.RequestException as e:
+                self.stats.record(time.perf_counter() - start, "connection")
+                last_error = AcemapError(f"Acemap request failed: {e}")
+            else:
+                latency = time.perf_counter() - start
+                if response.status_code == 304:
+                    self.stats.record(latency)
+                    return 304, None, response.headers
+                if response.status_code == 200:
+                    try:
+                        data = loads(response.content)
+                    except ValueError:
+                        self.stats.record(latency, "bad_json")
+                        raise AcemapError("Acemap returned invalid JSON", status=200)
+                    self.stats.record(latency)
+                    return 200, data, response.headers
+
+                self.stats.record(latency, f"http_{response.status_code}")
+                last_error = AcemapError(
+                    f"Acemap returned HTTP {response.status_code}", status=response.status_code
+                )
+                if response.status_code not in RETRY_STATUS:
+                    raise last_error
+
+            if attempt < self.max_retries:
+                self._sleep_before_retry(attempt, response)
+
+        raise last_error
+
+    def _fetch(self, params):
+        """
+        先查响应缓存：新鲜直接返回；过期但带 ETag/Last-Modified 就发条件请求，
+        304 则续期复用；否则正常请求并写回缓存。
+        """
+        if self.cache is None:
+            return self._get(params)[1]
+
+        key = response_cache.make_key(params)
+        entry = self.cache.get(key)
+        if entry is not None and entry.is_fresh():
+            self.stats.record_cache("hit")
+            return entry.data
+
+        headers = {}
+        if entry is not None and entry.can_revalidate():
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        status, data, resp_headers = self._get(params, headers=headers or None)
+        if status == 304:
+            if entry is None:
+                raise AcemapError("Acemap returned 304 for an uncached request", status=304)
+            self.stats.record_cache("revalidated")
+            self.cache.refresh(key, entry)
+            return entry.data
+
+        self.stats.record_cache("miss")
+        self.cache.set(key, data, resp_headers.get("ETag"), resp_headers.get("Last-Modified"))
+        return data
+
+    def search(self, keyword, limit=10, page=1, order="desc"):
+        """
+        按关键词检索，返回 (命中总数, 论文列表)，与原 call_acemap_api 的返回值一致。
+        空关键词返回 (0, [])；请求失败抛 AcemapError。
+        """
+        if not keyword:
+            return 0, []
+
+        params = {
+            "keyword": keyword,
+            "page": page,
+            "size": limit,
+            "order": order
+        }
+        data = self.flight.do(response_cache.make_key(params), self._fetch, params)
+
+        # 适配 Acemap 新版 JSON 结构 {"results": [...]}
+        if "results" not in data:
+            raise AcemapError("Unexpected Acemap response: missing 'results'")
+        papers = data["results"]
+        total = data.get("meta", {}).get("count", len(papers))
+        return total, papers
+
+    def iter_papers(self, keyword, filters=None, limit=20, page_size=20, max_pages=None,
+                    prefetch=True, order="desc"):
+        """
+        流式分页检索：逐页拉取并边拉边过滤，凑够 limit 篇符合 filters 的论文就停止。
+        返回 PaperStream (可迭代，迭代过程中可读取 total / pages_fetched 等信息)。
+        """
+        return PaperStream(self, keyword, filters, limit, page_size,
+                           max_pages or Config.ACEMAP_MAX_PAGES, prefetch, order)
+
+    def _submit_prefetch(self, fn, *args):
+        if self._prefetch_pool is None:
+            self._prefetch_pool = ThreadPoolExecutor(max_workers=Config.ACEMAP_POOL_SIZE,
+                                                     thread_name_prefix="acemap-prefetch")
+        return self._prefetch_pool.submit(fn, *args)
+
+
+class PaperStream:
+    """
+    iter_papers 的返回值。迭代时按需请求下一页；prefetch=True 时，
+    在处理当前页的同时后台预取下一页，翻页几乎没有等待。
+    - total:         Acemap 报告的命中总数 (拿到第一页后才有值)
+    - pages_fetched: 实际请求的页数
+    - scanned:       已检查过的论文数
+    - matched:       已产出的符合条件的论文数
+    """
+
+    def __init__(self, client, keyword, filters, limit, page_size, max_pages, prefetch, order):
+        self.client = client
+        self.keyword = keyword
+        self.filters = filters or {}
+        self.limit = limit
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.prefetch = prefetch
+        self.order = order
+
+        self.total = None
+        self.pages_fetched = 0
+        self.scanned = 0
+        self.matched = 0
+
+    def _fetch_page(self, page):
+        return self.client.search(self.keyword, limit=self.page_size, page=page, order=self.order)
+
+    def __iter__(self):
+        if not self.keyword or self.limit <= 0:
+            return
+
+        page = 1
+        pending = None
+        try:
+            total, papers = self._fetch_page(page)
+            while True:
+                self.pages_fetched += 1
+                self.total = total
+                self.scanned += len(papers)
+
+                # 还有下一页吗：本页是满的、没超过总数、没到页数上限
+                has_more = (len(papers) == self.page_size and self.scanned < total
+                            and page < self.max_pages)
+                if has_more and self.prefetch:
+                    pending = self.client._submit_prefetch(self._fetch_page, page + 1)
+
+                with tracing.span("filter.page"):
+                    kept = ResultSet(papers).filter(self.filters).papers
+                for paper in kept:
+                    self.matched += 1
+                    yield paper
+                    if self.matched >= self.limit:
+                        return
+
+                if not has_more:
+                    return
+                page += 1
+                if pending is not None:
+                    total, papers = pending.result()
+                    pending = None
+                else:
+                    total, papers = self._fetch_page(page)
+        finally:
+            # 提前结束 (凑够数量或调用方中途退出) 时丢弃还没用上的预取
+            if pending is not None:
+                pending.cancel()
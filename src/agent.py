@@ -1,49 +1,383 @@
-from typing import Dict, Any, List
-from .llm_client import LLMClient
+import asyncio
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, List, Callable, Optional, Tuple
+from .config import Config
+from .llm_client import LLMClient, AsyncLLMClient
 from .kg_linker import KGLinker
+from .intent_rules import RuleIntentParser
+from .intent_cache import normalize_query
+from .single_flight import SingleFlight, AsyncSingleFlight
+from .acemap_client import AcemapClient, AcemapError
+from . import filters as paper_filters
+from . import retrieval
+from . import tracing
+from .results import ResultSet
+
+# 检索函数签名: keyword -> (命中总数, 论文列表)，与 call_acemap_api 一致
+Searcher = Callable[[str], Tuple[int, List[Dict[str, Any]]]]
+
+
+def search_keywords(output: Dict[str, Any], user_query: str) -> List[str]:
+    """选词策略：优先全部 KG 校准后的词，其次 LLM 原始提取，最后原句兜底"""
+    params = output.get('search_params', {})
+    keywords = retrieval.dedupe_keywords(params.get('keywords_grounded', []))
+    if not keywords:
+        keywords = retrieval.dedupe_keywords(params.get('keywords_raw', []))
+    return keywords or [user_query]
+
+
+def expansion_keywords(output: Dict[str, Any]) -> List[str]:
+    """KG 扩展出的关键词 (未开启扩展时为空)，检索时以较低权重参与融合"""
+    return output.get('search_params', {}).get('keywords_expanded', [])
+
 
 class SearchAgent:
-    def __init__(self):
+    def __init__(self, searcher: Optional[Searcher] = None, concurrency: Optional[int] = None,
+                 fast_start: bool = False):
+        """
+        fast_start=True 时构造函数几乎立即返回：KG 在后台线程加载，openai 在后台预导入。
+        只有校准真正用到词表时才等待 KG，第一个查询的 LLM 往返与加载重叠；
+        KG 就绪前本地规则解析不可用，查询都走 LLM。
+        """
         self.llm = LLMClient()
-        self.kg = KGLinker()
+        self.kg = KGLinker(background=fast_start)
+        # 简单查询 (关键词都在词表里 + 年份/机构) 本地解析，不走 LLM；
+        # 规则需要词表，后台加载时等 KG 就绪后再创建，导入新分片后重建 (见 _local_intent)
+        self.rules = None
+        self._rules_generation = None
+        self._init_rules()
+        # 所有入口共用的 Acemap 检索客户端 (连接池 + 重试)
+        self.acemap = AcemapClient()
+        # 自定义检索函数 (测试/压测用)，只取第一页、在本地过滤；
+        # 为 None 时 aparse/abatch 与 fused_search 一样用 self.acemap 逐页流式检索并过滤
+        self.searcher = searcher
+        self.concurrency = concurrency or Config.AGENT_CONCURRENCY
+        # 流水线里的阻塞阶段 (KG 校准、同步检索) 专用线程池，
+        # 默认执行器只有 CPU 数 + 4 个线程，会把并发检索卡成串行
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="agent")
+        # 异步 LLM 客户端绑定事件循环，按需在当前循环里创建
+        self._allm = None
+        self._allm_loop = None
+        # 并发的相同查询 (规范化后) 共享同一次 LLM 提取 / KG 校准 / 检索
+        self.flight = SingleFlight("agent")
+        self.aflight = AsyncSingleFlight("agent_async")
+        # OpenAI 客户端 (连带导入 openai，约半秒多)：同步模式与原来一样启动时创建，
+        # 快速启动时在后台创建，两种模式的第一个查询都不用等
+        if fast_start:
+            self._executor.submit(lambda: self.llm.client)
+        else:
+            _ = self.llm.client
 
-    def parse(self, user_query: str) -> Dict[str, Any]:
+    def _init_rules(self):
+        if Config.INTENT_RULES and self.kg.ready and self._rules_generation != self.kg.generation:
+            self._rules_generation = self.kg.generation
+            self.rules = RuleIntentParser(self.kg.vocab)
+
+    def parse(self, user_query: str,
+              on_keywords: Optional[Callable[[List[str]], None]] = None) -> Dict[str, Any]:
         """
         全流程：Query -> LLM提取 -> KG校准 -> 标准化参数
+        传入 on_keywords 时改用流式 LLM：keywords 字段一生成完就校准，
+        并立刻回调 on_keywords(校准后的关键词)，调用方可以在模型输出过滤条件的同时开始检索。
         """
-        # 1. LLM 提取粗糙意图
+        # 1. 先试本地规则解析，置信度不够再让 LLM 提取粗糙意图
         # 预期格式: {'keywords': ['Grnite'], 'institution': ..., 'year_start': ...}
-        raw_intent = self.llm.extract_intent(user_query)
-        
-        # 打印调试信息，确认 LLM 是否工作
-        print(f"[Debug] LLM Raw Extract: {raw_intent}")
+        early = {}
+
+        def on_field(key, value):
+            # 流式回调：keywords 一完成就校准 (在接收流的线程里，校准只需几毫秒)
+            if key == 'keywords' and not early:
+                early['raw'] = self._raw_keywords({'keywords': value})
+                early['grounded'] = self._ground(early['raw'])
+                on_keywords(early['grounded'])
+
+        start = time.perf_counter()
+        raw_intent = self._local_intent(user_query)
+        if raw_intent is None:
+            # 同一查询已有请求在途时直接等它的结果 (跟随者收不到流式回调，拿到完整意图后在下面校准并回调)
+            with tracing.span("agent.llm"):
+                if on_keywords is not None:
+                    raw_intent = self.flight.do(("intent", normalize_query(user_query)),
+                                                self.llm.extract_intent_stream, user_query, on_field)
+                else:
+                    raw_intent = self.flight.do(("intent", normalize_query(user_query)),
+                                                self.llm.extract_intent, user_query)
+            # 调试信息，确认 LLM 是否工作 (DEBUG_LOG=off 时不输出)
+            tracing.logger.debug("LLM Raw Extract: %s", raw_intent)
 
         # 获取原始关键词 (增加容错：万一 LLM 返回了字符串而不是列表)
+        raw_keywords = self._raw_keywords(raw_intent)
+
+        # 2. KG 校准关键词 (生成新列表，不要覆盖旧的)
+        # 拿着原始词去图谱里批量查标准词 (流式模式下已经提前校准过)
+        if early.get('raw') == raw_keywords:
+            grounded_keywords = early['grounded']
+        else:
+            grounded_keywords = self._ground(raw_keywords)
+            if on_keywords is not None and not early:
+                on_keywords(grounded_keywords)
+
+        # 3. 构造符合 compare_search.py 标准的输出结构
+        output = self._build_output(raw_intent, raw_keywords, grounded_keywords,
+                                    self._expand(grounded_keywords))
+        tracing.observe("agent.parse", time.perf_counter() - start)
+        return output
+
+    def _ground(self, raw_keywords: List[str]) -> List[str]:
+        """KG 校准，相同关键词列表的并发校准只算一次 (返回副本，调用方可以随意修改)"""
+        key = ("ground", tuple(kw if isinstance(kw, str) else repr(kw) for kw in raw_keywords))
+        return list(self.flight.do(key, self.kg.ground_keywords, raw_keywords))
+
+    def _expand(self, grounded_keywords: List[str]) -> List[str]:
+        """按 Config.KG_EXPAND_* 沿图谱关系扩展关键词 (默认关闭)"""
+        if Config.KG_EXPAND_LIMIT <= 0:
+            return []
+        with tracing.span("kg.expand"):
+            return self.kg.expand_keywords(grounded_keywords, Config.KG_EXPAND_RELATIONS,
+                                           Config.KG_EXPAND_DEPTH, Config.KG_EXPAND_LIMIT)
+
+    def _local_intent(self, user_query: str) -> Optional[Dict[str, Any]]:
+        """规则解析成功返回意图，否则返回 None (需要走 LLM)"""
+        self._init_rules()
+        if self.rules is None:
+            return None
+        with tracing.span("agent.rules"):
+            intent = self.rules.route(user_query, Config.INTENT_RULES_MIN_CONFIDENCE)
+        if intent is not None:
+            tracing.logger.debug("Rule Extract: %s", intent)
+        return intent
+
+    @staticmethod
+    def _raw_keywords(raw_intent: Dict[str, Any]) -> List[str]:
         raw_keywords = raw_intent.get('keywords', [])
         if isinstance(raw_keywords, str):
             raw_keywords = [raw_keywords]
-        
-        # 2. KG 校准关键词 (生成新列表，不要覆盖旧的)
-        grounded_keywords = []
-        for kw in raw_keywords:
-            # 拿着原始词去图谱里查标准词
-            standard_kw = self.kg.ground_keyword(kw)
-            grounded_keywords.append(standard_kw)
-            
-        # 3. 构造符合 compare_search.py 标准的输出结构
+        return raw_keywords
+
+    @staticmethod
+    def _build_output(raw_intent: Dict[str, Any], raw_keywords: List[str],
+                      grounded_keywords: List[str], expanded_keywords: Optional[List[str]] = None
+                      ) -> Dict[str, Any]:
         # === 关键修改点 ===
-        output = {
-            "search_params": {
-                "keywords_raw": raw_keywords,          # 保留原始词，供对比
-                "keywords_grounded": grounded_keywords # 校准后的词，供搜索
-            },
-            "filters": {
-                # 把过滤条件单独摘出来
-                "institution": raw_intent.get('institution'),
-                "author": raw_intent.get('author'),
-                "year_start": raw_intent.get('year_start'),
-                "year_end": raw_intent.get('year_end')
-            }
+        search_params = {
+            "keywords_raw": raw_keywords,          # 保留原始词，供对比
+            "keywords_grounded": grounded_keywords # 校准后的词，供搜索
+        }
+        if expanded_keywords:
+            search_params["keywords_expanded"] = expanded_keywords  # KG 扩展词，低权重参与检索
+        return {
+            "search_params": search_params,
+            # 把过滤条件单独摘出来，年份等值在这里统一校验 (LLM 可能给出 "2020s" 之类)
+            "filters": paper_filters.clean(raw_intent)
+        }
+
+    # ==========================================
+    # 异步流水线：LLM 提取 (网络) -> KG 校准 (CPU, 线程池) -> 检索 (网络)
+    # ==========================================
+    def _async_llm(self) -> AsyncLLMClient:
+        loop = asyncio.get_running_loop()
+        if self._allm is None or self._allm_loop is not loop:
+            self._release_async_llm()
+            # 与同步客户端共用意图缓存
+            self._allm = AsyncLLMClient(cache=self.llm.cache, concurrency=self.concurrency)
+            self._allm_loop = loop
+        return self._allm
+
+    def _release_async_llm(self) -> None:
+        """
+        丢掉绑定在其它事件循环上的异步 LLM 客户端：那个循环还在 (别的线程里) 运行时
+        在它上面 aclose；循环已经结束时连接池只能随对象回收 (batch 会在退出循环前先关掉)。
+        """
+        allm, loop = self._allm, self._allm_loop
+        self._allm = self._allm_loop = None
+        if allm is not None and loop.is_running() and not loop.is_closed():
+            asyncio.run_coroutine_threadsafe(allm.aclose(), loop)
+
+    async def aclose(self) -> None:
+        """关闭当前事件循环上的异步 LLM 客户端 (连接池)，之后再调用异步接口会重新创建"""
+        allm, loop = self._allm, self._allm_loop
+        if allm is None:
+            return
+        if loop is not asyncio.get_running_loop():
+            self._release_async_llm()
+            return
+        self._allm = self._allm_loop = None
+        await allm.aclose()
+
+    def close(self) -> None:
+        """释放连接池和线程池 (同步调用方用完 SearchAgent 时调用)"""
+        self._release_async_llm()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.acemap.close()
+
+    async def aparse(self, user_query: str, search: bool = False, stream: bool = False) -> Dict[str, Any]:
+        """
+        parse 的异步版本。search=True 时顺带对所有关键词并发检索并融合，
+        在输出中加入 results: {keywords, papers, scores, totals, errors}。
+        stream=True 时用流式 LLM：keywords 一完成就开始校准、预取每个关键词的第一页，
+        与模型生成过滤条件的时间重叠；过滤条件到齐后再边翻页边过滤。
+        """
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+
+        raw_intent = self._local_intent(user_query)
+        llm_task = None
+        if raw_intent is not None:
+            partial = raw_intent
+        elif stream:
+            # 跟随者拿到的是同一个 (keywords, 提取任务)，一起等 keywords 和后续字段
+            partial, llm_task = await self.aflight.do(("stream", normalize_query(user_query)),
+                                                      self._stream_keywords, user_query)
+        else:
+            with tracing.span("agent.llm"):
+                raw_intent = partial = await self.aflight.do(("intent", normalize_query(user_query)),
+                                                             self._async_llm().extract_intent, user_query)
+            tracing.logger.debug("LLM Raw Extract: %s", raw_intent)
+        raw_keywords = self._raw_keywords(partial)
+
+        # 模糊匹配是 CPU 密集型，放到线程池里，不阻塞其它查询的网络 IO
+        grounded_keywords = await loop.run_in_executor(self._executor, self._ground, raw_keywords)
+        expanded_keywords = self._expand(grounded_keywords)
+        output = self._build_output(partial, raw_keywords, grounded_keywords, expanded_keywords)
+
+        if search:
+            keywords = search_keywords(output, user_query)
+            if llm_task is not None and self.searcher is None:
+                # 过滤条件还没生成完，先把第一页拉进响应缓存，正式检索时直接命中
+                self.prefetch(keywords + expanded_keywords)
+        if llm_task is not None:
+            raw_intent = await llm_task
+            tracing.observe("agent.llm", time.perf_counter() - start)
+            tracing.logger.debug("LLM Raw Extract: %s", raw_intent)
+            output = self._build_output(raw_intent, raw_keywords, grounded_keywords, expanded_keywords)
+
+        if search:
+            output["results"] = await self._asearch(keywords, output["filters"], expanded_keywords)
+
+        tracing.observe("agent.aparse", time.perf_counter() - start)
+        return output
+
+    async def _stream_keywords(self, user_query: str):
+        """
+        启动流式意图提取，等到 keywords 字段完成就返回 ({'keywords': ...}, 仍在进行的提取任务)。
+        提取在 keywords 之前就结束 (例如出错降级) 时返回 (完整意图, None)。
+        """
+        loop = asyncio.get_running_loop()
+        keywords_ready = loop.create_future()
+
+        def on_field(key, value):
+            if key == 'keywords' and not keywords_ready.done():
+                keywords_ready.set_result(value)
+
+        llm_task = asyncio.ensure_future(self._async_llm().extract_intent_stream(user_query, on_field))
+        await asyncio.wait({keywords_ready, llm_task}, return_when=asyncio.FIRST_COMPLETED)
+        if keywords_ready.done():
+            return {'keywords': keywords_ready.result()}, llm_task
+        raw_intent = await llm_task
+        tracing.logger.debug("LLM Raw Extract: %s", raw_intent)
+        return raw_intent, None
+
+    async def _asearch(self, keywords: List[str], filters: Dict[str, Any],
+                       expansions: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        所有关键词 (+ KG 扩展词) 并发检索，每个关键词边翻页边按 filters 过滤 (与 fused_search 相同)，
+        再 RRF 融合去重。关键词、扩展词、过滤条件都相同的并发查询共享同一次检索。
+        """
+        key = ("fetch", tuple(keywords), tuple(expansions or ()),
+               tuple(sorted((k, repr(v)) for k, v in (filters or {}).items())))
+        return self._fuse(*(await self.aflight.do(key, self._afetch, keywords, filters, expansions)))
+
+    async def _afetch(self, keywords: List[str], filters: Dict[str, Any],
+                      expansions: Optional[List[str]] = None):
+        """并发检索所有关键词，返回 (关键词, RRF 权重, 每个关键词的 ((total, papers), error))"""
+        loop = asyncio.get_running_loop()
+        keywords, weights = retrieval.keyword_weights(keywords, expansions)
+
+        def search_one(keyword):
+            try:
+                if self.searcher is None:
+                    return retrieval.stream_keyword(self.acemap, keyword, filters), None
+                total, papers = self.searcher(keyword)
+                return (total, ResultSet(papers).filter(filters).papers[:retrieval.PER_KEYWORD]), None
+            except AcemapError as e:
+                return (None, []), str(e)
+
+        with tracing.span("agent.search"):
+            outcomes = await asyncio.gather(
+                *(loop.run_in_executor(self._executor, search_one, kw) for kw in keywords)
+            )
+        return keywords, weights, outcomes
+
+    @staticmethod
+    def _fuse(keywords: List[str], weights: List[float], outcomes) -> Dict[str, Any]:
+        # 每个关键词的结果已经过滤过，这里只融合和排序
+        with tracing.span("retrieval.fuse"):
+            fused = retrieval.reciprocal_rank_fusion([papers for (_, papers), _ in outcomes], weights)
+            ranked = ResultSet([p for p, _ in fused], [s for _, s in fused])
+            if Config.RESULT_SORT != "score":
+                ranked = ranked.top_k(len(ranked), Config.RESULT_SORT)
+        return {
+            "keywords": keywords,
+            "papers": ranked.papers,
+            "scores": ranked.scores.tolist(),
+            # 检索失败的关键词单独记录，不与"0 条结果"混淆，也不影响同批其它查询
+            "totals": {kw: total for kw, ((total, _), err) in zip(keywords, outcomes) if not err},
+            "errors": {kw: err for kw, (_, err) in zip(keywords, outcomes) if err},
+        }
+
+    def flight_stats(self) -> Dict[str, Any]:
+        """请求合并统计：实际执行次数 / 搭便车的次数"""
+        return {
+            "agent": self.flight.stats(),
+            "agent_async": self.aflight.stats(),
+            "acemap": self.acemap.flight.stats(),
         }
-        
-        return output
\ No newline at end of file
+
+    def prefetch(self, keywords: List[str], page_size: int = 20) -> List[Future]:
+        """
+        后台预取每个关键词的第一页，写入 Acemap 响应缓存；之后 fused_search / iter_papers
+        请求同一页时直接命中缓存。未启用响应缓存时预取没有意义，返回空列表。
+        """
+        if self.acemap.cache is None:
+            return []
+
+        def warm(keyword):
+            try:
+                self.acemap.search(keyword, limit=page_size)
+            except AcemapError:
+                # 预取失败无所谓，正式检索时会重试并报告错误
+                pass
+
+        return [self._executor.submit(warm, kw) for kw in retrieval.dedupe_keywords(keywords)]
+
+    async def abatch(self, queries: List[str], search: bool = False,
+                     concurrency: Optional[int] = None, stream: bool = False) -> List[Dict[str, Any]]:
+        """
+        并发处理一批查询，每条查询独立走完整条流水线，
+        不同查询的 LLM / 校准 / 检索阶段互相重叠。结果顺序与输入一致。
+        某条查询出错时它的位置是 {"query": ..., "error": ...}，不影响同批其它查询。
+        """
+        semaphore = asyncio.Semaphore(concurrency or self.concurrency)
+
+        async def run_one(query):
+            async with semaphore:
+                try:
+                    return await self.aparse(query, search=search, stream=stream)
+                except Exception as e:
+                    print(f"[Agent Error] Query {query!r} failed: {e}")
+                    tracing.count("agent.query_error")
+                    return {"query": query, "error": str(e)}
+
+        return await asyncio.gather(*(run_one(q) for q in queries))
+
+    def batch(self, queries: List[str], search: bool = False,
+              concurrency: Optional[int] = None, stream: bool = False) -> List[Dict[str, Any]]:
+        """同步调用方的便捷入口 (内部新建事件循环跑 abatch，退出循环前关掉绑定在它上面的 LLM 连接池)"""
+        async def run():
+            try:
+                return await self.abatch(queries, search=search, concurrency=concurrency, stream=stream)
+            finally:
+                await self.aclose()
+
+        return asyncio.run(run())
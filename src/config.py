@@ -16,5 +16,76 @@ class Config:
     # 构建数据文件的绝对路径 (兼容 Windows/Mac/Linux)
     DATA_PATH = BASE_DIR / os.getenv("GAKG_PATH", "data/gakg_subset.parquet")
 
+    # KG 词表/索引快照的缓存目录 (parquet 变化后自动重建)
+    KG_CACHE_DIR = BASE_DIR / os.getenv("KG_CACHE_DIR", "data/.kg_cache")
+
+    # 增量导入的 KG 分片：parquet 文件或目录 (逗号分隔)，没导入过的分片构建成增量层叠加在快照上；
+    # 增量层超过 KG_MAX_DELTAS 个时后台合并进基础快照
+    KG_SHARDS = [BASE_DIR / p for p in os.getenv("KG_SHARDS", "").split(",") if p]
+    KG_MAX_DELTAS = int(os.getenv("KG_MAX_DELTAS", 8))
+
+    # 批量 KG 校准的工作进程数 (0 表示在当前进程里算)；批量小于 MIN_BATCH 时不走进程池
+    GROUNDING_PROCESSES = int(os.getenv("GROUNDING_PROCESSES", 0))
+    GROUNDING_MIN_BATCH = int(os.getenv("GROUNDING_MIN_BATCH", 64))
+
+    # 快速启动 (on/off，交互演示)：KG 在后台线程加载，openai 后台预导入，
+    # 第一个查询的 LLM 往返与 KG 加载重叠
+    FAST_START = os.getenv("FAST_START", "on") != "off"
+
+    # KG 校准结果缓存: disk (内存 + SQLite，重启后保留，默认) / memory / off；条目数上限
+    GROUNDING_MEMO = os.getenv("GROUNDING_MEMO", "disk")
+    GROUNDING_MEMO_SIZE = int(os.getenv("GROUNDING_MEMO_SIZE", 100000))
+
+    # KG 查询扩展：每个关键词最多扩展几个词 (0 表示关闭) / 沿哪些关系 (逗号分隔，留空为全部) / 几跳
+    KG_EXPAND_LIMIT = int(os.getenv("KG_EXPAND_LIMIT", 0))
+    KG_EXPAND_RELATIONS = [r for r in os.getenv("KG_EXPAND_RELATIONS", "is_a,related_to").split(",") if r] or None
+    KG_EXPAND_DEPTH = int(os.getenv("KG_EXPAND_DEPTH", 1))
+
     # 模型选择
-    MODEL_NAME = "qwen-plus" 
\ No newline at end of file
+    MODEL_NAME = "qwen-plus" 
+
+    # 异步 LLM 客户端：同时在途的请求上限 / 单次请求超时 (秒)
+    LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", 8))
+    LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 60))
+    # 流式接收 LLM 输出 (on/off)：keywords 一生成完就开始校准和检索 (交互演示 / HTTP 服务)
+    LLM_STREAM = os.getenv("LLM_STREAM", "on") != "off"
+    # 批量意图提取时每个 Prompt 打包的查询数
+    LLM_BATCH_SIZE = int(os.getenv("LLM_BATCH_SIZE", 20))
+
+    # 本地规则意图解析 (on/off)：置信度达到阈值的简单查询不调用 LLM
+    INTENT_RULES = os.getenv("INTENT_RULES", "on") != "off"
+    INTENT_RULES_MIN_CONFIDENCE = float(os.getenv("INTENT_RULES_MIN_CONFIDENCE", 1.0))
+
+    # Acemap 检索接口
+    ACEMAP_API_URL = os.getenv("ACEMAP_API_URL", "https://acemap.info/api/v1/work/search")
+    ACEMAP_CONNECT_TIMEOUT = float(os.getenv("ACEMAP_CONNECT_TIMEOUT", 3.05))
+    ACEMAP_READ_TIMEOUT = float(os.getenv("ACEMAP_READ_TIMEOUT", 10))
+    ACEMAP_MAX_RETRIES = int(os.getenv("ACEMAP_MAX_RETRIES", 3))
+    ACEMAP_BACKOFF = float(os.getenv("ACEMAP_BACKOFF", 0.5))  # 首次重试前的基础等待 (秒)
+    ACEMAP_POOL_SIZE = int(os.getenv("ACEMAP_POOL_SIZE", 16))
+
+    # 流式分页检索最多翻多少页 (过滤条件很严格时防止无限翻页)
+    ACEMAP_MAX_PAGES = int(os.getenv("ACEMAP_MAX_PAGES", 10))
+
+    # 融合后的结果排序: score (RRF 相关度，默认) / cited (被引数) / year (年份，新的在前)
+    RESULT_SORT = os.getenv("RESULT_SORT", "score")
+
+    # Acemap 响应缓存：内存条目数 (0 表示关闭) / 新鲜期 (秒) / 磁盘层路径 (留空只用内存)
+    ACEMAP_CACHE_SIZE = int(os.getenv("ACEMAP_CACHE_SIZE", 1024))
+    ACEMAP_CACHE_TTL = int(os.getenv("ACEMAP_CACHE_TTL", 600))
+    ACEMAP_CACHE_PATH = BASE_DIR / os.getenv("ACEMAP_CACHE_PATH") if os.getenv("ACEMAP_CACHE_PATH") else None
+
+    # 分阶段耗时/计数埋点 (on/off)，见 src/tracing.py；GET /metrics 导出
+    TRACING = os.getenv("TRACING", "on") != "off"
+    # [Debug] 调试输出 (on/off)：off 时变成被禁用的 logging 调用，不再格式化和打印；
+    # 命令行工具默认 on，server.py 未显式设置时关闭
+    DEBUG_LOG = os.getenv("DEBUG_LOG", "on") != "off"
+
+    # SearchAgent.abatch 同时处理的查询数
+    AGENT_CONCURRENCY = int(os.getenv("AGENT_CONCURRENCY", 16))
+
+    # LLM 意图缓存: memory (进程内) / sqlite (本地持久化) / off
+    INTENT_CACHE = os.getenv("INTENT_CACHE", "memory")
+    INTENT_CACHE_TTL = int(os.getenv("INTENT_CACHE_TTL", 24 * 3600))  # 秒
+    INTENT_CACHE_SIZE = int(os.getenv("INTENT_CACHE_SIZE", 10000))
+    INTENT_CACHE_PATH = BASE_DIR / os.getenv("INTENT_CACHE_PATH", "data/.intent_cache.sqlite")
@@ -0,0 +1,114 @@
+# src/filters.py
+"""
+客户端过滤条件 (Acemap 接口不支持的年份/作者/机构过滤)。
+
+filters 就是 SearchAgent.parse 输出里的 "filters" 字典：
+    {"institution": ..., "author": ..., "year_start": ..., "year_end": ...}
+值为 None/空 的条件不生效。LLM 给出的值不一定合法 ("2020s"、"recent"、2019.5)，
+构建 filters 时先经过 clean()，后面的 matches / ResultSet.mask 只处理干净的值。
+"""
+
+
+def paper_year(paper):
+    """论文年份，缺失或非法时返回 None"""
+    year = paper.get('publication_year')
+    try:
+        return int(year) if year else None
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_year(value):
+    """过滤条件里的年份：整数或整数形式的字符串/浮点数 (2020、"2020"、2020.0)，其它返回 None"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        if not value.isdigit():
+            return None
+    try:
+        year = float(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    return int(year) if year.is_integer() and year > 0 else None
+
+
+def clean(filters):
+    """
+    规范化 filters：年份转成 int，解析不了的年份丢掉 (当作没有这个条件)；
+    作者/机构只保留非空字符串。
+    """
+    filters = filters or {}
+    text = {key: filters.get(key).strip() if isinstance(filters.get(key), str) else None
+            for key in ('institution', 'author')}
+    return {
+        "institution": text['institution'] or None,
+        "author": text['author'] or None,
+        "year_start": parse_year(filters.get('year_start')),
+        "year_end": parse_year(filters.get('year_end')),
+    }
+
+
+def paper_authors(paper):
+    return [a.get('author', {}).get('display_name') or "" for a in paper.get('authorships') or []]
+
+
+def paper_institutions(paper):
+    return [inst.get('display_name') or ""
+            for a in paper.get('authorships') or []
+            for inst in a.get('institutions') or []]
+
+
+def _contains(values, needle):
+    needle = needle.casefold()
+    return any(needle in v.casefold() for v in values)
+
+
+def matches(paper, filters):
+    """
+    判断一篇论文是否满足过滤条件：
+    - 年份：年份必须存在且在 [year_start, year_end] 内 (与原来的逻辑一致)
+    - 作者/机构：大小写不敏感的子串匹配。Acemap 列表接口常常不带作者/机构信息，
+      没有 authorships 的论文无法判断，直接保留，避免把所有结果都过滤掉
+    """
+    if not filters:
+        return True
+
+    year_start = filters.get('year_start')
+    year_end = filters.get('year_end')
+    if year_start or year_end:
+        year = paper_year(paper)
+        if year is None:
+            return False
+        if year_start and year < int(year_start):
+            return False
+        if year_end and year > int(year_end):
+            return False
+    return matches_names(paper, filters)
+
+
+def matches_names(paper, filters):
+    """matches 里的作者/机构部分 (不看年份)"""
+    if paper.get('authorships'):
+        author = filters.get('author')
+        if author and not _contains(paper_authors(paper), author):
+            return False
+        institution = filters.get('institution')
+        if institution and not _contains(paper_institutions(paper), institution):
+            return False
+
+    return True
+
+
+def describe(filters):
+    """生成过滤条件的可读描述，用于日志"""
+    parts = []
+    if filters.get('year_start'):
+        parts.append(f"年份 >= {filters['year_start']}")
+    if filters.get('year_end'):
+        parts.append(f"年份 <= {filters['year_end']}")
+    if filters.get('author'):
+        parts.append(f"作者 ~ {filters['author']}")
+    if filters.get('institution'):
+        parts.append(f"机构 ~ {filters['institution']}")
+    return ", ".join(parts)
@@ -0,0 +1,425 @@
+# src/fuzzy_index.py
+"""
+字符 n-gram 倒排索引：为 KG 词表的模糊匹配预先筛选候选词。
+
+原来的做法是 process.extractOne(keyword, vocab)，每个关键词都要对整个词表
+逐个计算 WRatio，耗时随词表线性增长。这里不再按 trigram 相似度截取固定数量的候选
+(WRatio 取 ratio / token_set / partial 等几种打分的最大值，trigram 相似度低的词也可能得高分)，
+而是给每个词算一个 WRatio 的上界 (见 wratio_bound)，只核对上界不低于当前最高分的词：
+- 与查询共享 trigram 的词从倒排表里查出来，按公共 trigram 数、长度、
+  查询里哪些词 (token) 可能整个出现在它里面，逐个算上界
+- 不共享任何 trigram 的词只与长度有关，按词表里出现过的 (长度, 去重词长) 组合算一个总上界，
+  只有它不低于当前最高分时才退回扫描整个词表
+- 核对时先用 rapidfuzz 的 WRatio 再收紧一次上界 (C++ 实现，比 fuzzywuzzy 快得多)，
+  最后由 fuzzywuzzy 的 WRatio 决定结果
+所以返回的 (最佳匹配, 分数) 与线性扫描一致，同分时取词表下标最小的词。
+
+预处理后不足 NGRAM_SIZE 个字符的查询 (例如元素/矿物缩写 "Fe"、"Qz") 没有 trigram，
+单独处理：WRatio 的 partial 打分会给包含它的长词 90 分，这些词从 trigram 键里直接查出来。
+"""
+from array import array
+
+import numpy as np
+from fuzzywuzzy import fuzz, utils
+
+try:
+    from rapidfuzz import fuzz as rf_fuzz, process as rf_process
+except ImportError:
+    rf_fuzz = rf_process = None
+
+# trigram：对拼写错误足够宽容，倒排表又不会太大
+NGRAM_SIZE = 3
+# 短查询 (不足 NGRAM_SIZE 个字符) 对长词的 WRatio 上限：包含它时 partial_ratio 100 x 0.9；
+# 不包含它时 partial 部分至多 50 分，整体 ratio 至多 2*2/(2+3) = 80
+SHORT_HIT_BOUND = 90
+SHORT_MISS_BOUND = 80
+# rapidfuzz 的 WRatio 不会比 fuzzywuzzy 低超过这么多分：两边的 ratio 都是 Indel 相似度，
+# rapidfuzz 的 partial_ratio 找的是最优对齐 (fuzzywuzzy 只试匹配块对应的窗口)，
+# 差别只在 fuzzywuzzy 每一步都取整 (至多 1 分)，留一分余量
+SCORE_SLACK = 2
+# trigram 键里每个码位占的位数
+_CODE_BITS = 21
+_CODE_MASK = (1 << _CODE_BITS) - 1
+# 每次用 rapidfuzz 收紧上界的候选数
+VERIFY_CHUNK = 256
+# 退回全表扫描时每块预处理的词数
+SCAN_CHUNK = 4096
+
+
+def normalize(text):
+    """
+    与 process.extractOne 默认设置完全一致的预处理：
+    先 full_process，再在 WRatio 内部做 force_ascii 的 full_process。
+    """
+    return utils.full_process(utils.full_process(text), force_ascii=True)
+
+
+def gram_keys(processed):
+    """
+    把预处理后的字符串切成 trigram，并把每个 trigram 编码成一个 int64 键
+    (三个码位各占 21 bit)，方便用 numpy 排序和二分查找。
+    """
+    padded = f" {processed} "
+    return {
+        (ord(padded[i]) << 2 * _CODE_BITS) | (ord(padded[i + 1]) << _CODE_BITS) | ord(padded[i + 2])
+        for i in range(len(padded) - NGRAM_SIZE + 1)
+    }
+
+
+def unique_token_length(processed):
+    """token_set_ratio 里 "去重后的词用空格连接" 的长度"""
+    tokens = set(processed.split())
+    return sum(len(t) for t in tokens) + len(tokens) - 1 if tokens else 0
+
+
+class QueryStats:
+    """上界计算要用到的查询统计量 (都针对预处理后的查询)"""
+
+    def __init__(self, processed):
+        tokens = processed.split()
+        unique = set(tokens)
+        self.length = len(processed)
+        # 带填充的 trigram 共 length 个，重复出现的部分不计入 gram_keys
+        self.dup = self.length - len(gram_keys(processed))
+        # token_sort_ratio 比较的串 (词排序后用一个空格连接) 的长度和词数
+        self.sorted_length = sum(len(t) for t in tokens) + len(tokens) - 1
+        self.token_count = len(tokens)
+        # token_set_ratio 比较的串 (去重) 的长度和词数
+        self.unique_length = sum(len(t) for t in unique) + len(unique) - 1
+        self.unique_count = len(unique)
+        self.unique_tokens = sorted(unique)
+
+
+def _pct(ratio):
+    """相似度 (0~1) 上界 -> fuzzywuzzy 取整后的百分制分数上界"""
+    return np.minimum(100.0, 100.0 * ratio + 0.5)
+
+
+def _indel_bound(common, len_a, len_b):
+    """
+    fuzz.ratio / 100 (2 * LCS / 总长) 的上界。common 是两串 (两端各补一个空格后) 公共 trigram 数的上界：
+    LCS 以外的每个字符最多破坏 3 个 trigram，每处插入最多破坏 2 个，所以 common >= 5 * LCS - 2 * 总长。
+    """
+    total = len_a + len_b
+    lcs = np.minimum(np.minimum(len_a, len_b), np.floor((common + 2 * total) / 5))
+    return 2 * lcs / total
+
+
+def _partial_bound(common, shorter):
+    """
+    partial_ratio / 100 的上界：较短串 (长 shorter) 与较长串里任意长 w <= shorter 的窗口的 ratio。
+    窗口两端补空格后多出至多 2 个原串里没有的 trigram，于是 ratio <= min(2w / (s + w), 0.8 + 0.4 * (common + 2) / (s + w))，
+    前者随 w 增大、后者随 w 减小，取两者交点 (或 w = shorter)。
+    """
+    c = common + 2
+    w = (2 * shorter + c) / 3
+    return np.where(w < shorter, 2 * w / (shorter + w), np.minimum(1.0, 0.8 + 0.2 * c / shorter))
+
+
+def _sorted_bound(common, length, other_lo, other_hi):
+    """与 _indel_bound 相同，但另一串的长度只知道在 [other_lo, other_hi] 内 (取上界最大的长度)"""
+    peak = np.minimum(length, (2 * length + common) / 3)
+    other = np.clip(peak, other_lo, other_hi)
+    total = length + other
+    return np.minimum(2 * np.minimum(length, other) / total, 0.8 + 0.4 * common / total)
+
+
+def wratio_bound(query, lengths, token_lengths, overlap, dups, shared_length, shared_count):
+    """
+    fuzz.WRatio(查询, 词) 的上界 (numpy 向量化，每个词一个值)。
+    - lengths / token_lengths: 词预处理后的长度 / 去重后的词连接起来的长度
+    - overlap / dups:          与查询公共的 trigram 数 (去重) / 词自身重复的 trigram 数
+    - shared_length / count:   查询里可能整个出现在这个词里的 token 总长 / 个数
+    按 WRatio 的分支分别估计 ratio、token_sort/token_set (长度比 < 1.5) 和各个 partial 打分 (长度比 >= 1.5)，
+    取整规则与 fuzzywuzzy 相同 (只会偏大)。
+    """
+    lengths = np.asarray(lengths, dtype=np.float64)
+    token_lengths = np.asarray(token_lengths, dtype=np.float64)
+    # 公共 trigram (计重复) 的上界；一个都不共享时为 0
+    common = np.where(overlap > 0, overlap + np.minimum(query.dup, dups), 0)
+    base = _pct(_indel_bound(common, query.length, lengths))
+
+    # token_set：交集部分的长度不超过可能共享的 token 总长
+    sect = np.where(shared_count > 0, np.minimum(query.unique_length, shared_length + shared_count - 1), 0)
+    sect_t = np.minimum(sect, token_lengths)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r1 = np.where(sect > 0, 2 * sect / (sect + query.unique_length), 0)
+        r2 = np.where(sect_t > 0, 2 * sect_t / (sect_t + token_lengths), 0)
+    r3 = _indel_bound(common + query.unique_count - 1, query.unique_length, token_lengths)
+    token_set = _pct(np.maximum(np.maximum(r1, r2), r3))
+    # token_sort：排序后多出来的只有词与词之间跨空格的 trigram
+    token_sort = _pct(_sorted_bound(common + query.token_count - 1, query.sorted_length,
+                                    token_lengths, lengths))
+    whole = 0.95 * np.maximum(token_sort, token_set)
+
+    shorter = np.minimum(query.length, lengths)
+    len_ratio = np.maximum(query.length, lengths) / shorter
+    partial = _pct(_partial_bound(common, shorter))
+    partial_sort = _pct(_partial_bound(common + query.token_count - 1,
+                                       np.minimum(query.sorted_length, token_lengths)))
+    # 有共享 token 时 partial_token_set_ratio 直接是 100
+    partial_set = np.where(shared_count > 0, 100.0,
+                           _pct(_partial_bound(common + query.unique_count - 1,
+                                               np.minimum(query.unique_length, token_lengths))))
+    scale = np.where(len_ratio > 8, 0.6, 0.9)
+    partial = scale * np.maximum(partial, 0.95 * np.maximum(partial_sort, partial_set))
+
+    return np.floor(np.maximum(base, np.where(len_ratio < 1.5, whole, partial)) + 0.5)
+
+
+class NgramIndex:
+    """
+    CSR 结构的 trigram 倒排索引：
+    - keys:          排好序的 trigram 键
+    - offsets:       keys[i] 的倒排链是 postings[offsets[i]:offsets[i+1]]
+    - postings:      词表下标 (term id)
+    - gram_counts:   每个词自身的 trigram 数 (去重)
+    - short_ids:     预处理后长度 < NGRAM_SIZE、或去重后的词连接起来不超过 NGRAM_SIZE 个字符的短词，
+                     partial 打分可能不共享 trigram 也给它们高分，所以每次都参与核对
+    - lengths:       每个词预处理后的长度
+    - token_lengths: 每个词去重后的 token 用空格连接起来的长度
+    后两项和 gram_counts 一起用来算 WRatio 的上界 (wratio_bound)
+    短查询本身的候选见 containing / _extract_short
+    """
+
+    def __init__(self, terms, keys, offsets, postings, gram_counts, short_ids, lengths, token_lengths):
+        self.terms = terms
+        self.keys = keys
+        self.offsets = offsets
+        self.postings = postings
+        self.gram_counts = gram_counts
+        self.short_ids = short_ids
+        self.lengths = lengths
+        self.token_lengths = token_lengths
+        self._length_pairs = None
+
+    @classmethod
+    def build(cls, terms):
+        """从词表 (可按下标访问的字符串序列) 构建索引"""
+        gram_buf = array('q')
+        id_buf = array('q')
+        gram_counts = np.zeros(len(terms), dtype=np.int32)
+        lengths = np.zeros(len(terms), dtype=np.int32)
+        token_lengths = np.zeros(len(terms), dtype=np.int32)
+        short_ids = []
+
+        for term_id, term in enumerate(terms):
+            processed = normalize(term)
+            if not processed:
+                # 预处理后为空的词 WRatio 恒为 0，不可能成为匹配结果
+                continue
+            lengths[term_id] = len(processed)
+            token_lengths[term_id] = unique_token_length(processed)
+            if len(processed) < NGRAM_SIZE or token_lengths[term_id] <= NGRAM_SIZE:
+                short_ids.append(term_id)
+            grams = gram_keys(processed)
+            gram_counts[term_id] = len(grams)
+            gram_buf.extend(grams)
+            id_buf.extend([term_id] * len(grams))
+
+        all_keys = np.frombuffer(gram_buf, dtype=np.int64)
+        all_ids = np.frombuffer(id_buf, dtype=np.int64)
+
+        # 按 trigram 键排序后压成 CSR
+        order = np.argsort(all_keys, kind='stable')
+        keys, counts = np.unique(all_keys[order], return_counts=True)
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        postings = all_ids[order].astype(np.int32)
+
+        return cls(terms, keys, offsets, postings, gram_counts,
+                   np.asarray(short_ids, dtype=np.int32), lengths, token_lengths)
+
+    def __len__(self):
+        return len(self.terms)
+
+    def _postings(self, query_keys):
+        """查询键在索引里的倒排链，拼接成一个数组 (没有命中时为空)"""
+        pos = np.searchsorted(self.keys, query_keys)
+        found = pos < len(self.keys)
+        found[found] = self.keys[pos[found]] == query_keys[found]
+        pos = pos[found]
+        if len(pos) == 0:
+            return np.empty(0, dtype=np.int32), 0
+        return np.concatenate([self.postings[self.offsets[p]:self.offsets[p + 1]] for p in pos]), len(pos)
+
+    def bounds(self, processed_query, query=None):
+        """
+        返回 (候选词下标, 每个候选的 WRatio 上界, 其余词的上界)。
+        候选是与查询共享 trigram 的词加上所有短词；其余的词不共享任何 trigram，
+        上界只取决于长度，按 (长度, 去重词长) 组合取最大值 (没有其余的词时为 -1)。
+        """
+        query = query or QueryStats(processed_query)
+        hits, _ = self._postings(np.fromiter(gram_keys(processed_query), dtype=np.int64))
+        ids, overlap = np.unique(hits, return_counts=True)
+        ids = ids.astype(np.int64)
+
+        # 查询里的每个 token：所有 trigram (两端补空格) 都出现在某个词里，它才可能是这个词的 token
+        shared_length = np.zeros(len(ids), dtype=np.int64)
+        shared_count = np.zeros(len(ids), dtype=np.int64)
+        for token in query.unique_tokens:
+            token_keys = np.fromiter(gram_keys(token), dtype=np.int64)
+            token_hits, n_found = self._postings(token_keys)
+            if n_found < len(token_keys):
+                continue
+            holders, counts = np.unique(token_hits, return_counts=True)
+            at = np.searchsorted(ids, holders[counts == len(token_keys)])
+            shared_length[at] += len(token)
+            shared_count[at] += 1
+
+        short = np.setdiff1d(np.asarray(self.short_ids, dtype=np.int64), ids, assume_unique=True)
+        ids = np.concatenate([ids, short])
+        zeros = np.zeros(len(short), dtype=np.int64)
+        overlap = np.concatenate([overlap, zeros])
+        shared_length = np.concatenate([shared_length, zeros])
+        shared_count = np.concatenate([shared_count, zeros])
+
+        lengths = np.asarray(self.lengths)[ids]
+        dups = lengths - np.asarray(self.gram_counts)[ids]
+        bounds = wratio_bound(query, lengths, np.asarray(self.token_lengths)[ids], overlap, dups,
+                              shared_length, shared_count)
+
+        rest = -1
+        pair_lengths, pair_token_lengths, has_empty = self.length_pairs()
+        if len(pair_lengths):
+            zeros = np.zeros(len(pair_lengths))
+            rest = wratio_bound(query, pair_lengths, pair_token_lengths, zeros, zeros, zeros, zeros).max()
+        if has_empty:
+            # 预处理后为空的词得 0 分，cutoff 为 0 且最高分也是 0 时按下标参与比较
+            rest = max(rest, 0)
+        return ids, bounds, rest
+
+    def length_pairs(self):
+        """
+        非短词里出现过的 (长度, 去重词长) 组合，以及是否有预处理后为空的词。
+        不共享 trigram 的词的上界只取决于这两个值，第一次用到时计算并缓存。
+        """
+        if self._length_pairs is None:
+            lengths = np.asarray(self.lengths, dtype=np.int64)
+            keep = lengths > 0
+            keep[np.asarray(self.short_ids, dtype=np.int64)] = False
+            pairs = np.unique((lengths[keep] << 32) | np.asarray(self.token_lengths, dtype=np.int64)[keep])
+            self._length_pairs = (pairs >> 32, pairs & 0xFFFFFFFF, bool((lengths == 0).any()))
+        return self._length_pairs
+
+    def containing(self, processed_query):
+        """
+        预处理后包含 processed_query (短于 NGRAM_SIZE) 的词的下标 (升序)。
+        词里每一处出现都是某个 trigram 的中间字符 (+ 末尾字符)，按位掩码在 keys 上一次筛出来。
+        """
+        codes = [ord(ch) for ch in processed_query]
+        mask = ((self.keys >> _CODE_BITS) & _CODE_MASK) == codes[0]
+        if len(codes) > 1:
+            mask &= (self.keys & _CODE_MASK) == codes[1]
+        pos = np.flatnonzero(mask)
+        if len(pos) == 0:
+            return np.empty(0, dtype=np.int32)
+        return np.unique(np.concatenate([self.postings[self.offsets[p]:self.offsets[p + 1]] for p in pos]))
+
+    def _score(self, processed_query, term_id):
+        return fuzz.WRatio(processed_query, normalize(self.terms[term_id]), full_process=False)
+
+    def _verify(self, processed_query, ids, bounds, best, score_cutoff=0, workers=1):
+        """
+        按上界从高到低 (同上界按下标升序) 核对候选，返回更新后的 (term_id, 分数)。
+        每 VERIFY_CHUNK 个候选用 rapidfuzz 的 WRatio + SCORE_SLACK 收紧一次上界，
+        再由 fuzzywuzzy 的 WRatio 打分。同分取下标最小的词，所以上界低于当前最高分 (或阈值)、
+        或者只与最高分持平而下标更大的候选都可以跳过。
+        """
+        best_id, best_score = best
+        ids = np.asarray(ids)
+
+        def can_win(upper, term_ids):
+            return (upper >= score_cutoff) & ((upper > best_score) | ((upper == best_score) & (term_ids < best_id)))
+
+        pending = np.lexsort((ids, -bounds))
+        while len(pending):
+            # 最高分每核对一块都可能提高，剩下的候选重新筛一遍
+            pending = pending[can_win(bounds[pending], ids[pending])]
+            chunk, pending = pending[:VERIFY_CHUNK], pending[VERIFY_CHUNK:]
+            if not len(chunk):
+                break
+            term_ids = ids[chunk]
+            choices = [normalize(self.terms[term_id]) for term_id in term_ids]
+            upper = bounds[chunk]
+            if rf_process is not None:
+                rf_scores = rf_process.cdist(
+                    [processed_query], choices, scorer=rf_fuzz.WRatio, processor=None,
+                    score_cutoff=max(0, max(best_score, score_cutoff) - SCORE_SLACK),
+                    dtype=np.float32, workers=workers,
+                )[0]
+                upper = np.minimum(upper, rf_scores + SCORE_SLACK)
+            for j in np.lexsort((term_ids, -upper)):
+                if not can_win(upper[j], term_ids[j]):
+                    continue
+                score = fuzz.WRatio(processed_query, choices[j], full_process=False)
+                term_id = int(term_ids[j])
+                if score > best_score or (score == best_score and term_id < best_id):
+                    best_id, best_score = term_id, score
+        return best_id, best_score
+
+    def _scan(self, processed_query, best, score_cutoff=0, workers=1):
+        """对整个词表逐块核对 (上界无法排除其余的词时才用)"""
+        for start in range(0, len(self.terms), SCAN_CHUNK):
+            ids = np.arange(start, min(start + SCAN_CHUNK, len(self.terms)))
+            best = self._verify(processed_query, ids, np.full(len(ids), 100.0), best, score_cutoff, workers)
+        return best
+
+    def _extract_short(self, processed_query, score_cutoff=0, workers=1):
+        """
+        短查询的最佳匹配 (term_id, 分数)：先给所有短词打分，再按下标升序给包含查询的长词打分，
+        某个长词拿到上限 SHORT_HIT_BOUND 后更靠后的词不可能更好，提前结束。
+        最好的分数不超过 SHORT_MISS_BOUND 时不包含查询的长词也可能并列或更高，
+        此时退回对整个词表的扫描 (score_cutoff 高于这个上限时不必扫描)。
+        """
+        best_id, best_score = -1, -1
+        for term_id in self.short_ids:
+            score = self._score(processed_query, term_id)
+            if score > best_score or (score == best_score and term_id < best_id):
+                best_id, best_score = term_id, score
+
+        if best_score <= SHORT_HIT_BOUND:
+            for term_id in np.setdiff1d(self.containing(processed_query), self.short_ids):
+                if best_score >= SHORT_HIT_BOUND and term_id > best_id:
+                    break
+                score = self._score(processed_query, term_id)
+                if score > best_score or (score == best_score and term_id < best_id):
+                    best_id, best_score = term_id, score
+
+        if best_score <= SHORT_MISS_BOUND and score_cutoff <= SHORT_MISS_BOUND:
+            best_id, best_score = self._scan(processed_query, (best_id, best_score), score_cutoff, workers)
+
+        return best_id, best_score
+
+    def _extract(self, processed_query, score_cutoff=0, workers=1):
+        """预处理后的查询的最佳匹配 (term_id, 分数)；没有任何词时 term_id 为 -1"""
+        if len(processed_query) < NGRAM_SIZE:
+            return self._extract_short(processed_query, score_cutoff, workers)
+        ids, bounds, rest = self.bounds(processed_query)
+        best = self._verify(processed_query, ids, bounds, (-1, -1), score_cutoff, workers)
+        if rest >= max(best[1], score_cutoff):
+            best = self._scan(processed_query, best, score_cutoff, workers)
+        return best
+
+    def extract_one(self, query, score_cutoff=0, workers=1):
+        """
+        与 process.extractOne(query, terms, score_cutoff=score_cutoff) 结果相同：返回 (最佳匹配, 分数)，
+        分数相同时取词表下标最小的那个，与线性扫描的先到先得一致。
+        词表为空或最高分低于 score_cutoff 时返回 None；唯一的区别是查询预处理后为空时
+        extractOne 会返回第一个词 (0 分)，这里返回 None。
+        """
+        processed_query = normalize(query)
+        if not processed_query:
+            return None
+        best_id, best_score = self._extract(processed_query, score_cutoff, workers)
+        if best_id < 0 or best_score < score_cutoff:
+            return None
+        return self.terms[best_id], best_score
+
+    def extract_batch(self, queries, score_cutoff=0, workers=1):
+        """
+        批量版 extract_one：返回与 queries 对齐的 [(最佳匹配, 分数) 或 None]，
+        每个查询的结果与 extract_one(query, score_cutoff) 完全相同。
+        workers 是 rapidfuzz 收紧上界时的线程数 (-1 表示用满所有核)。
+        """
+        return [self.extract_one(query, score_cutoff, workers) for query in queries]
@@ -0,0 +1,177 @@
+# src/grounding_cache.py
+"""
+KG 校准结果缓存 (memo)。
+
+日志里关键词的频率极度偏斜，"Grnite" -> "Granite" 这种已经算过的词每次都重新做一遍模糊匹配。
+这里按 (关键词, 阈值) 记住校准结果，包括"没有超过阈值的匹配" (负结果，存 None)：
+- 第一层按原始关键词查，命中只是一次 dict 查找 (不加锁，亚微秒级)
+- 第二层按 fuzzy_index.normalize 之后的形式查：匹配结果只取决于预处理后的文本，
+  "GRANITE" / "granite " 这类变体共享同一个结果
+- 缓存带词表版本 (快照格式版本 + parquet 内容哈希)，KG 变化后旧结果自动作废
+- 可选 SQLite 持久化：新结果攒够一批再写盘，重启后按当前版本整体载入 (热启动)
+
+容量满了按插入顺序淘汰最早的条目。hits / misses 计数不加锁，高并发下是近似值。
+"""
+import atexit
+import sqlite3
+import threading
+from pathlib import Path
+
+from .fuzzy_index import normalize
+
+# 匹配算法/结果格式变化时 +1，与词表哈希一起组成版本号
+# 2: 批量校准改由 fuzzywuzzy 的 WRatio 决定结果 (与单个校准一致)，短查询不再漏掉长词
+MEMO_VERSION = 2
+
+# get() 没有记录时的返回值 (None 表示"算过，没有匹配")
+UNKNOWN = object()
+
+# 攒够这么多条新结果就写一次盘
+FLUSH_EVERY = 256
+
+
+class GroundingMemo:
+    # 调用方 (KGLinker) 通过实例比较，不必导入本模块
+    UNKNOWN = UNKNOWN
+
+    def __init__(self, version, max_entries=100000, path=None):
+        self.max_entries = max_entries
+        self.path = Path(path) if path else None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._exact = {}
+        self._normalized = {}
+        self._pending = []
+        self._conn = None
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            with self._conn:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS grounding_memo ("
+                    " version TEXT NOT NULL, threshold REAL NOT NULL, keyword TEXT NOT NULL, match TEXT,"
+                    " PRIMARY KEY (version, threshold, keyword))"
+                )
+            # 进程退出前把没攒够一批的结果也写盘
+            atexit.register(self.flush)
+        self.reset(version)
+
+    def reset(self, version):
+        """
+        切换到新的词表版本：清空内存里的结果，载入磁盘上同版本的结果并删掉其它版本。
+        每个数据源有自己的 SQLite 文件 (见 from_config)，删掉的只是这个数据源过期的结果。
+        """
+        version = f"{MEMO_VERSION}/{version}"
+        with self._lock:
+            self.version = version
+            self._exact = {}
+            self._normalized = {}
+            self._pending = []
+            if self._conn is None:
+                return
+            with self._conn:
+                self._conn.execute("DELETE FROM grounding_memo WHERE version != ?", (version,))
+                rows = self._conn.execute(
+                    "SELECT threshold, keyword, match FROM grounding_memo WHERE version = ? LIMIT ?",
+                    (version, self.max_entries),
+                ).fetchall()
+            for threshold, keyword, match in rows:
+                self._normalized[(keyword, threshold)] = match
+
+    def get(self, keyword, threshold):
+        """返回校准结果 (标准词，或 None 表示没有足够相似的词)；没有记录返回 UNKNOWN"""
+        result = self._exact.get((keyword, threshold), UNKNOWN)
+        if result is UNKNOWN:
+            key = (normalize(keyword), threshold)
+            result = self._normalized.get(key, UNKNOWN)
+            if result is UNKNOWN:
+                self.misses += 1
+                return UNKNOWN
+            self._remember(self._exact, (keyword, threshold), result)
+        self.hits += 1
+        return result
+
+    def set(self, keyword, threshold, match, version=None):
+        """
+        记录校准结果；match 为 None 表示没有超过阈值的匹配。
+        version 是调用方开始计算时的 self.version，期间缓存已切换到新版本的话丢弃这条结果。
+        """
+        processed = normalize(keyword)
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            self._remember(self._exact, (keyword, threshold), match)
+            if (processed, threshold) not in self._normalized:
+                self._remember(self._normalized, (processed, threshold), match)
+                if self._conn is not None:
+                    self._pending.append((self.version, threshold, processed, match))
+            flush = len(self._pending) >= FLUSH_EVERY
+        if flush:
+            self.flush()
+
+    def _remember(self, table, key, value):
+        if len(table) >= self.max_entries:
+            try:
+                del table[next(iter(table))]
+            except (StopIteration, KeyError, RuntimeError):
+                pass
+        table[key] = value
+
+    def flush(self):
+        """把还没写盘的结果写入 SQLite"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if not pending or self._conn is None:
+                return
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO grounding_memo (version, threshold, keyword, match)"
+                    " VALUES (?, ?, ?, ?)", pending,
+                )
+                (count,) = self._conn.execute(
+                    "SELECT COUNT(*) FROM grounding_memo WHERE version = ?", (self.version,)
+                ).fetchone()
+                if count > self.max_entries:
+                    self._conn.execute(
+                        "DELETE FROM grounding_memo WHERE rowid IN ("
+                        " SELECT rowid FROM grounding_memo WHERE version = ? ORDER BY rowid LIMIT ?)",
+                        (self.version, count - self.max_entries),
+                    )
+
+    def close(self):
+        self.flush()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "size": len(self._normalized),
+            "version": self.version,
+        }
+
+
+def from_config(config, data_path, version):
+    """
+    按 Config.GROUNDING_MEMO ('disk' / 'memory' / 'off') 创建缓存，off 返回 None。
+    磁盘文件按数据文件的绝对路径区分，使用不同 KG 的进程不会互相清掉对方的结果。
+    """
+    kind = (config.GROUNDING_MEMO or "off").lower()
+    if kind == "memory":
+        return GroundingMemo(version, config.GROUNDING_MEMO_SIZE)
+    if kind == "disk":
+        from .kg_snapshot import cache_name
+
+        path = Path(config.KG_CACHE_DIR) / f"{cache_name(data_path)}.grounding.sqlite"
+        try:
+            return GroundingMemo(version, config.GROUNDING_MEMO_SIZE, path)
+        except sqlite3.Error as e:
+            print(f"⚠️ Grounding memo on disk unavailable ({e}), using memory only")
+            return GroundingMemo(version, config.GROUNDING_MEMO_SIZE)
+    return None
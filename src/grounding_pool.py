@@ -0,0 +1,117 @@
+# src/grounding_pool.py
+"""
+多进程 KG 校准：N 个工作进程共享同一份只读词表/索引。
+
+模糊打分是 CPU 密集型，线程受 GIL 限制；而 fork 出来的进程一旦访问 Python list
+里的字符串就会因引用计数写入触发写时复制，每个进程都复制一份词表。
+这里词表和索引本来就是 numpy 数组 (TermTable 的 offsets + UTF-8 blob，
+以及 trigram CSR 数组)，工作进程只拿到"去哪里找这些数组"的描述：
+- 快照是 mmap 打开的 .npy 文件 -> 工作进程自己 mmap 同一批文件 (共享页缓存)
+- 只在内存里的数组 -> 拷贝进 multiprocessing.shared_memory，工作进程直接挂载
+所以每多一个工作进程，增加的只是解释器本身的内存，而不是再来一份词表。
+有增量层时 (kg_delta.LayeredIndex) 每一层各有一组数组，工作进程里同样逐层打分。
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .fuzzy_index import NgramIndex
+from .kg_delta import LayeredIndex
+from .kg_snapshot import INDEX_ARRAYS, TermTable
+
+# 每个工作进程分到的任务块数，块越多负载越均衡
+CHUNKS_PER_WORKER = 4
+
+# 工作进程内的全局状态 (由 _init_worker 初始化)
+_worker_index = None
+_worker_shm = []
+
+
+def _array_spec(arr, owned_shm):
+    """描述一个数组的位置：mmap 文件直接给路径，否则复制进共享内存"""
+    if isinstance(arr, np.memmap) and arr.filename:
+        return ("mmap", arr.filename, arr.dtype.str, arr.shape, arr.offset)
+    arr = np.ascontiguousarray(arr)
+    shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+    owned_shm.append(shm)
+    return ("shm", shm.name, arr.dtype.str, arr.shape, 0)
+
+
+def _attach(spec):
+    kind, location, dtype, shape, offset = spec
+    if kind == "mmap":
+        return np.memmap(location, dtype=np.dtype(dtype), mode='r', shape=shape, offset=offset)
+    shm = shared_memory.SharedMemory(name=location)
+    # 保持引用，避免共享内存在工作进程里被提前关闭
+    _worker_shm.append(shm)
+    return np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+def _layer_specs(index, owned_shm):
+    # 普通 list 词表 (例如直接 NgramIndex.build(list)) 先按原顺序打包，保证下标不变
+    terms = index.terms if isinstance(index.terms, TermTable) else TermTable.pack(index.terms)
+    specs = {
+        "terms_blob": _array_spec(terms.blob, owned_shm),
+        "terms_offsets": _array_spec(terms.offsets, owned_shm),
+    }
+    for name in INDEX_ARRAYS:
+        specs[f"index_{name}"] = _array_spec(getattr(index, name), owned_shm)
+    return specs
+
+
+def _attach_layer(specs):
+    terms = TermTable(_attach(specs["terms_blob"]), _attach(specs["terms_offsets"]))
+    return NgramIndex(terms, *(_attach(specs[f"index_{name}"]) for name in INDEX_ARRAYS))
+
+
+def _init_worker(layer_specs):
+    global _worker_index
+    indexes = [_attach_layer(specs) for specs in layer_specs]
+    _worker_index = indexes[0] if len(indexes) == 1 else LayeredIndex(indexes)
+
+
+def _ground_chunk(keywords, threshold):
+    return _worker_index.extract_batch(keywords, score_cutoff=threshold, workers=1)
+
+
+class GroundingPool:
+    """
+    进程池版的 NgramIndex.extract_batch (index 也可以是有增量层的 kg_delta.LayeredIndex)。
+    用 spawn 启动工作进程：主进程里有事件循环和线程池，fork 带线程的进程不安全。
+    """
+
+    def __init__(self, index, processes):
+        self.processes = processes
+        self._owned_shm = []
+        indexes = index.indexes if isinstance(index, LayeredIndex) else [index]
+        layer_specs = [_layer_specs(layer, self._owned_shm) for layer in indexes]
+
+        self.executor = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(layer_specs,),
+        )
+
+    def extract_batch(self, queries, score_cutoff=0):
+        """与 NgramIndex.extract_batch 相同的返回值，查询按块分给各工作进程"""
+        if not queries:
+            return []
+        n_chunks = min(len(queries), self.processes * CHUNKS_PER_WORKER)
+        size = -(-len(queries) // n_chunks)
+        chunks = [queries[i:i + size] for i in range(0, len(queries), size)]
+        futures = [self.executor.submit(_ground_chunk, chunk, score_cutoff) for chunk in chunks]
+        return [match for f in futures for match in f.result()]
+
+    def worker_pids(self):
+        return [p.pid for p in self.executor._processes.values()]
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        for shm in self._owned_shm:
+            shm.close()
+            shm.unlink()
+        self._owned_shm = []
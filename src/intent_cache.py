@@ -0,0 +1,171 @@
+# src/intent_cache.py
+"""
+LLM 意图提取结果缓存 (LRU + TTL)。
+
+线上流量里同一个查询会反复出现，每次都走一遍 chat completion 既慢又花钱。
+缓存键 = 规范化后的查询 + 模型名 + Prompt 模板哈希，任何一个变了都会自然失效。
+提供两种后端：
+- MemoryBackend: 进程内 OrderedDict
+- SQLiteBackend: 本地 SQLite 文件，重启后仍然有效
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+
+def normalize_query(query):
+    """大小写、首尾及连续空白不同的查询视为同一个"""
+    return " ".join(str(query).split()).casefold()
+
+
+def make_key(query, model, template_hash):
+    raw = "\x1f".join([normalize_query(query), model or "", template_hash or ""])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class MemoryBackend:
+    """进程内 LRU：OrderedDict 尾部是最近使用的"""
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, now):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at <= now:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteBackend:
+    """
+    持久化 LRU：每条记录带 expires_at 和 accessed_at，
+    超出容量时按 accessed_at 淘汰最久未使用的记录。
+    """
+
+    def __init__(self, path, max_size=100000):
+        self.max_size = max_size
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS intent_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " expires_at REAL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_intent_cache_accessed ON intent_cache(accessed_at)"
+            )
+
+    def get(self, key, now):
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM intent_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                self._conn.execute("DELETE FROM intent_cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE intent_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            return value
+
+    def set(self, key, value, expires_at):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO intent_cache (key, value, expires_at, accessed_at)"
+                " VALUES (?, ?, ?, ?)",
+                (key, value, expires_at, time.time()),
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM intent_cache").fetchone()
+            if count > self.max_size:
+                self._conn.execute(
+                    "DELETE FROM intent_cache WHERE key IN ("
+                    " SELECT key FROM intent_cache ORDER BY accessed_at LIMIT ?)",
+                    (count - self.max_size,),
+                )
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM intent_cache")
+
+    def __len__(self):
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM intent_cache").fetchone()
+            return count
+
+
+class IntentCache:
+    """
+    在任意后端外面包一层 TTL 与命中统计。
+    值以 JSON 字符串存储，每次命中都反序列化出新对象，调用方修改结果不会污染缓存。
+    """
+
+    def __init__(self, backend, ttl=24 * 3600):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.backend.get(key, time.time())
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(value)
+
+    def set(self, key, intent):
+        expires_at = time.time() + self.ttl if self.ttl else None
+        self.backend.set(key, json.dumps(intent, ensure_ascii=False), expires_at)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "size": len(self.backend),
+        }
+
+
+def from_config(config):
+    """按 Config.INTENT_CACHE ('memory' / 'sqlite' / 'off') 创建缓存，off 返回 None"""
+    kind = (config.INTENT_CACHE or "off").lower()
+    if kind == "memory":
+        return IntentCache(MemoryBackend(config.INTENT_CACHE_SIZE), ttl=config.INTENT_CACHE_TTL)
+    if kind == "sqlite":
+        backend = SQLiteBackend(config.INTENT_CACHE_PATH, config.INTENT_CACHE_SIZE)
+        return IntentCache(backend, ttl=config.INTENT_CACHE_TTL)
+    return None
@@ -0,0 +1,228 @@
+# src/intent_rules.py
+"""
+本地规则意图解析：简单查询不走 LLM。
+
+"Basalt papers from 2023"、"Find papers about Granite from MIT" 这类查询只需要
+关键词 + 年份 + 机构，用正则和词典就能在几十微秒内解析完，不必等一次
+几十秒的 LLM 往返。解析步骤：
+1. 年份表达式：from/since/after/before/between ... and ...、"recent" -> 2020、
+   最近三年 / 近5年 / 2015年以来 等中文说法
+2. 机构缩写表：MIT、CAS、中科院 ... -> 官方全称 (与 Prompt 的要求一致)
+3. 去掉 "find papers about" 之类的套话后，剩下的每个片段都必须是 KG 词表里的词
+
+只有所有片段都命中词表、且没有作者等规则处理不了的信息时才算高置信度；
+否则返回 None，交给 LLM。路由比例通过 stats() 导出。
+"""
+import datetime
+import re
+import threading
+
+from . import tracing
+
+# 机构缩写/简称 -> 官方全称 (英文缩写按大小写精确匹配，避免误伤普通单词)
+INSTITUTIONS = {
+    "MIT": "Massachusetts Institute of Technology",
+    "CAS": "Chinese Academy of Sciences",
+    "UCAS": "University of Chinese Academy of Sciences",
+    "USGS": "United States Geological Survey",
+    "Caltech": "California Institute of Technology",
+    "ETH": "ETH Zurich",
+    "UCL": "University College London",
+    "UCB": "University of California, Berkeley",
+    "UCLA": "University of California, Los Angeles",
+    "PKU": "Peking University",
+    "THU": "Tsinghua University",
+    "SJTU": "Shanghai Jiao Tong University",
+    "ZJU": "Zhejiang University",
+    "NJU": "Nanjing University",
+    "CUG": "China University of Geosciences",
+    "中科院": "Chinese Academy of Sciences",
+    "中国科学院": "Chinese Academy of Sciences",
+    "北大": "Peking University",
+    "北京大学": "Peking University",
+    "清华": "Tsinghua University",
+    "清华大学": "Tsinghua University",
+    "上海交通大学": "Shanghai Jiao Tong University",
+    "上交": "Shanghai Jiao Tong University",
+    "浙大": "Zhejiang University",
+    "浙江大学": "Zhejiang University",
+    "南京大学": "Nanjing University",
+    "中国地质大学": "China University of Geosciences",
+    "麻省理工": "Massachusetts Institute of Technology",
+}
+# 全称本身也可以直接出现在查询里 (大小写不敏感)
+_FULL_NAMES = {name.casefold(): name for name in INSTITUTIONS.values()}
+
+# "recent" / "latest" 对应的起始年份 (与 Prompt 一致)
+RECENT_YEAR = 2020
+
+_CN_DIGITS = {"一": 1, "二": 2, "两": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9, "十": 10}
+
+_YEAR = r"((?:19|20)\d{2})"
+_N = r"(\d{1,2}|[一二两三四五六七八九十])"
+
+# 英文分隔词：出现在这些词两侧的内容视为不同的关键词片段
+_SEPARATORS = {
+    "find", "search", "show", "get", "give", "me", "look", "looking", "for", "papers", "paper",
+    "articles", "article", "research", "researches", "studies", "study", "publications",
+    "publication", "works", "literature", "about", "on", "regarding", "concerning", "related",
+    "to", "and", "or", "from", "in", "at", "any", "some", "please", "i", "want", "need",
+}
+# 只在片段首尾去掉的词 (片段中间的保留，例如 "Origin of granite")
+_EDGE_STOPWORDS = {"the", "a", "an", "of", "with"}
+# 中文套话，整体替换成分隔符
+_CN_FILLERS = re.compile(
+    r"帮我找|帮我|请|找一下|查一下|搜一下|找|搜索|查找|查询|关于|有关|相关的|相关|方面的|方面|的|"
+    r"论文|文章|文献|研究|成果|进展|一下|以及|和|与|及|、|，|,|；|;"
+)
+# 作者等规则无法可靠处理的信息：出现就交给 LLM
+_AUTHOR_CUES = re.compile(r"\bby\b|\bauthors?\b|\bet al\b|作者|撰写|发表的", re.IGNORECASE)
+
+
+def _cn_number(text):
+    return int(text) if text.isdigit() else _CN_DIGITS.get(text)
+
+
+class RuleIntentParser:
+    """
+    vocab 需要支持 find(term) -> 下标 (不存在为 -1)，即 kg_snapshot.TermTable；
+    为空时 (KG 离线) 无法确认关键词，所有查询都交给 LLM。
+    """
+
+    def __init__(self, vocab, current_year=None):
+        self.vocab = vocab if vocab is not None and hasattr(vocab, "find") else None
+        self.current_year = current_year or datetime.date.today().year
+        self._lock = threading.Lock()
+        self.local = 0
+        self.fallback = 0
+
+        year = self.current_year
+        # 按优先级排列：先匹配区间，再匹配单边，最后才是单独的年份和 "recent"
+        self._year_patterns = [(re.compile(p, re.IGNORECASE), f) for p, f in [
+            (rf"\bbetween\s+{_YEAR}\s+and\s+{_YEAR}\b", lambda a, b: (int(a), int(b))),
+            (rf"\b(?:from\s+)?{_YEAR}\s*(?:-|–|to|until)\s*{_YEAR}\b", lambda a, b: (int(a), int(b))),
+            (rf"{_YEAR}\s*(?:-|–|到|至)\s*{_YEAR}\s*年?", lambda a, b: (int(a), int(b))),
+            (rf"\b(?:since|from)\s+{_YEAR}(?:\s+onwards?)?\b", lambda a: (int(a), None)),
+            (rf"\bafter\s+{_YEAR}\b", lambda a: (int(a) + 1, None)),
+            (rf"\bbefore\s+{_YEAR}\b", lambda a: (None, int(a) - 1)),
+            (rf"\b(?:until|through|up\s+to)\s+{_YEAR}\b", lambda a: (None, int(a))),
+            (rf"{_YEAR}\s*年?\s*(?:以来|之后|以后|后)", lambda a: (int(a), None)),
+            (rf"{_YEAR}\s*年?\s*(?:之前|以前|前)", lambda a: (None, int(a) - 1)),
+            (rf"\b(?:in\s+)?{_YEAR}\b|{_YEAR}\s*年", lambda a: (int(a), int(a))),
+            (r"\b(?:in\s+the\s+)?(?:past|last)\s+(\d{1,2})\s+years?\b", lambda n: (year - int(n) + 1, None)),
+            (rf"(?:最近|近)\s*{_N}\s*年(?:来|内|间)?", lambda n: (year - _cn_number(n) + 1, None)),
+            (r"\b(?:recent(?:ly)?|latest|newest)\b|最近|最新|近年来?|近期", lambda: (RECENT_YEAR, None)),
+        ]]
+
+        # 机构：英文缩写区分大小写、按词边界匹配；中文简称和全称直接查找。长的优先
+        ascii_abbrs = sorted((a for a in INSTITUTIONS if a.isascii()), key=len, reverse=True)
+        other_names = sorted([a for a in INSTITUTIONS if not a.isascii()], key=len, reverse=True)
+        self._inst_pattern = re.compile(
+            r"(?:\b(?:from|at|of|in)\s+)?(?:\b(" + "|".join(map(re.escape, ascii_abbrs)) + r")\b"
+            r"|(?i:(" + "|".join(map(re.escape, sorted(_FULL_NAMES, key=len, reverse=True))) + r"))"
+            r"|(" + "|".join(map(re.escape, other_names)) + r"))"
+        )
+
+    # ---------- 年份 ----------
+    def _years(self, text):
+        """返回 (year_start, year_end, 去掉年份表达式后的文本)"""
+        for pattern, to_years in self._year_patterns:
+            match = pattern.search(text)
+            if match is None:
+                continue
+            # 有多个分支的模式 (例如单独的年份) 只有一个分支的分组有值
+            start, end = to_years(*(g for g in match.groups() if g is not None))
+            return start, end, text[:match.start()] + " | " + text[match.end():]
+        return None, None, text
+
+    # ---------- 机构 ----------
+    def _institution(self, text):
+        match = self._inst_pattern.search(text)
+        if match is None:
+            return None, text
+        abbr, full_name, other = match.groups()
+        full = INSTITUTIONS[abbr] if abbr else _FULL_NAMES[full_name.casefold()] if full_name else INSTITUTIONS[other]
+        return full, text[:match.start()] + " | " + text[match.end():]
+
+    # ---------- 关键词 ----------
+    def _segments(self, text):
+        """按分隔词/中文套话切成候选关键词片段"""
+        text = _CN_FILLERS.sub(" | ", text)
+        segments, current = [], []
+        for token in re.findall(r"[A-Za-z0-9][\w\-']*|[^\x00-\x7f\s|]+|\|", text):
+            if token == "|" or token.casefold() in _SEPARATORS:
+                segments.append(current)
+                current = []
+            else:
+                current.append(token)
+        segments.append(current)
+
+        result = []
+        for words in segments:
+            while words and words[0].casefold() in _EDGE_STOPWORDS:
+                words = words[1:]
+            while words and words[-1].casefold() in _EDGE_STOPWORDS:
+                words = words[:-1]
+            if words:
+                result.append(" ".join(words))
+        return result
+
+    def _lookup(self, phrase):
+        """在词表里找 phrase 的规范写法：原样 / 首字母大写 / 小写 / 单数形式"""
+        variants = [phrase, phrase[:1].upper() + phrase[1:].lower(), phrase.lower(), phrase.title()]
+        lower = phrase.lower()
+        if lower.endswith("ies"):
+            variants.append(phrase[:-3] + "y")
+        if lower.endswith("es"):
+            variants.append(phrase[:-2])
+        if lower.endswith("s") and not lower.endswith("ss"):
+            variants.append(phrase[:-1])
+        for v in list(variants[4:]):
+            variants += [v[:1].upper() + v[1:].lower(), v.lower()]
+        for v in variants:
+            if self.vocab.find(v) >= 0:
+                return v
+        return None
+
+    def parse(self, query):
+        """
+        返回 (intent, confidence)。intent 与 LLM 输出的字段一致；
+        confidence 是命中词表的关键词片段比例，有规则处理不了的信息时为 0。
+        """
+        intent = {"keywords": [], "institution": None, "author": None, "year_start": None, "year_end": None}
+        if not self.vocab or not query or not query.strip():
+            return intent, 0.0
+
+        start, end, text = self._years(query)
+        institution, text = self._institution(text)
+        intent.update(institution=institution, year_start=start, year_end=end)
+        if _AUTHOR_CUES.search(text):
+            return intent, 0.0
+
+        segments = self._segments(text)
+        if not segments:
+            return intent, 0.0
+        hits = [self._lookup(seg) for seg in segments]
+        intent["keywords"] = list(dict.fromkeys(h for h in hits if h))
+        return intent, sum(h is not None for h in hits) / len(segments)
+
+    def route(self, query, min_confidence=1.0):
+        """置信度足够时返回本地解析结果，否则返回 None (调用方改走 LLM)；同时计数"""
+        intent, confidence = self.parse(query)
+        local = confidence >= min_confidence and bool(intent["keywords"])
+        tracing.count("intent_rules.local" if local else "intent_rules.fallback")
+        with self._lock:
+            if local:
+                self.local += 1
+            else:
+                self.fallback += 1
+        return intent if local else None
+
+    def stats(self):
+        with self._lock:
+            total = self.local + self.fallback
+            return {
+                "local": self.local,
+                "llm": self.fallback,
+                "local_ratio": round(self.local / total, 4) if total else 0.0,
+            }
@@ -0,0 +1,127 @@
+# src/json_stream.py
+"""
+增量 JSON 解析：LLM 流式输出时，顶层对象的每个字段一写完就能拿到。
+
+意图 JSON 里 keywords 排在最前面，模型还在生成 institution / year_* 的时候
+关键词其实已经确定了。StreamingJSONObject 逐块接收文本，只跟踪字符串/转义状态
+和嵌套深度，某个顶层字段的值一闭合就单独 json.loads 出来返回，
+下游 (KG 校准、Acemap 检索) 可以提前开始。
+"""
+import json
+
+
+class StreamingJSONObject:
+    """
+    用法:
+        parser = StreamingJSONObject()
+        for chunk in stream:
+            for key, value in parser.feed(chunk):
+                ...   # 新完成的顶层字段
+        intent = parser.result()
+    第一个 '{' 之前的内容 (例如 ```json 标记) 会被跳过。
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.fields = {}
+        self.done = False
+        self._pos = 0
+        self._depth = 0
+        self._started = False
+        # 顶层对象在 text 里的起止位置
+        self._start = None
+        self._end = None
+        self._in_string = False
+        self._escape = False
+        # 顶层对象内的状态: key -> key_end -> colon -> value -> in_value -> comma -> key ...
+        self._expect = "key"
+        self._key_start = None
+        self._key = None
+        self._value_start = None
+
+    def _complete(self, end, completed):
+        raw = self.text[self._value_start:end].strip()
+        self._value_start = None
+        self._expect = "comma"
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            return
+        self.fields[self._key] = value
+        completed.append((self._key, value))
+
+    def feed(self, chunk):
+        """追加一段文本，返回这段文本里新完成的 [(key, value)]"""
+        self.text += chunk
+        text = self.text
+        completed = []
+        while self._pos < len(text) and not self.done:
+            i = self._pos
+            ch = text[i]
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._expect == "key_end":
+                        self._key = json.loads(text[self._key_start:i + 1])
+                        self._expect = "colon"
+                    elif self._depth == 1 and self._expect == "in_value":
+                        self._complete(i + 1, completed)
+                continue
+
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._start = i
+                    self._depth = 1
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    if self._expect == "key":
+                        self._key_start = i
+                        self._expect = "key_end"
+                    elif self._expect == "value":
+                        self._value_start = i
+                        self._expect = "in_value"
+            elif ch in "{[":
+                if self._depth == 1 and self._expect == "value":
+                    self._value_start = i
+                    self._expect = "in_value"
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    # 最后一个字段是数字/null 之类的标量，遇到 '}' 才算结束
+                    if self._expect == "in_value":
+                        self._complete(i, completed)
+                    self._end = i + 1
+                    self.done = True
+                elif self._depth == 1 and self._expect == "in_value":
+                    self._complete(i + 1, completed)
+            elif self._depth == 1:
+                if ch == ":" and self._expect == "colon":
+                    self._expect = "value"
+                elif ch == ",":
+                    if self._expect == "in_value":
+                        self._complete(i, completed)
+                    self._expect = "key"
+                elif not ch.isspace() and self._expect == "value":
+                    self._value_start = i
+                    self._expect = "in_value"
+        return completed
+
+    def result(self):
+        """完整解析顶层对象；对象不完整或不合法时返回 None (已完成的字段仍在 self.fields 里)"""
+        if not self.done:
+            return None
+        try:
+            return json.loads(self.text[self._start:self._end])
+        except json.JSONDecodeError:
+            return None
@@ -0,0 +1,313 @@
+# src/kg_delta.py
+"""
+增量 KG 导入：基础快照 + 若干增量层 (delta)，后台合并 (compaction)。
+
+GAKG 会定期追加新的三元组文件，每次都从头重建词表和索引太慢。新的 parquet 分片
+被编译成一个小的增量层，只包含基础快照和前面各层里都没有的新词：
+- 词表下标全局连续：基础层 0..N-1，第一个增量层从 N 开始，依此类推，
+  邻接索引里的边直接用全局下标，可以跨层引用
+- 每层有自己的 trigram 索引，查询时逐层打分取最高分 (同分取靠前的层)，
+  等价于在所有层的词表上线性扫描
+- 新分片的边单独存一份 CSR，扩展时把各层的邻居拼在一起
+构建增量层只读新分片、只为新词做预处理和建索引，代价与新增的数据量成正比。
+
+层数多了以后每次查询都要逐层打分，compact() 把所有层合并成新的基础快照：
+词表整体排序，trigram 倒排表和邻接表在数组上重映射下标后重新排序，不再逐词预处理。
+
+增量层存放在 KG_CACHE_DIR/<cache_name>.deltas/ 下，重启后按顺序加载。
+已导入的分片按内容哈希去重；修改或删除已导入的数据需要全量重建 (删掉缓存目录)。
+"""
+import hashlib
+import shutil
+from bisect import bisect_right
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .config import Config
+from .fuzzy_index import NgramIndex
+from .kg_graph import AdjacencyIndex
+from . import kg_snapshot
+from .kg_snapshot import SNAPSHOT_VERSION, TermTable
+
+
+class Layer:
+    """一层 KG：词表 + trigram 索引 + 邻接索引 (可能为 None) + meta (来源、哈希、全局起始下标)"""
+
+    __slots__ = ("terms", "index", "graph", "meta")
+
+    def __init__(self, terms, index, graph, meta):
+        self.terms = terms
+        self.index = index
+        self.graph = graph
+        self.meta = meta
+
+
+class LayeredTerms:
+    """多层词表的只读视图，接口与 TermTable 相同；下标是全局下标"""
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.starts = [0]
+        for table in tables:
+            self.starts.append(self.starts[-1] + len(table))
+
+    def __len__(self):
+        return self.starts[-1]
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        k = bisect_right(self.starts, i) - 1
+        return self.tables[k][i - self.starts[k]]
+
+    def __iter__(self):
+        for table in self.tables:
+            yield from table
+
+    def find(self, term):
+        """各层互不重复，在哪一层找到就是哪一层的下标加上该层的起点"""
+        for start, table in zip(self.starts, self.tables):
+            i = table.find(term)
+            if i >= 0:
+                return start + i
+        return -1
+
+    def to_arrow(self):
+        """按全局下标顺序拼接的 Arrow 数组 (index_in 得到的就是全局下标)"""
+        return pa.concat_arrays([table.to_arrow() for table in self.tables])
+
+
+class LayeredIndex:
+    """多层 trigram 索引：逐层取最佳匹配，分数最高者胜出，同分取靠前的层"""
+
+    def __init__(self, indexes):
+        self.indexes = indexes
+
+    def __len__(self):
+        return sum(len(index) for index in self.indexes)
+
+    def extract_one(self, query, score_cutoff=0, workers=1):
+        best = None
+        for index in self.indexes:
+            match = index.extract_one(query, score_cutoff, workers)
+            if match is not None and (best is None or match[1] > best[1]):
+                best = match
+        return best
+
+    def extract_batch(self, queries, score_cutoff=0, workers=1):
+        best = [None] * len(queries)
+        for index in self.indexes:
+            for i, match in enumerate(index.extract_batch(queries, score_cutoff, workers)):
+                if match is not None and (best[i] is None or match[1] > best[i][1]):
+                    best[i] = match
+        return best
+
+
+class LayeredGraph(AdjacencyIndex):
+    """
+    多层邻接索引：各层的关系编号一致 (增量层沿用前面的编号)，
+    节点的邻居是各层邻居的拼接；BFS 扩展 (expand) 直接复用 AdjacencyIndex 的实现。
+    """
+
+    def __init__(self, graphs):
+        self.graphs = graphs
+        self.relations = list(graphs[-1].relations)
+
+    @property
+    def n_edges(self):
+        return sum(graph.n_edges for graph in self.graphs)
+
+    def neighbors(self, node, rel_ids=None, direction="both"):
+        # 每层只覆盖到它构建时的节点数，更靠后的层新增的词在前面的层里没有边
+        parts = [graph.neighbors(node, rel_ids, direction) for graph in self.graphs
+                 if node < len(graph.out_offsets) - 1]
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int32)
+
+
+def views(layers):
+    """由层列表得到 (词表, 索引, 邻接) 视图；只有基础层时直接返回基础层本身的对象"""
+    if len(layers) == 1:
+        return layers[0].terms, layers[0].index, layers[0].graph
+    graphs = [layer.graph for layer in layers if layer.graph is not None]
+    return (LayeredTerms([layer.terms for layer in layers]),
+            LayeredIndex([layer.index for layer in layers]),
+            LayeredGraph(graphs) if graphs else None)
+
+
+def shard_files(paths):
+    """parquet 文件本身，或目录下所有 *.parquet (按文件名排序)；paths 可以是单个路径或列表"""
+    if isinstance(paths, (str, Path)):
+        paths = [paths]
+    files = []
+    for path in map(Path, paths):
+        files += sorted(path.glob("*.parquet")) if path.is_dir() else [path]
+    return files
+
+
+def deltas_dir(data_path):
+    return Path(Config.KG_CACHE_DIR) / f"{kg_snapshot.cache_name(data_path)}.deltas"
+
+
+def _base_id(meta):
+    """基础快照的标识：数据文件哈希 + 已合并进来的分片；增量层只能叠加在构建时的那个基础快照上"""
+    return hashlib.sha256("|".join([meta["sha256"]] + meta.get("shards", [])).encode()).hexdigest()
+
+
+def shard_hashes(layers):
+    """已导入的全部分片 (合并进基础快照的 + 增量层) 的内容哈希，按导入顺序"""
+    return list(layers[0].meta.get("shards", [])) + [layer.meta["sha256"] for layer in layers[1:]]
+
+
+def vocab_version(data_path, layers):
+    """
+    词表版本 (校准 memo 据此失效)：没有分片时与 kg_snapshot.vocab_version 相同；
+    有分片时再加上分片列表和分层方式 (合并前后同分时的选择可能不同)。
+    """
+    version = kg_snapshot.vocab_version(data_path)
+    merged, deltas = layers[0].meta.get("shards", []), [layer.meta["sha256"] for layer in layers[1:]]
+    if merged or deltas:
+        digest = hashlib.sha256(f"{','.join(merged)}|{','.join(deltas)}".encode()).hexdigest()
+        version += f":{digest[:16]}"
+    return version
+
+
+def base_layer(data_path, terms, index, graph):
+    try:
+        meta = kg_snapshot.read_meta(data_path)
+    except (OSError, ValueError):
+        # 快照没能写盘 (例如目录只读)，基础层就是刚从 parquet 构建的结果
+        meta = dict(kg_snapshot.source_meta(data_path), shards=[])
+    return Layer(terms, index, graph, meta)
+
+
+def load_deltas(data_path, base):
+    """
+    按顺序 mmap 加载磁盘上的增量层。与当前基础快照对不上的层 (基础快照重建过、
+    或者已经被合并) 以及它后面的层都删掉 —— 后面的层的全局下标依赖前面的层。
+    """
+    root = deltas_dir(data_path)
+    if not root.exists():
+        return []
+    layers, start = [], len(base.terms)
+    for target in sorted(p for p in root.iterdir() if p.is_dir() and not p.name.startswith(".")):
+        try:
+            terms, index, graph, meta = kg_snapshot.read_snapshot(target)
+            valid = (meta.get("version") == SNAPSHOT_VERSION and meta.get("base") == _base_id(base.meta)
+                     and meta.get("start") == start)
+        except (OSError, ValueError, KeyError):
+            valid = False
+        if not valid:
+            print(f"⚠️ Dropping stale KG delta layers from {target.name}")
+            for stale in sorted(p for p in root.iterdir() if p.name >= target.name):
+                shutil.rmtree(stale, ignore_errors=True)
+            break
+        layers.append(Layer(terms, index, graph, meta))
+        start += len(terms)
+    return layers
+
+
+def build_delta(data_path, layers, shard_path):
+    """
+    为一个新分片构建增量层并写盘，返回 mmap 加载的 Layer；
+    分片已经导入过 (内容哈希相同) 时返回 None。
+    """
+    meta = kg_snapshot.source_meta(shard_path)
+    if meta["sha256"] in shard_hashes(layers):
+        return None
+
+    # 分片自己的词表 (已排序去重)，在每层的有序词表里二分查找已有的词，
+    # 代价与分片的词数成正比，不随总词表增长 (不对整个词表建哈希表)
+    shard_table = kg_snapshot.read_term_table(shard_path)
+    shard_terms = shard_table.to_arrow()
+    global_ids = np.full(len(shard_table), -1, dtype=np.int64)
+    start = 0
+    for layer in layers:
+        todo = np.flatnonzero(global_ids < 0)
+        if not len(todo):
+            break
+        found = layer.terms.find_all(shard_terms.take(todo))
+        global_ids[todo[found >= 0]] = start + found[found >= 0]
+        start += len(layer.terms)
+    total = sum(len(layer.terms) for layer in layers)
+
+    # 去掉已有的词，剩下的仍然有序，接在所有层后面编号
+    is_new = global_ids < 0
+    new_terms = TermTable.from_arrow(shard_terms.filter(pa.array(is_new)))
+    global_ids[is_new] = total + np.arange(len(new_terms))
+    index = NgramIndex.build(new_terms)
+    # 分片里的边 (包括新词和旧词之间的边) 先按分片词表编码，再映射成全局下标
+    relations = next((layer.graph.relations for layer in reversed(layers) if layer.graph is not None), None)
+    graph = AdjacencyIndex.build(shard_path, shard_table, relations=relations,
+                                 node_ids=global_ids, n_nodes=total + len(new_terms))
+
+    meta.update(base=_base_id(layers[0].meta), start=total)
+    target = deltas_dir(data_path) / f"{len(layers):04d}-{Path(shard_path).stem}"
+    kg_snapshot.write_snapshot(target, meta, new_terms, index, graph)
+    return Layer(*kg_snapshot.read_snapshot(target))
+
+
+def _merge_index(terms, layers, remap):
+    """把各层的 trigram CSR 展开成 (键, 全局下标) 对，重映射到合并后的下标后重新压成 CSR"""
+    key_parts, id_parts, short_parts = [], [], []
+    gram_counts = np.zeros(len(terms), dtype=np.int32)
+    lengths = np.zeros(len(terms), dtype=np.int32)
+    token_lengths = np.zeros(len(terms), dtype=np.int32)
+    start = 0
+    for layer in layers:
+        index, n = layer.index, len(layer.terms)
+        key_parts.append(np.repeat(np.asarray(index.keys), np.diff(index.offsets)))
+        id_parts.append(remap[start + np.asarray(index.postings, dtype=np.int64)])
+        short_parts.append(remap[start + np.asarray(index.short_ids, dtype=np.int64)])
+        gram_counts[remap[start:start + n]] = index.gram_counts
+        lengths[remap[start:start + n]] = index.lengths
+        token_lengths[remap[start:start + n]] = index.token_lengths
+        start += n
+
+    all_keys, all_ids = np.concatenate(key_parts), np.concatenate(id_parts)
+    # 与 NgramIndex.build 一样：键升序，同一个键的倒排链内词下标升序
+    order = np.lexsort((all_ids, all_keys))
+    keys, counts = np.unique(all_keys[order], return_counts=True)
+    offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return NgramIndex(terms, keys, offsets, all_ids[order].astype(np.int32), gram_counts,
+                      np.sort(np.concatenate(short_parts)).astype(np.int32), lengths, token_lengths)
+
+
+def _merge_graph(layers, remap):
+    graphs = [layer.graph for layer in layers if layer.graph is not None]
+    if not graphs:
+        return None
+    src, dst, rel = [], [], []
+    for graph in graphs:
+        n_nodes = len(graph.out_offsets) - 1
+        src.append(remap[np.repeat(np.arange(n_nodes), np.diff(graph.out_offsets))])
+        dst.append(remap[np.asarray(graph.out_targets, dtype=np.int64)])
+        rel.append(np.asarray(graph.out_rels))
+    # from_edges 会去掉各层之间重复的边
+    return AdjacencyIndex.from_edges(np.concatenate(src), np.concatenate(dst), np.concatenate(rel),
+                                     graphs[-1].relations, len(remap))
+
+
+def compact(data_path, layers):
+    """
+    把基础快照和所有增量层合并成新的基础快照 (与把所有分片一起全量构建的结果相同)，
+    写盘后删掉已合并的增量层，返回只有一层的新列表。
+    """
+    merged_terms = LayeredTerms([layer.terms for layer in layers]).to_arrow()
+    order = pc.array_sort_indices(merged_terms)
+    terms = TermTable.from_arrow(merged_terms.take(order))
+    # remap[全局下标] = 合并后 (排序后) 的下标
+    order = order.to_numpy()
+    remap = np.empty(len(order), dtype=np.int64)
+    remap[order] = np.arange(len(order))
+
+    index = _merge_index(terms, layers, remap)
+    graph = _merge_graph(layers, remap)
+    base = layers[0].meta
+    kg_snapshot.save(data_path, terms, index, graph, content_hash=base["sha256"], shards=shard_hashes(layers))
+    shutil.rmtree(deltas_dir(data_path), ignore_errors=True)
+    terms, index, graph = kg_snapshot.load(data_path)
+    return [base_layer(data_path, terms, index, graph)]
@@ -0,0 +1,148 @@
+# src/kg_graph.py
+"""
+KG 邻接索引：把 (subject, relation, object) 三元组编译成 CSR 数组，用于查询扩展。
+
+subject/object 都编码成 TermTable 里的下标，relation 编码成小整数。
+出边按 subject 排序、入边按 object 排序，各自一组 offsets：
+    节点 i 的出边 = out_targets[out_offsets[i]:out_offsets[i+1]] (关系在 out_rels 的同一区间)
+邻居查找就是一次数组切片，复杂度 O(度数)，不需要过滤 DataFrame。
+数组和词表一起存进快照，启动时 mmap 加载。
+"""
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+GRAPH_ARRAYS = ["out_offsets", "out_targets", "out_rels", "in_offsets", "in_sources", "in_rels"]
+
+# 扩展方向：out 沿 subject -> object (例如 Basalt is_a Igneous rock，得到上位词)，
+# in 反向 (得到下位词/别名)，both 两个方向都走
+DIRECTIONS = ("out", "in", "both")
+
+
+def _csr(keys, values, rels, n_nodes):
+    """按 keys 稳定排序，生成 (offsets, values, rels)"""
+    order = np.argsort(keys, kind="stable")
+    offsets = np.zeros(n_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=n_nodes), out=offsets[1:])
+    return offsets, values[order], rels[order]
+
+
+class AdjacencyIndex:
+    def __init__(self, relations, out_offsets, out_targets, out_rels, in_offsets, in_sources, in_rels):
+        self.relations = list(relations)
+        self.out_offsets = out_offsets
+        self.out_targets = out_targets
+        self.out_rels = out_rels
+        self.in_offsets = in_offsets
+        self.in_sources = in_sources
+        self.in_rels = in_rels
+
+    @classmethod
+    def from_edges(cls, src, dst, rel, relations, n_nodes):
+        """由整数编码的边构建，重复的 (subject, relation, object) 只保留一条"""
+        src = np.asarray(src, dtype=np.int32)
+        dst = np.asarray(dst, dtype=np.int32)
+        rel = np.asarray(rel, dtype=np.int16)
+        if len(src):
+            order = np.lexsort((dst, rel, src))
+            src, dst, rel = src[order], dst[order], rel[order]
+            keep = np.ones(len(src), dtype=bool)
+            keep[1:] = (src[1:] != src[:-1]) | (rel[1:] != rel[:-1]) | (dst[1:] != dst[:-1])
+            src, dst, rel = src[keep], dst[keep], rel[keep]
+
+        out_offsets, out_targets, out_rels = _csr(src, dst, rel, n_nodes)
+        in_offsets, in_sources, in_rels = _csr(dst, src, rel, n_nodes)
+        return cls(relations, out_offsets, out_targets, out_rels, in_offsets, in_sources, in_rels)
+
+    @classmethod
+    def build(cls, data_path, terms, batch_size=65536, relations=None, node_ids=None, n_nodes=None):
+        """
+        流式读取 parquet 的三列，用 Arrow 的 index_in 把词映射成 terms 的下标；
+        不在词表里的 (例如空值) 三元组被丢弃。
+        relations 是沿用的关系编号 (增量层与前面的层保持一致)，新出现的关系追加在后面。
+        node_ids 把 terms 的下标映射成节点编号 (增量层：分片自己的小词表 -> 全局下标)，
+        此时节点总数由 n_nodes 给出；不传时节点编号就是 terms 的下标。
+        """
+        value_set = terms.to_arrow()
+        relations = list(relations or [])
+        rel_ids = {name: i for i, name in enumerate(relations)}
+        src_parts, dst_parts, rel_parts = [], [], []
+
+        parquet = pq.ParquetFile(data_path)
+        for batch in parquet.iter_batches(batch_size=batch_size, columns=['subject', 'relation', 'object']):
+            subject, relation, obj = (batch.column(i).cast(pa.large_string()) for i in range(3))
+            # 关系种类很少，按首次出现的顺序编号
+            for name in pc.unique(relation.drop_null()).to_pylist():
+                if name not in rel_ids:
+                    rel_ids[name] = len(relations)
+                    relations.append(name)
+
+            src = pc.index_in(subject, value_set=value_set)
+            dst = pc.index_in(obj, value_set=value_set)
+            rel = pc.index_in(relation, value_set=pa.array(relations, type=pa.large_string()))
+            valid = pc.and_(pc.and_(pc.is_valid(src), pc.is_valid(dst)), pc.is_valid(rel))
+            src_parts.append(pc.filter(src, valid).to_numpy())
+            dst_parts.append(pc.filter(dst, valid).to_numpy())
+            rel_parts.append(pc.filter(rel, valid).to_numpy())
+
+        concat = lambda parts: np.concatenate(parts) if parts else np.zeros(0, dtype=np.int32)
+        src, dst = concat(src_parts), concat(dst_parts)
+        if node_ids is not None:
+            src, dst = node_ids[src], node_ids[dst]
+        return cls.from_edges(src, dst, concat(rel_parts), relations,
+                              len(terms) if n_nodes is None else n_nodes)
+
+    @property
+    def n_edges(self):
+        return len(self.out_targets)
+
+    def relation_ids(self, relations):
+        """关系名 -> 编号；None 表示所有关系，不认识的关系名忽略"""
+        if relations is None:
+            return None
+        if isinstance(relations, str):
+            relations = [relations]
+        return np.array([self.relations.index(r) for r in relations if r in self.relations], dtype=np.int16)
+
+    def neighbors(self, node, rel_ids=None, direction="both"):
+        """节点的邻居下标 (可能有重复)，rel_ids 为 None 时不按关系过滤"""
+        if direction not in DIRECTIONS:
+            raise ValueError(f"direction must be one of {DIRECTIONS}")
+        parts = []
+        if direction in ("out", "both"):
+            lo, hi = self.out_offsets[node], self.out_offsets[node + 1]
+            targets, rels = self.out_targets[lo:hi], self.out_rels[lo:hi]
+            parts.append(targets if rel_ids is None else targets[np.isin(rels, rel_ids)])
+        if direction in ("in", "both"):
+            lo, hi = self.in_offsets[node], self.in_offsets[node + 1]
+            sources, rels = self.in_sources[lo:hi], self.in_rels[lo:hi]
+            parts.append(sources if rel_ids is None else sources[np.isin(rels, rel_ids)])
+        return np.concatenate(parts)
+
+    def expand(self, node, relations=None, depth=1, limit=20, direction="both"):
+        """
+        从 node 出发按层做 BFS，最多走 depth 层，返回发现顺序的节点下标 (不含 node 本身)，
+        最多 limit 个。同一层内按边在索引中的顺序排列。
+        """
+        rel_ids = self.relation_ids(relations)
+        if rel_ids is not None and not len(rel_ids):
+            return []
+        visited = {int(node)}
+        result = []
+        frontier = [int(node)]
+        for _ in range(depth):
+            next_frontier = []
+            for current in frontier:
+                for neighbor in self.neighbors(current, rel_ids, direction).tolist():
+                    if neighbor in visited:
+                        continue
+                    visited.add(neighbor)
+                    result.append(neighbor)
+                    next_frontier.append(neighbor)
+                    if len(result) >= limit:
+                        return result
+            if not next_frontier:
+                break
+            frontier = next_frontier
+        return result
@@ -1,43 +1,285 @@
 # src/kg_linker.py
-import pandas as pd
-from fuzzywuzzy import process
+import threading
+import time
 from .config import Config
+from . import tracing
+
+# kg_snapshot / kg_delta / grounding_cache / grounding_pool 会连带导入 pyarrow、numpy、fuzzywuzzy，
+# 放到加载 KG 时再导入 (后台加载时这部分耗时也在后台线程里)
+
 
 class KGLinker:
-    def __init__(self):
+    def __init__(self, processes=None, background=False):
+        """
+        background=True 时在后台线程里加载 KG，构造函数立即返回；
+        校准/扩展在第一次真正用到词表时才等待加载完成 (wait_ready)，
+        这样加载可以和第一个查询的 LLM 往返重叠。
+        """
         print(f"Loading Knowledge Graph from {Config.DATA_PATH}...")
         self.vocab = []
+        self.index = None
+        self.graph = None
+        # 基础快照 + 增量层 (kg_delta.Layer)；vocab/index/graph 是它们的合并视图
+        self.layers = []
+        # 每次切换到新的视图 (导入分片 / 合并) 加一，依赖词表的组件据此刷新 (例如规则解析)
+        self.generation = 0
+        # 导入和合并互斥 (全局下标依赖层的顺序)，查询不受影响
+        self._ingest_lock = threading.Lock()
+        # 批量校准的工作进程数，进程池在第一次大批量校准时才启动
+        self.processes = Config.GROUNDING_PROCESSES if processes is None else processes
+        self._pool = None
+        # 校准结果缓存 (按词表版本失效)，KG 加载成功后创建
+        self.memo = None
+        self._ready = threading.Event()
+        if background:
+            threading.Thread(target=self._load, name="kg-loader", daemon=True).start()
+        else:
+            self._load()
+
+    def _load(self):
+        from . import grounding_cache, kg_delta, kg_snapshot
+
+        start = time.perf_counter()
         try:
-            # 优化：只读取 subject 和 object 列，节省内存
-            # 确保安装了 pyarrow: pip install pyarrow
-            df = pd.read_parquet(Config.DATA_PATH, engine='pyarrow', columns=['subject', 'object'])
-            
-            # 构建词表：合并两列并去重
-            vocab_set = set(df['subject'].dropna().unique()) | set(df['object'].dropna().unique())
-            self.vocab = list(vocab_set)
+            # 优先 mmap 加载已编译的快照 (去重排序后的词表 + trigram 索引)，
+            # 只有 parquet 变化时才重新读取并构建；之前导入的增量层按顺序叠加在上面
+            base = kg_delta.base_layer(Config.DATA_PATH, *kg_snapshot.load_or_build(Config.DATA_PATH))
+            layers = [base] + kg_delta.load_deltas(Config.DATA_PATH, base)
+            self.memo = grounding_cache.from_config(Config, Config.DATA_PATH,
+                                                    kg_delta.vocab_version(Config.DATA_PATH, layers))
+            self._set_layers(layers)
             
-            print(f"KG Loaded. Vocab size: {len(self.vocab)}")
+            print(f"KG Loaded. Vocab size: {len(self.vocab)}, Edges: {self.graph.n_edges if self.graph else 0}"
+                  + (f", Delta layers: {len(layers) - 1}" if len(layers) > 1 else ""))
             
         except Exception as e:
             print(f"⚠️ Error loading KG: {e}")
             print("Running in offline mode (No Grounding).")
             self.vocab = []
+            self.index = None
+            self.graph = None
+            self.layers = []
+        finally:
+            tracing.observe("kg.load", time.perf_counter() - start)
+            # 加载失败也算"就绪" (离线模式)，等待者不会一直卡住
+            self._ready.set()
+
+        # 配置的分片里还没导入过的，就绪之后再构建增量层 (不耽误查询)
+        if self.layers and Config.KG_SHARDS:
+            self.ingest(Config.KG_SHARDS)
+
+    def _set_layers(self, layers):
+        """切换到新的层列表：先换视图再换缓存版本，并发的查询要么用旧视图，要么用新视图"""
+        from . import kg_delta
+
+        vocab, index, graph = kg_delta.views(layers)
+        self.layers = layers
+        self.vocab, self.index, self.graph = vocab, index, graph
+        self.generation += 1
+        if self.memo is not None and self.generation > 1:
+            self.memo.reset(kg_delta.vocab_version(Config.DATA_PATH, layers))
+        # 进程池里是旧的索引，关掉后下次大批量校准时按新的层重建
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.close()
+
+    def ingest(self, paths, background=False):
+        """
+        导入新的 parquet 分片 (文件、目录或它们的列表)：只为新词构建增量层，
+        构建完成后原子地切换到新视图，正在进行的查询不受影响。已导入过的分片 (内容哈希相同) 跳过。
+        增量层超过 KG_MAX_DELTAS 个时在后台合并。
+        background=True 时在后台线程里导入，立即返回待检查的分片文件列表；否则返回实际导入的文件。
+        """
+        from . import kg_delta
+
+        files = kg_delta.shard_files(paths)
+        if background:
+            threading.Thread(target=self.ingest, args=(files,), name="kg-ingest", daemon=True).start()
+            return files
+
+        self.wait_ready()
+        added = []
+        with self._ingest_lock:
+            if not self.layers:
+                print("⚠️ KG is offline, skipping shard ingestion.")
+                return added
+            for path in files:
+                start = time.perf_counter()
+                try:
+                    layer = kg_delta.build_delta(Config.DATA_PATH, self.layers, path)
+                except Exception as e:
+                    print(f"⚠️ Failed to ingest KG shard {path}: {e}")
+                    continue
+                if layer is None:
+                    continue
+                self._set_layers(self.layers + [layer])
+                added.append(path)
+                tracing.observe("kg.ingest", time.perf_counter() - start)
+                print(f"KG shard ingested: {path} (+{len(layer.terms)} terms, {layer.graph.n_edges} edges)")
+        if len(self.layers) - 1 > Config.KG_MAX_DELTAS:
+            self.compact(background=True)
+        return added
+
+    def compact(self, background=False):
+        """把增量层合并进基础快照 (只做数组重映射，不重新预处理词表)；合并期间照常提供查询"""
+        from . import kg_delta
+
+        if background:
+            threading.Thread(target=self.compact, name="kg-compact", daemon=True).start()
+            return
+        self.wait_ready()
+        with self._ingest_lock:
+            if len(self.layers) <= 1:
+                return
+            start = time.perf_counter()
+            n_deltas = len(self.layers) - 1
+            try:
+                layers = kg_delta.compact(Config.DATA_PATH, self.layers)
+            except Exception as e:
+                print(f"⚠️ KG compaction failed: {e}")
+                return
+            self._set_layers(layers)
+            tracing.observe("kg.compact", time.perf_counter() - start)
+            print(f"KG compacted {n_deltas} delta layers. Vocab size: {len(self.vocab)}")
+
+    def layer_stats(self):
+        """各层的来源和规模 (GET /stats)"""
+        return [{"source": layer.meta.get("source"), "terms": len(layer.terms),
+                 "edges": layer.graph.n_edges if layer.graph is not None else 0}
+                for layer in self.layers]
+
+    @property
+    def ready(self):
+        """KG 是否已加载完成 (或加载失败进入离线模式)"""
+        return self._ready.is_set()
+
+    def wait_ready(self, timeout=None):
+        """等待后台加载完成，返回是否就绪；同步加载时立即返回"""
+        if self._ready.is_set():
+            return True
+        with tracing.span("kg.wait_ready"):
+            return self._ready.wait(timeout)
 
     def ground_keyword(self, keyword, threshold=85):
         """
         输入一个词，返回图谱中最相似的标准词。
         如果相似度不够高，就返回原词。
         """
-        if not self.vocab or not keyword:
+        if not keyword:
+            return keyword
+        self.wait_ready()
+        if not self.vocab:
             return keyword
+
+        # 算过的词直接返回 (None 表示上次就没有足够相似的词)
+        # 版本号要在取索引之前记下：打分期间导入了新分片的话，这次的结果不写进缓存
+        memo = self.memo
+        if memo is not None:
+            version = memo.version
+            cached = memo.get(keyword, threshold)
+            if cached is not memo.UNKNOWN:
+                return keyword if cached is None else cached
             
-        # 使用 fuzzywuzzy 进行模糊匹配
-        # extractOne 返回格式: ('匹配词', 分数)
-        best_match, score = process.extractOne(keyword, self.vocab)
-        
-        if score >= threshold:
-            # 只有当相似度很高时（比如 > 85），才认为是拼写错误并修正
-            # print(f"[KG Grounding] '{keyword}' -> '{best_match}' (Score: {score})") # 调试用
-            return best_match
-        
-        return keyword
\ No newline at end of file
+        # trigram 索引按 WRatio 上界排除不可能胜出的词，只给剩下的词打分
+        # 结果与 process.extractOne(keyword, self.vocab) 一致: ('匹配词', 分数)
+        with tracing.span("kg.ground_keyword"):
+            match = self.index.extract_one(keyword, score_cutoff=threshold)
+        if match is None or match[1] < threshold:
+            if memo is not None:
+                memo.set(keyword, threshold, None, version)
+            return keyword
+        best_match, score = match
+
+        # 只有当相似度很高时（比如 > 85），才认为是拼写错误并修正
+        tracing.logger.debug("KG Grounding: '%s' -> '%s' (Score: %s)", keyword, best_match, score)
+        if memo is not None:
+            memo.set(keyword, threshold, best_match, version)
+        return best_match
+
+    def ground_keywords(self, keywords, threshold=85, workers=1):
+        """
+        批量校准：输入关键词列表，返回等长的标准词列表。
+        每个词的结果与 ground_keyword 相同 (同一个索引、同一个打分器)，重复的关键词只计算一次；
+        workers 是 rapidfuzz 收紧上界时的线程数 (-1 表示所有核)；配置了多个校准进程
+        (GROUNDING_PROCESSES) 且批量足够大时改为多进程打分。
+        """
+        self.wait_ready()
+        if not self.vocab:
+            return list(keywords)
+
+        # 去重 (保持首次出现的顺序)，空值/非字符串原样返回
+        unique = list(dict.fromkeys(kw for kw in keywords if kw and isinstance(kw, str)))
+        grounded = {}
+        memo = self.memo
+        if memo is not None:
+            # 命中缓存的词不再打分，只把没见过的词送去匹配
+            version = memo.version
+            todo = []
+            for kw in unique:
+                cached = memo.get(kw, threshold)
+                if cached is memo.UNKNOWN:
+                    todo.append(kw)
+                elif cached is not None:
+                    grounded[kw] = cached
+            unique = todo
+        start = time.perf_counter()
+        if self.processes > 1 and len(unique) >= Config.GROUNDING_MIN_BATCH:
+            # 大批量：分块交给共享同一份 mmap 词表的工作进程 (有增量层时工作进程里也逐层打分)
+            matches = self._get_pool().extract_batch(unique, score_cutoff=threshold)
+        else:
+            matches = self.index.extract_batch(unique, score_cutoff=threshold, workers=workers)
+        for kw, m in zip(unique, matches):
+            if m is not None:
+                grounded[kw] = m[0]
+            if memo is not None:
+                memo.set(kw, threshold, m[0] if m is not None else None, version)
+        if unique:
+            # 记整批耗时；除以 kg.keywords 即每词均摊
+            tracing.observe("kg.ground_batch", time.perf_counter() - start)
+            tracing.count("kg.keywords", len(unique))
+            tracing.count("kg.corrected", sum(1 for kw in unique if grounded.get(kw, kw) != kw))
+
+        return [grounded.get(kw, kw) if isinstance(kw, str) else kw for kw in keywords]
+
+    def expand(self, term, relations=None, depth=1, limit=20, direction="both"):
+        """
+        查询扩展：返回图谱中与 term 相连的词 (同义词/上下位词等)，不含 term 本身。
+        - relations: 只沿这些关系扩展 (例如 ["is_a"])，None 表示所有关系
+        - depth:     最多走几跳
+        - direction: out 沿 subject -> object，in 反向，both 两个方向
+        term 需要是图谱里的标准词 (先 ground_keyword)；不在图谱里返回空列表。
+        """
+        self.wait_ready()
+        # 词表和邻接索引要取自同一个视图 (期间可能切换到新的层)
+        vocab, graph = self.vocab, self.graph
+        if graph is None or not term:
+            return []
+        node = vocab.find(term)
+        if node < 0:
+            return []
+        return [vocab[i] for i in graph.expand(node, relations, depth, limit, direction)]
+
+    def expand_keywords(self, keywords, relations=None, depth=1, limit=5):
+        """对一组 (已校准的) 关键词做扩展，合并去重，不包含输入词本身"""
+        seen = {kw for kw in keywords if isinstance(kw, str)}
+        expanded = []
+        for kw in keywords:
+            for term in self.expand(kw, relations, depth, limit):
+                if term not in seen:
+                    seen.add(term)
+                    expanded.append(term)
+        return expanded
+
+    def _get_pool(self):
+        if self._pool is None:
+            from .grounding_pool import GroundingPool
+            self._pool = GroundingPool(self.index, self.processes)
+        return self._pool
+
+    def close(self):
+        """关闭校准进程池 (如果启动过)，把校准缓存里还没写盘的结果写入磁盘"""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+        if self.memo is not None:
+            self.memo.flush()
@@ -0,0 +1,350 @@
+# src/kg_snapshot.py
+"""
+KG 词表 + 模糊索引 + 邻接索引的磁盘快照。
+
+每次启动都用 pandas 读 parquet、去重、再建索引非常慢。这里把构建结果编译成
+一组 .npy 文件 (排好序的去重词表 + trigram 倒排索引 + 关系邻接 CSR)，启动时直接 mmap 加载；
+只有当 parquet 的 mtime/大小变化且内容哈希也变了时才重新构建。
+
+构建时按 row group 流式读取 parquet，用 Arrow 的 unique 去重、排序，
+词表直接从 Arrow 的 offsets/data 缓冲区得到，全程不产生逐词的 Python 字符串。
+
+快照目录里每次写入都是一个新的版本子目录，CURRENT 文件记录当前生效的版本，
+写完新版本后原子地替换 CURRENT；读取时先解析 CURRENT，所有数组都从同一个版本目录读，
+并发的读者 (包括其它进程) 不会看到缺失或写了一半的快照。上一个版本保留到下一次写入再删，
+给刚解析完 CURRENT、还没打开文件的读者留出时间。
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from bisect import bisect_left
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from .config import Config
+from .fuzzy_index import NgramIndex
+from .kg_graph import GRAPH_ARRAYS, AdjacencyIndex
+
+# 快照格式版本：数组布局变化时 +1，旧快照会自动失效重建
+SNAPSHOT_VERSION = 3
+
+INDEX_ARRAYS = ["keys", "offsets", "postings", "gram_counts", "short_ids", "lengths", "token_lengths"]
+
+# 快照目录里指向当前版本子目录的文件
+CURRENT = "CURRENT"
+
+# 流式读取 parquet 时每批的行数
+VOCAB_BATCH_ROWS = 65536
+
+
+class TermTable:
+    """
+    紧凑词表：所有词的 UTF-8 编码首尾相接存在一个 uint8 缓冲区里，
+    第 i 个词是 blob[offsets[i]:offsets[i+1]]。
+    词按字典序排列，可以二分查找；缓冲区可以直接来自 mmap，不占 Python 对象内存。
+    """
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def from_terms(cls, terms):
+        """去重、排序后打包成 TermTable"""
+        return cls.pack(sorted(set(terms)))
+
+    @classmethod
+    def pack(cls, terms):
+        """按原顺序打包 (不去重不排序，下标与输入一一对应)"""
+        encoded = [t.encode('utf-8') for t in terms]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return cls(blob, offsets)
+
+    @classmethod
+    def from_arrow(cls, array):
+        """由 (无空值的) Arrow 字符串数组构造，直接复用其 data 缓冲区"""
+        array = array.cast(pa.large_string())
+        if len(array) == 0:
+            return cls(np.zeros(0, dtype=np.uint8), np.zeros(1, dtype=np.int64))
+        _, offsets_buf, data_buf = array.buffers()
+        offsets = np.frombuffer(offsets_buf, dtype=np.int64)[array.offset:array.offset + len(array) + 1]
+        data = np.frombuffer(data_buf, dtype=np.uint8) if data_buf is not None else np.zeros(0, dtype=np.uint8)
+        return cls(data[offsets[0]:offsets[-1]], offsets - offsets[0])
+
+    def to_arrow(self):
+        """零拷贝转成 Arrow LargeStringArray (给 pc.index_in / pc.is_in 做 value_set)"""
+        return pa.LargeStringArray.from_buffers(
+            len(self), pa.py_buffer(np.ascontiguousarray(self.offsets)), pa.py_buffer(np.ascontiguousarray(self.blob))
+        )
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def find(self, term):
+        """二分查找词的下标，不存在返回 -1"""
+        i = bisect_left(self, term)
+        if i < len(self) and self[i] == term:
+            return i
+        return -1
+
+    def find_all(self, terms):
+        """
+        批量版 find：terms 是 Arrow 字符串数组，返回每个词的下标 (不存在为 -1)。
+        所有词同时做二分查找，每一步用 Arrow 逐元素比较，代价 O(len(terms) * log(len(self)))，
+        不需要为整个词表建哈希表 (pc.is_in / index_in 每次调用都要建一遍)。
+        """
+        terms = terms.cast(pa.large_string())
+        if len(self) == 0:
+            return np.full(len(terms), -1, dtype=np.int64)
+        table = self.to_arrow()
+        # 与 bisect_left 相同：lo 是第一个不小于查询词的位置
+        lo = np.zeros(len(terms), dtype=np.int64)
+        hi = np.full(len(terms), len(self), dtype=np.int64)
+        while (lo < hi).any():
+            active = lo < hi
+            mid = (lo + hi) // 2
+            below = pc.less(table.take(np.minimum(mid, len(self) - 1)), terms).to_numpy(zero_copy_only=False)
+            lo = np.where(active & below, mid + 1, lo)
+            hi = np.where(active & ~below, mid, hi)
+        hit = lo < len(self)
+        hit[hit] = pc.equal(table.take(lo[hit]), terms.filter(pa.array(hit))).to_numpy(zero_copy_only=False)
+        return np.where(hit, lo, -1)
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """parquet 内容的 sha256，仅在 mtime 变化时才计算"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_name(data_path):
+    """
+    数据文件在缓存目录里的名字：文件名 (便于辨认) + 绝对路径的哈希，
+    不同目录下的同名 parquet (例如两个分片目录里的 s1.parquet) 各有各的缓存
+    """
+    path = Path(data_path).resolve()
+    return f"{path.stem}-{hashlib.sha1(str(path).encode('utf-8')).hexdigest()[:12]}"
+
+
+def snapshot_dir(data_path):
+    """每个 parquet 对应缓存目录下的一个子目录"""
+    return Path(Config.KG_CACHE_DIR) / cache_name(data_path)
+
+
+def current_dir(target):
+    """快照目录 target 当前生效的版本子目录；还没有写过快照时返回 None"""
+    target = Path(target)
+    try:
+        name = (target / CURRENT).read_text(encoding='utf-8').strip()
+    except OSError:
+        return None
+    return target / name if name else None
+
+
+def _write_atomic(path, text):
+    tmp = path.with_name(f".{path.name}-{os.getpid()}-{threading.get_ident()}")
+    tmp.write_text(text, encoding='utf-8')
+    os.replace(tmp, path)
+
+
+def read_term_table(data_path, batch_size=VOCAB_BATCH_ROWS):
+    """
+    从 parquet 的 subject/object 两列流式构建去重、排序后的 TermTable。
+    每批先各自 unique，待合并的部分超过已去重部分时再整体 unique 一次，
+    内存峰值约为 "去重后的词表 + 一批数据"，而不是整列的多份拷贝。
+    Arrow 按 UTF-8 字节序排序，与 Python 字符串排序一致 (TermTable.find 依赖这一点)。
+    """
+    seen = pa.array([], type=pa.large_string())
+    pending, pending_len = [], 0
+    parquet = pq.ParquetFile(data_path)
+    for batch in parquet.iter_batches(batch_size=batch_size, columns=['subject', 'object']):
+        for column in batch.columns:
+            uniq = pc.unique(column.drop_null()).cast(pa.large_string())
+            pending.append(uniq)
+            pending_len += len(uniq)
+        if pending_len >= max(len(seen), batch_size):
+            seen = pc.unique(pa.concat_arrays([seen] + pending))
+            pending, pending_len = [], 0
+
+    if pending:
+        seen = pc.unique(pa.concat_arrays([seen] + pending))
+    return TermTable.from_arrow(seen.take(pc.array_sort_indices(seen)))
+
+
+def build(data_path):
+    """从 parquet 构建 (TermTable, NgramIndex, AdjacencyIndex)"""
+    terms = read_term_table(data_path)
+    return terms, NgramIndex.build(terms), AdjacencyIndex.build(data_path, terms)
+
+
+def source_meta(path, content_hash=None):
+    """快照 meta 里描述数据来源的字段 (路径、大小、mtime、内容哈希)"""
+    stat = os.stat(path)
+    return {
+        "version": SNAPSHOT_VERSION,
+        "source": str(path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": content_hash or file_hash(path),
+    }
+
+
+def save(data_path, terms, index, graph=None, content_hash=None, shards=None):
+    """
+    把构建结果写成快照；先写临时目录再整体替换，避免并发读到半成品。
+    graph 为 None 时快照里没有邻接索引 (load 返回的 graph 也是 None)。
+    shards 是已合并进快照的增量分片的内容哈希 (见 kg_delta.compact)。
+    """
+    meta = source_meta(data_path, content_hash)
+    meta["shards"] = list(shards or [])
+    return write_snapshot(snapshot_dir(data_path), meta, terms, index, graph)
+
+
+def write_snapshot(target, meta, terms, index, graph=None):
+    """
+    把词表/索引数组和 meta.json 写成 target 下的一个新版本，再原子地切换 CURRENT
+    (基础快照和增量层共用)。上一个版本保留，更早的版本删掉。
+    """
+    meta = dict(meta, vocab_size=len(terms), relations=graph.relations if graph is not None else None)
+    target = Path(target)
+    target.mkdir(parents=True, exist_ok=True)
+    previous = current_dir(target)
+    # 以 "." 开头的是还在写的目录，清理旧版本时不会碰到别的进程正在写的版本
+    tmp = Path(tempfile.mkdtemp(dir=target, prefix=".v-"))
+    version = target / tmp.name[1:]
+    try:
+        np.save(tmp / "terms_blob.npy", terms.blob)
+        np.save(tmp / "terms_offsets.npy", terms.offsets)
+        for name in INDEX_ARRAYS:
+            np.save(tmp / f"index_{name}.npy", getattr(index, name))
+        if graph is not None:
+            for name in GRAPH_ARRAYS:
+                np.save(tmp / f"graph_{name}.npy", getattr(graph, name))
+        (tmp / "meta.json").write_text(json.dumps(meta, indent=2), encoding='utf-8')
+        os.replace(tmp, version)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    _write_atomic(target / CURRENT, version.name)
+
+    for old in target.iterdir():
+        if old.is_dir() and not old.name.startswith(".") and old not in (version, previous):
+            shutil.rmtree(old, ignore_errors=True)
+    return meta
+
+
+def load(data_path):
+    """以 mmap 方式加载快照，返回 (TermTable, NgramIndex, AdjacencyIndex 或 None)"""
+    return read_snapshot(snapshot_dir(data_path))[:3]
+
+
+def _meta_path(target):
+    current = current_dir(target)
+    if current is None:
+        raise FileNotFoundError(f"No KG snapshot in {target}")
+    return current / "meta.json"
+
+
+def read_meta(data_path):
+    """基础快照的 meta.json 内容"""
+    return json.loads(_meta_path(snapshot_dir(data_path)).read_text(encoding='utf-8'))
+
+
+def read_snapshot(target):
+    """mmap 加载 write_snapshot 写出的目录，返回 (TermTable, NgramIndex, AdjacencyIndex 或 None, meta)"""
+    while True:
+        version = _meta_path(target).parent
+        try:
+            return _read_version(version)
+        except FileNotFoundError:
+            # 读的过程中又写入了两个新版本，这个版本已被清理：重新解析 CURRENT
+            if current_dir(target) == version:
+                raise
+
+
+def _read_version(version):
+    arr = lambda name: np.load(version / f"{name}.npy", mmap_mode='r')
+    terms = TermTable(arr("terms_blob"), arr("terms_offsets"))
+    index = NgramIndex(terms, *(arr(f"index_{name}") for name in INDEX_ARRAYS))
+    meta = json.loads((version / "meta.json").read_text(encoding='utf-8'))
+    graph = None
+    if meta.get("relations") is not None:
+        graph = AdjacencyIndex(meta["relations"], *(arr(f"graph_{name}") for name in GRAPH_ARRAYS))
+    return terms, index, graph, meta
+
+
+def is_fresh(data_path):
+    """
+    判断快照是否还能用：
+    - 版本号、文件大小、mtime 都一致 -> 直接用
+    - mtime 变了但内容哈希一致 (例如被 touch / 重新拷贝) -> 更新 meta 后继续用
+    """
+    try:
+        meta_path = _meta_path(snapshot_dir(data_path))
+        meta = json.loads(meta_path.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return False
+
+    stat = os.stat(data_path)
+    if meta.get("version") != SNAPSHOT_VERSION or meta.get("size") != stat.st_size:
+        return False
+    if meta.get("mtime_ns") == stat.st_mtime_ns:
+        return True
+    if meta.get("sha256") != file_hash(data_path):
+        return False
+
+    meta["mtime_ns"] = stat.st_mtime_ns
+    _write_atomic(meta_path, json.dumps(meta, indent=2))
+    return True
+
+
+def vocab_version(data_path):
+    """
+    词表版本标识 "快照格式版本:内容哈希"，供依赖词表的缓存 (校准 memo) 判断是否失效。
+    优先取快照 meta 里已算好的哈希，没有快照时现算。
+    """
+    try:
+        content_hash = read_meta(data_path)["sha256"]
+    except (OSError, ValueError, KeyError):
+        content_hash = file_hash(data_path)
+    return f"{SNAPSHOT_VERSION}:{content_hash}"
+
+
+def load_or_build(data_path):
+    """
+    KGLinker 的入口：快照新鲜就 mmap 加载，否则从 parquet 重建并写回快照。
+    写快照失败 (例如目录只读) 不影响本次使用。
+    """
+    if is_fresh(data_path):
+        return load(data_path)
+
+    print("KG snapshot missing or stale, rebuilding from parquet...")
+    terms, index, graph = build(data_path)
+    try:
+        save(data_path, terms, index, graph)
+        # 重新以 mmap 方式打开，释放构建时的内存副本
+        return load(data_path)
+    except OSError as e:
+        print(f"⚠️ Failed to write KG snapshot: {e}")
+        return terms, index, graph
@@ -1,24 +1,18 @@
 # src/llm_client.py
-from openai import OpenAI
+# openai / httpx 导入要半秒多，放到第一次创建客户端时再导入 (见 LLMClient.client)
+import asyncio
+import hashlib
 import json
+import threading
+import time
 from .config import Config
+from . import intent_cache
+from . import tracing
+from .json_stream import StreamingJSONObject
 
-class LLMClient:
-    def __init__(self):
-        # 初始化客户端
-        self.client = OpenAI(api_key=Config.API_KEY, base_url=Config.BASE_URL)
-
-    def extract_intent(self, user_query):
-        """
-        发送 Prompt 并解析 JSON，提取结构化意图
-        """
-        # --- 关键修改：Prompt 必须明确要求返回哪些字段 ---
-        prompt = f"""
-        You are an expert academic search assistant, a professional Geology Librarian and Search Query Optimizer.
-        Analyze the user query: "{user_query}".
-        Your task is to convert the user's natural language query into a structured JSON for an academic search engine.
-
-        ### Guidelines:
+# --- 关键修改：Prompt 必须明确要求返回哪些字段 ---
+# 意图提取规则：单条 Prompt 和批量 Prompt 共用
+INTENT_GUIDELINES = """        ### Guidelines:
         1. **Keywords (Critical)**: 
            - Extract the main geological/scientific terms.
            - **Normalize to Singular form**: e.g., "rocks" -> "rock", "volcanoes" -> "volcano".
@@ -33,7 +27,15 @@ class LLMClient:
            - If the user says "recent" or "latest", set 'year_start' to 2020.
            - If a specific year is mentioned (e.g., "since 2015"), use that.
 
-        Output JSON format:
+"""
+
+# 模板里的 {{ }} 是字面量花括号，{user_query} 在调用时填入
+INTENT_PROMPT_TEMPLATE = """
+        You are an expert academic search assistant, a professional Geology Librarian and Search Query Optimizer.
+        Analyze the user query: "{user_query}".
+        Your task is to convert the user's natural language query into a structured JSON for an academic search engine.
+
+""" + INTENT_GUIDELINES + """        Output JSON format:
         {{
             "keywords": ["English Term 1", "English Term 2"], 
             "institution": "English Name or null",
@@ -64,25 +66,455 @@ class LLMClient:
             "year_end": null
         }}
         """
+
+# 批量 Prompt：一次请求解析多条查询，规则部分只发送一次
+# {count} 是查询条数，{queries} 是 [{"id": 0, "query": "..."}, ...] 的单行 JSON
+INTENT_BATCH_PROMPT_TEMPLATE = """
+        You are an expert academic search assistant, a professional Geology Librarian and Search Query Optimizer.
+        Analyze each of the {count} user queries below independently.
+        Your task is to convert every query into a structured JSON object for an academic search engine.
+
+""" + INTENT_GUIDELINES + """        Queries (JSON array of {{"id": ..., "query": ...}}):
+        {queries}
+
+        ### Output Format (Strict JSON only):
+        A JSON array with exactly {count} objects, one per query, in the same order:
+        [
+            {{"id": 0, "keywords": ["Term 1", "Term 2"], "institution": "Full Name or null", "author": "Name or null", "year_start": 2020 (int or null), "year_end": null}}
+        ]
+
+        Rules:
+        - Only return the JSON array.
+        - Copy each query's "id" into its object.
+        """
+
+# 模板哈希作为缓存键的一部分：改了 Prompt，旧缓存自动失效
+# (批量 Prompt 与单条 Prompt 的规则相同，批量结果也按单条 Prompt 的键缓存)
+INTENT_PROMPT_HASH = hashlib.sha256(INTENT_PROMPT_TEMPLATE.encode('utf-8')).hexdigest()[:16]
+
+def clean_json(content):
+    """清洗一下返回内容，防止包含 ```json ``` 标记"""
+    return content.replace("```json", "").replace("```", "").strip()
+
+
+def batch_prompt(queries):
+    items = [{"id": i, "query": q} for i, q in enumerate(queries)]
+    return INTENT_BATCH_PROMPT_TEMPLATE.format(count=len(queries), queries=json.dumps(items, ensure_ascii=False))
+
+
+def is_valid_intent(intent):
+    """单条意图的最低要求：是字典，keywords 是字符串或字符串列表"""
+    if not isinstance(intent, dict):
+        return False
+    keywords = intent.get('keywords')
+    if isinstance(keywords, str):
+        return True
+    return isinstance(keywords, list) and all(isinstance(k, str) for k in keywords)
+
+
+def parse_intent(content):
+    """解析单条回复 (已 clean_json)，不是合法 JSON 或不满足 is_valid_intent 时返回 None"""
+    try:
+        intent = json.loads(content or "")
+    except json.JSONDecodeError:
+        return None
+    return intent if is_valid_intent(intent) else None
+
+
+def parse_batch(content, queries):
+    """
+    解析批量回复，返回与 queries 对齐的意图列表，解析/校验失败的位置为 None。
+    优先按 "id" 对齐，没有 id 时按位置；回显的 "query" 与原查询不符视为失败。
+    """
+    results = [None] * len(queries)
+    try:
+        data = json.loads(clean_json(content or ""))
+    except json.JSONDecodeError:
+        return results
+    if isinstance(data, dict):
+        # 有些模型会把数组包一层 {"results": [...]}
+        data = next((v for v in data.values() if isinstance(v, list)), None)
+    if not isinstance(data, list):
+        return results
+
+    for pos, item in enumerate(data):
+        if not isinstance(item, dict):
+            continue
+        idx = item.get('id', pos)
+        if not isinstance(idx, int) or not 0 <= idx < len(queries) or results[idx] is not None:
+            continue
+        if 'query' in item and item['query'] != queries[idx]:
+            continue
+        intent = {k: v for k, v in item.items() if k not in ('id', 'query')}
+        if is_valid_intent(intent):
+            results[idx] = intent
+    return results
+
+
+class _IntentCacheMixin:
+    """同步/异步客户端共用的缓存读写逻辑"""
+
+    def _cache_lookup(self, user_query):
+        """返回 (缓存键, 命中的意图或 None)；未启用缓存时键为 None"""
+        if self.cache is None:
+            return None, None
+        cache_key = intent_cache.make_key(user_query, Config.MODEL_NAME, INTENT_PROMPT_HASH)
+        cached = self.cache.get(cache_key)
+        if cached is not None and not is_valid_intent(cached):
+            # 旧版本没校验就写进去的结果 (例如 keywords 是数字)，当作未命中重新解析
+            cached = None
+        tracing.count("intent_cache.hit" if cached is not None else "intent_cache.miss")
+        return cache_key, cached
+
+    def _cache_store(self, cache_key, intent):
+        # 只缓存成功解析的结果，降级结果不缓存
+        if cache_key is not None:
+            self.cache.set(cache_key, intent)
+
+    def _finish_intent(self, user_query, cache_key, content, intent):
+        """
+        非流式提取的收尾：intent 是 parse_intent 的结果，合法才缓存并返回；
+        否则降级成 {"keywords": [user_query]}，降级结果不缓存。
+        """
+        if intent is None:
+            print(f"[LLM Error] Failed to parse intent JSON. Raw content: {content}")
+            tracing.count("llm.fallback")
+            # 降级处理：提取失败时，把整个查询当做关键词
+            return {"keywords": [user_query]}
+        self._cache_store(cache_key, intent)
+        return intent
+
+    def _finish_stream(self, parser, user_query, cache_key, on_field, error=None):
+        """
+        流式提取结束后的收尾：完整解析且通过 is_valid_intent 才缓存；只解析出部分字段 (输出被截断) 时
+        用已完成的字段；keywords 没有或不合法就降级成 {"keywords": [user_query]}。
+        保证每个字段 (尤其是 keywords) 恰好回调一次 (不合法的 keywords 在 _feed_stream 里没有回调)。
+        """
+        intent = parser.result() if error is None else None
+        if not is_valid_intent(intent):
+            intent = None
+        if intent is not None:
+            self._cache_store(cache_key, intent)
+        elif is_valid_intent(parser.fields):
+            intent = dict(parser.fields)
+        else:
+            if error is None:
+                print(f"[LLM Error] Failed to parse JSON. Raw content: {parser.text}")
+            tracing.count("llm.fallback")
+            intent = {"keywords": [user_query]}
+
+        if on_field is not None:
+            emitted = set(parser.fields) if is_valid_intent(parser.fields) else set(parser.fields) - {'keywords'}
+            for key, value in intent.items():
+                if key not in emitted:
+                    on_field(key, value)
+        return intent
+
+    @staticmethod
+    def _feed_stream(parser, delta, on_field, start):
+        """把一段流式输出交给增量解析器，回调新完成的字段；记录解析耗时和 keywords 到达时间"""
+        with tracing.span("llm.json_parse"):
+            completed = parser.feed(delta)
+        for key, value in completed:
+            if key == 'keywords':
+                if not is_valid_intent({key: value}):
+                    # 不合法的 keywords 不回调，收尾时 (_finish_stream) 用降级结果补上
+                    continue
+                tracing.observe("llm.time_to_keywords", time.perf_counter() - start)
+            if on_field is not None:
+                on_field(key, value)
+
+    @staticmethod
+    def _emit_all(intent, on_field):
+        if on_field is not None:
+            for key, value in intent.items():
+                on_field(key, value)
+
+    def _plan_batch(self, queries, batch_size):
+        """
+        批量提取的准备工作：先查缓存，没命中的查询去重后按 batch_size 分组。
+        返回 (结果列表 (命中缓存的已填好), {查询: (缓存键, [下标])}, 分组)
+        """
+        results = [None] * len(queries)
+        pending = {}
+        for i, query in enumerate(queries):
+            if query in pending:
+                pending[query][1].append(i)
+                continue
+            cache_key, cached = self._cache_lookup(query)
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending[query] = (cache_key, [i])
+        unique = list(pending)
+        batch_size = max(1, batch_size or Config.LLM_BATCH_SIZE)
+        chunks = [unique[i:i + batch_size] for i in range(0, len(unique), batch_size)]
+        return results, pending, chunks
+
+    def _fill_batch(self, results, pending, query, intent):
+        cache_key, indices = pending[query]
+        self._cache_store(cache_key, intent)
+        for i in indices:
+            results[i] = intent
+
+
+class LLMClient(_IntentCacheMixin):
+    def __init__(self, cache=None):
+        # OpenAI 客户端在第一次用到时才创建 (连带导入 openai)，见 client 属性
+        self._client = None
+        self._client_lock = threading.Lock()
+        # 意图缓存：未显式传入时按 Config.INTENT_CACHE 创建 (off 表示不缓存)
+        self.cache = cache if cache is not None else intent_cache.from_config(Config)
+
+    @property
+    def client(self):
+        """
+        OpenAI 客户端。第一次访问时导入 openai 并创建；
+        快速启动时 SearchAgent 在后台线程里提前访问一次，用户输入查询时已经就绪。
+        """
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from openai import OpenAI
+                    self._client = OpenAI(api_key=Config.API_KEY, base_url=Config.BASE_URL)
+        return self._client
+
+    def extract_intent(self, user_query):
+        """
+        发送 Prompt 并解析 JSON，提取结构化意图
+        """
+        prompt = INTENT_PROMPT_TEMPLATE.format(user_query=user_query)
+
+        # 先查缓存：同样的查询 + 模型 + Prompt 模板直接复用上次的结果
+        cache_key, cached = self._cache_lookup(user_query)
+        if cached is not None:
+            return cached
         
+        content = None
+        try:
+            with tracing.span("llm.request"):
+                response = self.client.chat.completions.create(
+                    model=Config.MODEL_NAME,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0 # 温度设为0，让输出更稳定
+                )
+            with tracing.span("llm.json_parse"):
+                content = clean_json(response.choices[0].message.content)
+                intent = parse_intent(content)
+        except Exception as e:
+            print(f"[LLM Error] API Call failed: {e}")
+            tracing.count("llm.fallback")
+            return {"keywords": [user_query]}
+        return self._finish_intent(user_query, cache_key, content, intent)
+
+    def extract_intent_stream(self, user_query, on_field=None):
+        """
+        流式版 extract_intent：边接收边增量解析，每个顶层字段一完成就回调
+        on_field(key, value)，keywords 通常最先到，调用方可以提前开始校准/检索。
+        返回完整意图，缓存和降级行为与 extract_intent 一致。
+        """
+        cache_key, cached = self._cache_lookup(user_query)
+        if cached is not None:
+            self._emit_all(cached, on_field)
+            return cached
+
+        parser = StreamingJSONObject()
+        start = time.perf_counter()
         try:
-            response = self.client.chat.completions.create(
+            stream = self.client.chat.completions.create(
                 model=Config.MODEL_NAME,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0 # 温度设为0，让输出更稳定
+                messages=[{"role": "user", "content": INTENT_PROMPT_TEMPLATE.format(user_query=user_query)}],
+                temperature=0,
+                stream=True
             )
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                self._feed_stream(parser, delta, on_field, start)
+        except Exception as e:
+            if not parser.text:
+                # 一个字都没收到 (例如服务端不支持流式)：退回普通请求
+                print(f"[LLM Warning] Streaming failed ({e}), retrying without stream")
+                tracing.count("llm.stream_fallback")
+                intent = self.extract_intent(user_query)
+                self._emit_all(intent, on_field)
+                return intent
+            print(f"[LLM Error] API Call failed: {e}")
+            return self._finish_stream(parser, user_query, cache_key, on_field, error=e)
+        return self._finish_stream(parser, user_query, cache_key, on_field)
+
+    def _request_batch(self, chunk):
+        """一次请求解析一组查询，返回对齐的意图列表 (失败的位置为 None)"""
+        content = None
+        try:
+            with tracing.span("llm.batch_request"):
+                response = self.client.chat.completions.create(
+                    model=Config.MODEL_NAME,
+                    messages=[{"role": "user", "content": batch_prompt(chunk)}],
+                    temperature=0
+                )
             content = response.choices[0].message.content
-            
-            # 清洗一下返回内容，防止包含 ```json ``` 标记
-            content = content.replace("```json", "").replace("```", "").strip()
-            
-            return json.loads(content)
-            
-        except json.JSONDecodeError:
-            print(f"[LLM Error] Failed to parse JSON. Raw content: {content}")
-            # 降级处理：提取失败时，把整个查询当做关键词
+        except Exception as e:
+            print(f"[LLM Error] Batch API call failed: {e}")
+        return parse_batch(content, chunk)
+
+    def extract_intents_batch(self, queries, batch_size=None):
+        """
+        批量提取意图：每 batch_size 条查询打包成一个 Prompt (规则说明只发一次)，
+        要求返回 JSON 数组并逐条校验；解析失败的条目再单独用 extract_intent 重试。
+        命中缓存的查询不发请求，重复的查询只解析一次。结果顺序与输入一致。
+        """
+        results, pending, chunks = self._plan_batch(queries, batch_size)
+        failed = []
+        for chunk in chunks:
+            for query, intent in zip(chunk, self._request_batch(chunk)):
+                if intent is None:
+                    failed.append(query)
+                else:
+                    self._fill_batch(results, pending, query, intent)
+
+        if failed:
+            print(f"[LLM Warning] {len(failed)} queries failed in batch, retrying one by one")
+            tracing.count("llm.batch_retry", len(failed))
+        for query in failed:
+            intent = self.extract_intent(query)
+            for i in pending[query][1]:
+                results[i] = intent
+        return results
+
+
+class AsyncLLMClient(_IntentCacheMixin):
+    """
+    异步版 LLMClient：基于 AsyncOpenAI，多个查询可以同时在途。
+    - 所有请求共用一个 httpx.AsyncClient 连接池 (keep-alive)
+    - 用 Semaphore 限制同时在途的请求数，避免打爆上游限流
+    需要在同一个事件循环里使用，用完调用 aclose() 或用 async with。
+    """
+
+    def __init__(self, cache=None, concurrency=None):
+        import httpx
+        from openai import AsyncOpenAI
+
+        self.concurrency = concurrency or Config.LLM_CONCURRENCY
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.concurrency,
+                max_keepalive_connections=self.concurrency,
+            ),
+            timeout=Config.LLM_TIMEOUT,
+        )
+        self.client = AsyncOpenAI(
+            api_key=Config.API_KEY, base_url=Config.BASE_URL, http_client=self.http_client
+        )
+        self.cache = cache if cache is not None else intent_cache.from_config(Config)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+    async def extract_intent(self, user_query):
+        """异步提取单个查询的意图，失败时的降级行为与 LLMClient 一致"""
+        prompt = INTENT_PROMPT_TEMPLATE.format(user_query=user_query)
+
+        cache_key, cached = self._cache_lookup(user_query)
+        if cached is not None:
+            return cached
+
+        content = None
+        try:
+            async with self._semaphore:
+                with tracing.span("llm.request"):
+                    response = await self.client.chat.completions.create(
+                        model=Config.MODEL_NAME,
+                        messages=[{"role": "user", "content": prompt}],
+                        temperature=0
+                    )
+            with tracing.span("llm.json_parse"):
+                content = clean_json(response.choices[0].message.content)
+                intent = parse_intent(content)
+        except Exception as e:
+            print(f"[LLM Error] API Call failed: {e}")
+            tracing.count("llm.fallback")
             return {"keywords": [user_query]}
-            
+        return self._finish_intent(user_query, cache_key, content, intent)
+
+    async def extract_intents(self, queries):
+        """并发提取一批查询的意图，结果顺序与输入一致"""
+        return await asyncio.gather(*(self.extract_intent(q) for q in queries))
+
+    async def extract_intent_stream(self, user_query, on_field=None):
+        """LLMClient.extract_intent_stream 的异步版本 (on_field 是普通函数，在事件循环线程里调用)"""
+        cache_key, cached = self._cache_lookup(user_query)
+        if cached is not None:
+            self._emit_all(cached, on_field)
+            return cached
+
+        parser = StreamingJSONObject()
+        start = time.perf_counter()
+        try:
+            async with self._semaphore:
+                stream = await self.client.chat.completions.create(
+                    model=Config.MODEL_NAME,
+                    messages=[{"role": "user", "content": INTENT_PROMPT_TEMPLATE.format(user_query=user_query)}],
+                    temperature=0,
+                    stream=True
+                )
+                async for chunk in stream:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if not delta:
+                        continue
+                    self._feed_stream(parser, delta, on_field, start)
         except Exception as e:
+            if not parser.text:
+                print(f"[LLM Warning] Streaming failed ({e}), retrying without stream")
+                tracing.count("llm.stream_fallback")
+                intent = await self.extract_intent(user_query)
+                self._emit_all(intent, on_field)
+                return intent
             print(f"[LLM Error] API Call failed: {e}")
-            return {"keywords": [user_query]}
\ No newline at end of file
+            return self._finish_stream(parser, user_query, cache_key, on_field, error=e)
+        return self._finish_stream(parser, user_query, cache_key, on_field)
+
+    async def _request_batch(self, chunk):
+        content = None
+        try:
+            async with self._semaphore:
+                with tracing.span("llm.batch_request"):
+                    response = await self.client.chat.completions.create(
+                        model=Config.MODEL_NAME,
+                        messages=[{"role": "user", "content": batch_prompt(chunk)}],
+                        temperature=0
+                    )
+            content = response.choices[0].message.content
+        except Exception as e:
+            print(f"[LLM Error] Batch API call failed: {e}")
+        return parse_batch(content, chunk)
+
+    async def extract_intents_batch(self, queries, batch_size=None):
+        """LLMClient.extract_intents_batch 的异步版本，各批请求并发发送"""
+        results, pending, chunks = self._plan_batch(queries, batch_size)
+        outcomes = await asyncio.gather(*(self._request_batch(chunk) for chunk in chunks))
+
+        failed = []
+        for chunk, intents in zip(chunks, outcomes):
+            for query, intent in zip(chunk, intents):
+                if intent is None:
+                    failed.append(query)
+                else:
+                    self._fill_batch(results, pending, query, intent)
+
+        if failed:
+            print(f"[LLM Warning] {len(failed)} queries failed in batch, retrying one by one")
+            tracing.count("llm.batch_retry", len(failed))
+        retried = await asyncio.gather(*(self.extract_intent(q) for q in failed))
+        for query, intent in zip(failed, retried):
+            for i in pending[query][1]:
+                results[i] = intent
+        return results
+
+    async def aclose(self):
+        await self.client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
@@ -0,0 +1,301 @@
+# src/mock_servers.py
+"""
+本地 Mock 服务：用标准库 http.server 模拟外部依赖，方便离线测试与基准。
+
+- MockOpenAIServer: OpenAI 兼容的 /v1/chat/completions 接口，可配置延迟与回复内容
+  (recorded_responder 回放录制的意图)
+- MockAcemapServer: Acemap /api/v1/work/search 检索接口，可配置延迟与故障注入，支持 ETag 条件请求
+
+用法:
+    with MockOpenAIServer(latency=0.5) as server:
+        Config.BASE_URL = server.base_url
+        ...
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from email.utils import formatdate
+from urllib.parse import parse_qs, urlparse
+
+# 从意图 Prompt 里取出用户原始查询
+_QUERY_RE = re.compile(r'Analyze the user query: "(.*)"\.')
+# 批量 Prompt 里的查询列表 (单行 JSON)
+_BATCH_RE = re.compile(r'^\s*(\[\{"id".*\])\s*$', re.MULTILINE)
+
+
+def _echo_intent(query):
+    return {"keywords": [query], "institution": None, "author": None, "year_start": None, "year_end": None}
+
+
+def _respond(prompt, intent_for):
+    """按 intent_for(query) 回复单条或批量 Prompt (批量 Prompt 返回数组)"""
+    batch = _BATCH_RE.search(prompt)
+    if batch:
+        items = json.loads(batch.group(1))
+        return json.dumps([{"id": item["id"], **intent_for(item["query"])} for item in items],
+                          ensure_ascii=False)
+    match = _QUERY_RE.search(prompt)
+    query = match.group(1) if match else prompt
+    return json.dumps(intent_for(query), ensure_ascii=False)
+
+
+def default_intent_responder(prompt):
+    """默认回复：把 Prompt 里的用户查询原样当作关键词返回 (批量 Prompt 返回数组)"""
+    return _respond(prompt, _echo_intent)
+
+
+def recorded_responder(recordings):
+    """
+    回放录制好的意图：recordings 是 {查询: 意图 dict}，没录到的查询退回原样回显。
+    基准测试用它让 Mock LLM 给出确定、接近真实模型的输出 (带拼写错误的关键词、机构、年份)。
+    """
+    return lambda prompt: _respond(prompt, lambda query: recordings.get(query) or _echo_intent(query))
+
+
+class _MockServer:
+    """在后台线程里运行 ThreadingHTTPServer 的公共部分"""
+
+    def __init__(self, handler_cls, latency=0.0, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.request_count = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(handler_cls):
+            mock = server
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _enter_request(self):
+        with self._lock:
+            self.request_count += 1
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+
+    def _exit_request(self):
+        with self._lock:
+            self._in_flight -= 1
+
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    mock = None
+
+    def log_message(self, format, *args):
+        # 不往 stderr 打访问日志
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _OpenAIHandler(_JSONHandler):
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        self.mock._enter_request()
+        try:
+            payload = self._read_json()
+            prompt = payload["messages"][-1]["content"]
+            if self.mock.latency:
+                time.sleep(self.mock.latency)
+            content = self.mock.responder(prompt)
+            if payload.get("stream"):
+                self._send_stream(content, payload.get("model", "mock"))
+                return
+            self._send_json(200, {
+                "id": f"chatcmpl-mock-{self.mock.request_count}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": payload.get("model", "mock"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                          "total_tokens": (len(prompt) + len(content)) // 4},
+            })
+        finally:
+            self.mock._exit_request()
+
+
+    def _send_stream(self, content, model):
+        """stream=True：按 chunk_size 个字符切块，以 SSE 逐块发送，块间隔 chunk_delay 秒"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        size = max(1, self.mock.chunk_size)
+        pieces = [content[i:i + size] for i in range(0, len(content), size)]
+        for i, piece in enumerate(pieces + [None]):
+            if i and self.mock.chunk_delay:
+                time.sleep(self.mock.chunk_delay)
+            delta = {"content": piece} if piece is not None else {}
+            event = {
+                "id": f"chatcmpl-mock-{self.mock.request_count}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": None if piece is not None else "stop"}],
+            }
+            self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class MockOpenAIServer(_MockServer):
+    """
+    OpenAI 兼容的 chat completion 服务。
+    responder(prompt) -> str 决定回复内容，默认把用户查询当关键词返回。
+    流式请求 (stream=True) 时 latency 是首块延迟，之后每 chunk_size 个字符间隔 chunk_delay 秒，
+    用来模拟模型逐 token 生成。
+    """
+
+    def __init__(self, latency=0.0, responder=None, chunk_delay=0.0, chunk_size=8,
+                 host="127.0.0.1", port=0):
+        super().__init__(_OpenAIHandler, latency=latency, host=host, port=port)
+        self.responder = responder or default_intent_responder
+        self.chunk_delay = chunk_delay
+        self.chunk_size = chunk_size
+
+    @property
+    def base_url(self):
+        return f"{self.url}/v1"
+
+
+def default_papers(keyword, page, size, total):
+    """按 (关键词, 页码) 确定性地生成一页 OpenAlex 风格的论文"""
+    seed = int(hashlib.md5(f"{keyword}|{page}".encode("utf-8")).hexdigest()[:8], 16)
+    rng = random.Random(seed)
+    start = (page - 1) * size
+    papers = []
+    for i in range(start, min(start + size, total)):
+        papers.append({
+            "id": "W" + hashlib.md5(f"{keyword}|{i}".encode("utf-8")).hexdigest()[:10],
+            "display_name": f"{keyword} study #{i + 1}",
+            "publication_year": rng.randint(1990, 2025),
+            "cited_by_count": rng.randint(0, 500),
+            "authorships": [{
+                "author": {"display_name": rng.choice(["John Smith", "Li Wei", "Maria Garcia", "Anna Müller"])},
+                "institutions": [{"display_name": rng.choice([
+                    "Massachusetts Institute of Technology",
+                    "Chinese Academy of Sciences",
+                    "Shanghai Jiao Tong University",
+                    "University of Cambridge",
+                ])}],
+            }],
+        })
+    return papers
+
+
+class _AcemapHandler(_JSONHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        if not url.path.rstrip("/").endswith("/work/search"):
+            self._send_json(404, {"error": "not found"})
+            return
+
+        self.mock._enter_request()
+        try:
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if self.mock.latency:
+                time.sleep(self.mock.latency)
+
+            # 故障注入：接下来的 N 个请求返回指定状态码
+            with self.mock._lock:
+                failure = self.mock._failures.pop(0) if self.mock._failures else None
+            if failure is not None:
+                self._send_json(failure, {"error": f"injected {failure}"}, {"Retry-After": "0"})
+                return
+
+            keyword = query.get("keyword", "")
+            page = int(query.get("page", 1))
+            size = int(query.get("size", 10))
+            total = self.mock.total_for(keyword)
+            papers = self.mock.paper_factory(keyword, page, size, total)
+            payload = {"meta": {"count": total, "page": page, "per_page": size}, "results": papers}
+
+            # 支持条件请求：内容不变时回 304
+            etag = '"' + hashlib.md5(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest() + '"'
+            headers = {"ETag": etag, "Last-Modified": self.mock.last_modified}
+            if self.headers.get("If-None-Match") == etag:
+                with self.mock._lock:
+                    self.mock.not_modified_count += 1
+                self.send_response(304)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                return
+            self._send_json(200, payload, headers)
+        finally:
+            self.mock._exit_request()
+
+
+class MockAcemapServer(_MockServer):
+    """
+    Acemap 检索接口。每个关键词的命中总数由 total_for(keyword) 决定 (默认 100)，
+    论文内容由 paper_factory(keyword, page, size, total) 生成。
+    fail_next(n, status) 让接下来 n 个请求返回指定错误码，用来验证重试逻辑。
+    """
+
+    def __init__(self, latency=0.0, total=100, paper_factory=None, host="127.0.0.1", port=0):
+        super().__init__(_AcemapHandler, latency=latency, host=host, port=port)
+        self.total = total
+        self.paper_factory = paper_factory or default_papers
+        self._failures = []
+        self.last_modified = formatdate(time.time(), usegmt=True)
+        self.not_modified_count = 0
+
+    def total_for(self, keyword):
+        return self.total if keyword else 0
+
+    def fail_next(self, n=1, status=503):
+        with self._lock:
+            self._failures.extend([status] * n)
+
+    @property
+    def search_url(self):
+        return f"{self.url}/api/v1/work/search"
@@ -0,0 +1,180 @@
+# src/query_runner.py
+"""
+evaluate.py / compare_search.py 共用的批量运行工具：从文件读查询、有界并发执行、结果边跑边落盘、中断后续跑。
+
+- load_cases(path): 读取 JSONL / JSON / CSV / TXT 查询文件，返回 [{"id", "name", "query"}]
+  JSONL 每行一个对象，查询取 query / user_query / text / body 字段，名称取 name / case_name / title，
+  编号取 id / request_id / case_id (都没有就用行号)；JSON 是整个文件一个数组 (元素是对象或查询字符串，
+  编号默认用下标，从 1 开始)，也可以是单个对象；CSV 需要 query 列；TXT 一行一条查询
+- run_bounded(fn, items, workers): 线程池执行 fn(item)，同时在途的任务不超过 2 * workers，
+  按完成顺序逐个产出 (item, result, error)，几千条查询也不会一次性全部提交
+- CSVSink / MarkdownSink: 每条结果写完立即 flush；resume=True 时读出已完成的编号，调用方跳过这些查询
+"""
+import csv
+import json
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+_QUERY_FIELDS = ("query", "user_query", "text", "body")
+_NAME_FIELDS = ("name", "case_name", "title")
+_ID_FIELDS = ("id", "request_id", "case_id")
+
+
+def _first(record, fields):
+    for field in fields:
+        value = record.get(field)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def _case(record, lineno):
+    if isinstance(record, str):
+        record = {"query": record}
+    elif not isinstance(record, dict):
+        return None
+    query = _first(record, _QUERY_FIELDS)
+    if not isinstance(query, str) or not query.strip():
+        return None
+    case_id = str(_first(record, _ID_FIELDS) or lineno)
+    return {"id": case_id, "name": _first(record, _NAME_FIELDS) or case_id, "query": query.strip()}
+
+
+def load_cases(path):
+    """读取查询文件；没有查询内容的行跳过，编号重复时只保留第一条"""
+    path = Path(path)
+    suffix = path.suffix.lower()
+    cases = []
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if suffix == ".csv":
+            for lineno, row in enumerate(csv.DictReader(f), 1):
+                cases.append(_case(row, lineno))
+        elif suffix == ".json":
+            data = json.load(f)
+            records = data if isinstance(data, list) else [data]
+            for index, record in enumerate(records, 1):
+                cases.append(_case(record, index))
+        elif suffix in (".jsonl", ".ndjson"):
+            for lineno, line in enumerate(f, 1):
+                if line.strip():
+                    cases.append(_case(json.loads(line), lineno))
+        else:
+            for lineno, line in enumerate(f, 1):
+                cases.append(_case({"query": line}, lineno))
+
+    seen, result = set(), []
+    for case in cases:
+        if case is not None and case["id"] not in seen:
+            seen.add(case["id"])
+            result.append(case)
+    return result
+
+
+def inline_cases(queries):
+    """把脚本里写死的查询列表 [(名称, 查询)] 或 [查询] 转成 load_cases 的格式"""
+    cases = []
+    for i, item in enumerate(queries, 1):
+        name, query = item if isinstance(item, tuple) else (str(i), item)
+        cases.append({"id": str(i), "name": name, "query": query})
+    return cases
+
+
+def run_bounded(fn, items, workers=4):
+    """
+    并发执行 fn(item)，按完成顺序产出 (item, result, error)；fn 抛异常时 result 为 None。
+    调用方中途退出 (break / KeyboardInterrupt) 时取消还没开始的任务。
+    """
+    items = iter(items)
+    workers = max(1, workers)
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="runner")
+    pending = {}
+
+    def submit_next():
+        for item in items:
+            pending[pool.submit(fn, item)] = item
+            return True
+        return False
+
+    try:
+        while len(pending) < 2 * workers and submit_next():
+            pass
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                error = future.exception()
+                yield item, (None if error else future.result()), error
+                submit_next()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+class CSVSink:
+    """逐行追加的 CSV；列表/字典类型的值写成 JSON。id_column 用来识别已完成的行"""
+
+    def __init__(self, path, columns, id_column="ID", resume=False):
+        self.path = Path(path)
+        self.columns = columns
+        self.id_column = id_column
+        self.done = set()
+        exists = resume and self.path.exists() and self.path.stat().st_size > 0
+        if exists:
+            with open(self.path, encoding="utf-8-sig", newline="") as f:
+                self.done = {row[id_column] for row in csv.DictReader(f) if row.get(id_column)}
+        # 新文件带 BOM (Excel 打开不乱码)，追加时不能再写一次
+        self._file = open(self.path, "a" if exists else "w", encoding="utf-8" if exists else "utf-8-sig",
+                          newline="")
+        self._writer = csv.DictWriter(self._file, fieldnames=columns, extrasaction="ignore")
+        if not exists:
+            self._writer.writeheader()
+            self._file.flush()
+
+    def write(self, row):
+        self._writer.writerow({k: json.dumps(v, ensure_ascii=False) if isinstance(v, (list, dict)) else v
+                               for k, v in row.items()})
+        self._file.flush()
+        self.done.add(str(row[self.id_column]))
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Markdown 报告里每个用例段落开头的标记，续跑时据此判断哪些用例已完成
+_CASE_MARKER = "<!-- case: {} -->"
+_CASE_MARKER_RE = re.compile(r"^<!-- case: (.+?) -->$", re.MULTILINE)
+
+
+class MarkdownSink:
+    """逐段追加的 Markdown 报告；header 只在新建文件时写入"""
+
+    def __init__(self, path, header="", resume=False):
+        self.path = Path(path)
+        self.done = set()
+        exists = resume and self.path.exists() and self.path.stat().st_size > 0
+        if exists:
+            self.done = set(_CASE_MARKER_RE.findall(self.path.read_text(encoding="utf-8")))
+        self._file = open(self.path, "a" if exists else "w", encoding="utf-8")
+        if not exists and header:
+            self._file.write(header + "\n")
+            self._file.flush()
+
+    def write(self, case_id, section):
+        self._file.write(_CASE_MARKER.format(case_id) + "\n" + section + "\n")
+        self._file.flush()
+        self.done.add(str(case_id))
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,152 @@
+# src/response_cache.py
+"""
+Acemap 检索响应缓存。
+
+同样的校准关键词 (例如 "Granite"、"Plate tectonics") 会被反复检索，
+这里按 (keyword, page, size, order) 缓存解析后的响应：
+- 内存层：OrderedDict LRU，条目数有上限
+- 磁盘层 (可选)：SQLite 文件，内存淘汰或重启后仍可命中
+- TTL 内直接返回；过期后如果有 ETag / Last-Modified，
+  由 AcemapClient 发条件请求，服务端回 304 就续期复用旧内容
+
+注意：命中时返回的是同一个对象，调用方应把结果当只读数据使用。
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+
+class CacheEntry:
+    __slots__ = ("data", "etag", "last_modified", "fresh_until")
+
+    def __init__(self, data, etag=None, last_modified=None, fresh_until=0.0):
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fresh_until = fresh_until
+
+    def is_fresh(self, now=None):
+        return (now or time.time()) < self.fresh_until
+
+    def can_revalidate(self):
+        return bool(self.etag or self.last_modified)
+
+
+def make_key(params):
+    """检索参数 -> 缓存键 (参数顺序无关)"""
+    return json.dumps({k: params[k] for k in sorted(params)}, ensure_ascii=False)
+
+
+class ResponseCache:
+    def __init__(self, max_entries=1024, ttl=300, disk_path=None, max_disk_entries=100000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._conn = None
+        if disk_path:
+            Path(disk_path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(disk_path), check_same_thread=False)
+            with self._conn:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS acemap_cache ("
+                    " key TEXT PRIMARY KEY, body TEXT NOT NULL, etag TEXT, last_modified TEXT,"
+                    " fresh_until REAL NOT NULL, accessed_at REAL NOT NULL)"
+                )
+                self._conn.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_acemap_cache_accessed ON acemap_cache(accessed_at)"
+                )
+
+    def get(self, key):
+        """返回 CacheEntry (可能已过期，由调用方决定是否重新验证)；没有则返回 None"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry
+            if self._conn is None:
+                return None
+
+            row = self._conn.execute(
+                "SELECT body, etag, last_modified, fresh_until FROM acemap_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE acemap_cache SET accessed_at = ? WHERE key = ?", (time.time(), key)
+                )
+            entry = CacheEntry(json.loads(row[0]), row[1], row[2], row[3])
+            # 磁盘命中提升到内存层
+            self._put_memory(key, entry)
+            return entry
+
+    def set(self, key, data, etag=None, last_modified=None):
+        entry = CacheEntry(data, etag, last_modified, time.time() + self.ttl)
+        with self._lock:
+            self._put_memory(key, entry)
+            self._put_disk(key, entry)
+        return entry
+
+    def refresh(self, key, entry):
+        """条件请求得到 304：内容不变，只延长新鲜期"""
+        entry.fresh_until = time.time() + self.ttl
+        with self._lock:
+            self._put_memory(key, entry)
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute(
+                        "UPDATE acemap_cache SET fresh_until = ?, accessed_at = ? WHERE key = ?",
+                        (entry.fresh_until, time.time(), key),
+                    )
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute("DELETE FROM acemap_cache")
+
+    def __len__(self):
+        return len(self._memory)
+
+    def _put_memory(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _put_disk(self, key, entry):
+        if self._conn is None:
+            return
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO acemap_cache"
+                " (key, body, etag, last_modified, fresh_until, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, json.dumps(entry.data, ensure_ascii=False), entry.etag, entry.last_modified,
+                 entry.fresh_until, time.time()),
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM acemap_cache").fetchone()
+            if count > self.max_disk_entries:
+                self._conn.execute(
+                    "DELETE FROM acemap_cache WHERE key IN ("
+                    " SELECT key FROM acemap_cache ORDER BY accessed_at LIMIT ?)",
+                    (count - self.max_disk_entries,),
+                )
+
+
+def from_config(config):
+    """ACEMAP_CACHE_SIZE=0 表示关闭缓存；ACEMAP_CACHE_PATH 非空时启用磁盘层"""
+    if not config.ACEMAP_CACHE_SIZE:
+        return None
+    return ResponseCache(
+        max_entries=config.ACEMAP_CACHE_SIZE,
+        ttl=config.ACEMAP_CACHE_TTL,
+        disk_path=config.ACEMAP_CACHE_PATH or None,
+    )
@@ -0,0 +1,254 @@
+# src/results.py
+"""
+列式结果集：检索结果的过滤、排序、Top-K 都按整列计算。
+
+Acemap 返回的是 dict 列表，原来逐篇调用 filters.matches、按列表切片取前 N 篇；
+翻得越深、合并的关键词越多，逐条 Python 判断的开销越大。ResultSet 保留原始 dict 作为行数据，
+过滤/排序需要哪一列才把哪一列转成 Arrow / NumPy 列 (在 pyarrow 的 C++ 里完成转换)：
+- year / cited:             NumPy int64 列 (缺失为 0)
+- authors / institutions:   展平的名字列 + 每个名字所属的行号，
+                            子串匹配用 pyarrow.compute.match_substring，再按行号归并成行掩码
+- 过滤条件与 filters.matches 一致，得到一个布尔掩码，一次 take 出符合条件的行；
+  先算便宜的年份条件，作者/机构列只为剩下的行构建
+- 列转换有固定开销：少于 YEAR_VECTORIZE_MIN 篇时 (例如一页 20 篇) 直接逐篇 filters.matches；
+  作者/机构列要转换嵌套的 authorships，更贵，剩下的行少于 NAMES_VECTORIZE_MIN 篇时逐篇判断
+- top_k 用 np.partition 取前 K，不做全量排序；分值相同时保持原来的先后顺序
+
+字段类型不规整 (例如年份是字符串) 时 Arrow 转换会失败，该列退回逐篇解析 (filters 里的辅助函数)，结果不变。
+pyarrow 在第一次用到时才导入，不拖慢启动。
+
+另外提供 loads：装了 orjson 就用它解析响应 JSON，否则用标准库 json。
+"""
+import json
+
+import numpy as np
+
+from . import filters as paper_filters
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 列路径的起点 (实测的持平点：年份列约 80 篇，作者/机构列约 500 篇)。
+# 检索流水线里逐页过滤 (20 篇) 走逐篇判断，融合后的几百篇至少年份条件走列路径
+YEAR_VECTORIZE_MIN = 100
+NAMES_VECTORIZE_MIN = 512
+
+# 可用的排序方式：RRF 融合分 / 被引数 / 年份
+SORT_KEYS = ("score", "cited", "year")
+
+_AUTHORSHIPS_TYPE = None
+
+
+def loads(data):
+    """解析 JSON (bytes 或 str)；格式错误抛 ValueError"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _struct_column(papers, field, type):
+    """把每篇论文的 field 字段转成一个 Arrow 数组；类型不符时返回 None"""
+    import pyarrow as pa
+
+    try:
+        return pa.array(papers, type=pa.struct([(field, type)])).field(0)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+        return None
+
+
+def _int_column(papers, field, parse):
+    import pyarrow as pa
+
+    values = _struct_column(papers, field, pa.int64())
+    if values is not None:
+        return values.fill_null(0).to_numpy(zero_copy_only=False)
+    return np.array([parse(p) or 0 for p in papers], dtype=np.int64)
+
+
+def _cited(paper):
+    try:
+        return int(paper.get('cited_by_count') or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _authorships_type():
+    global _AUTHORSHIPS_TYPE
+    if _AUTHORSHIPS_TYPE is None:
+        import pyarrow as pa
+
+        name = pa.struct([("display_name", pa.string())])
+        _AUTHORSHIPS_TYPE = pa.list_(pa.struct([("author", name), ("institutions", pa.list_(name))]))
+    return _AUTHORSHIPS_TYPE
+
+
+def _name_columns(papers):
+    """
+    返回 {"authors": (名字, 行号), "institutions": (名字, 行号), "has_authorships": 布尔列}；
+    名字是 Arrow 字符串数组，行号是 NumPy 数组，二者一一对应
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    authorships = _struct_column(papers, 'authorships', _authorships_type())
+    if authorships is not None:
+        rows = pc.list_parent_indices(authorships).to_numpy()
+        flat = pc.list_flatten(authorships)
+        institutions = pc.struct_field(flat, "institutions")
+        inst_rows = rows[pc.list_parent_indices(institutions).to_numpy()]
+        return {
+            "authors": (pc.struct_field(flat, ["author", "display_name"]), rows),
+            "institutions": (pc.struct_field(pc.list_flatten(institutions), "display_name"), inst_rows),
+            "has_authorships": pc.fill_null(pc.greater(pc.list_value_length(authorships), 0), False)
+                                 .to_numpy(zero_copy_only=False),
+        }
+
+    columns = {}
+    for name, extract in (("authors", paper_filters.paper_authors),
+                          ("institutions", paper_filters.paper_institutions)):
+        per_paper = [extract(p) for p in papers]
+        rows = np.repeat(np.arange(len(papers)), [len(names) for names in per_paper])
+        columns[name] = (pa.array([n for names in per_paper for n in names], type=pa.string()), rows)
+    columns["has_authorships"] = np.array([bool(p.get('authorships')) for p in papers], dtype=bool)
+    return columns
+
+
+def top_indices(values, k):
+    """values 最大的 k 个位置，按值从大到小；值相同时位置靠前的在前 (与稳定排序一致)"""
+    n = len(values)
+    if k >= n:
+        return np.argsort(-values, kind="stable")
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    kth = np.partition(values, n - k)[n - k]
+    above = np.flatnonzero(values > kth)
+    ties = np.flatnonzero(values == kth)[:k - len(above)]
+    picked = np.concatenate([above, ties])
+    return picked[np.argsort(-values[picked], kind="stable")]
+
+
+class ResultSet:
+    """
+    一组论文 (原始 dict，顺序即排名) 及可选的分数 (RRF 融合分)。
+    filter / top_k / take 返回新的 ResultSet，只挑选行，不复制论文。
+    """
+
+    def __init__(self, papers, scores=None):
+        self.papers = papers if isinstance(papers, list) else list(papers)
+        self.scores = None if scores is None else np.asarray(scores, dtype=np.float64)
+        self._columns = {}
+
+    def __len__(self):
+        return len(self.papers)
+
+    def column(self, name):
+        """year / cited 返回 NumPy 列；authors / institutions 返回 (名字, 行号)；has_authorships 返回布尔列"""
+        if name not in self._columns:
+            if name == "year":
+                self._columns[name] = _int_column(self.papers, 'publication_year', paper_filters.paper_year)
+            elif name == "cited":
+                self._columns[name] = _int_column(self.papers, 'cited_by_count', _cited)
+            elif name == "score":
+                if self.scores is None:
+                    raise ValueError("ResultSet has no scores")
+                return self.scores
+            else:
+                self._columns.update(_name_columns(self.papers))
+        return self._columns[name]
+
+    def _contains(self, name, needle):
+        """每行是否有某个名字包含 needle (大小写不敏感)"""
+        import pyarrow.compute as pc
+
+        names, rows = self.column(name)
+        mask = np.zeros(len(self), dtype=bool)
+        if len(names):
+            hit = pc.fill_null(pc.match_substring(names, needle, ignore_case=True), False)
+            mask[rows[hit.to_numpy(zero_copy_only=False)]] = True
+        return mask
+
+    def mask(self, filters):
+        """与 filters.matches 相同的判断，返回布尔掩码"""
+        mask = np.ones(len(self), dtype=bool)
+        if not filters or not len(self):
+            return mask
+        if len(self) < YEAR_VECTORIZE_MIN:
+            return np.fromiter((paper_filters.matches(p, filters) for p in self.papers), dtype=bool,
+                               count=len(self))
+
+        year_start = filters.get('year_start')
+        year_end = filters.get('year_end')
+        if year_start or year_end:
+            year = self.column("year")
+            mask &= year != 0
+            if year_start:
+                mask &= year >= int(year_start)
+            if year_end:
+                mask &= year <= int(year_end)
+
+        # 没有 authorships 的论文无法判断作者/机构，直接保留
+        author = filters.get('author')
+        institution = filters.get('institution')
+        if (author or institution) and mask.any():
+            rows = np.flatnonzero(mask)
+            if len(rows) < NAMES_VECTORIZE_MIN:
+                mask[rows] = [paper_filters.matches_names(self.papers[i], filters) for i in rows]
+                return mask
+            rows = None if len(rows) == len(self) else rows
+            rest = self if rows is None else self.take(rows)
+            keep = ~rest.column("has_authorships")
+            if author:
+                keep_author = keep | rest._contains("authors", author)
+            else:
+                keep_author = np.ones(len(rest), dtype=bool)
+            if institution:
+                keep_author &= keep | rest._contains("institutions", institution)
+            if rows is None:
+                mask &= keep_author
+            else:
+                mask[rows] = keep_author
+        return mask
+
+    def take(self, indices):
+        indices = np.asarray(indices, dtype=np.int64)
+        taken = ResultSet([self.papers[i] for i in indices],
+                          None if self.scores is None else self.scores[indices])
+        for name in ("year", "cited"):
+            if name in self._columns:
+                taken._columns[name] = self._columns[name][indices]
+        return taken
+
+    def filter(self, filters):
+        if not filters or not len(self):
+            return self
+        if len(self) < YEAR_VECTORIZE_MIN:
+            kept = [i for i, p in enumerate(self.papers) if paper_filters.matches(p, filters)]
+            return self if len(kept) == len(self) else self.take(kept)
+        mask = self.mask(filters)
+        if mask.all():
+            return self
+        return self.take(np.flatnonzero(mask))
+
+    def top_k(self, k, by="score"):
+        """
+        按 by (score / cited / year) 从高到低取前 k 篇；by="score" 但没有分数时保持原顺序。
+        分值相同的论文保持原来的相对顺序。
+        """
+        if by not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key: {by!r} (expected one of {', '.join(SORT_KEYS)})")
+        if by == "score" and self.scores is None:
+            return self.take(np.arange(min(k, len(self))))
+        return self.take(top_indices(self.column(by), k))
+
+    def preview(self, n=5, title_width=None):
+        """前 n 篇的展示用行 (Title / Year / Cited)，title_width 截断过长的标题"""
+        rows = []
+        for paper in self.papers[:n]:
+            title = paper.get('display_name') or paper.get('title') or "No Title"
+            if title_width and len(title) > title_width:
+                title = title[:title_width] + "..."
+            year = paper_filters.paper_year(paper)
+            rows.append({"Title": title, "Year": year if year else "-", "Cited": _cited(paper)})
+        return rows
@@ -0,0 +1,139 @@
+# src/retrieval.py
+"""
+多关键词检索 + 倒数排名融合 (Reciprocal Rank Fusion)。
+
+原来只检索 grounded_kws[0]，其余提取出来的词全部丢掉。这里对所有校准后的关键词
+(以及可选的 KG 扩展词) 并发检索，再用 RRF 合并排序、按论文 id 去重：
+    score(paper) = sum_i  weight_i / (k + rank_i(paper))
+并发请求让总延迟接近单次检索；合并用 numpy 一次性完成，候选多时也不慢。
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .acemap_client import AcemapError
+from .config import Config
+from .results import ResultSet
+from . import tracing
+
+# RRF 常数，沿用论文里的经验值
+RRF_K = 60
+# KG 扩展词 (同义词/下位词) 的权重低于用户原始关键词
+EXPANSION_WEIGHT = 0.5
+# 每个关键词最多取这么多篇符合过滤条件的论文参与融合
+PER_KEYWORD = 20
+
+
+def paper_key(paper):
+    """去重用的论文标识：优先 id，没有就用规范化后的标题"""
+    pid = paper.get('id')
+    if pid:
+        return str(pid)
+    title = paper.get('display_name') or paper.get('title') or ""
+    return "title:" + " ".join(title.split()).casefold()
+
+
+def dedupe_keywords(keywords):
+    """去掉空值和大小写重复的关键词，保持原顺序"""
+    seen, result = set(), []
+    for kw in keywords:
+        if not kw or not isinstance(kw, str):
+            continue
+        key = kw.casefold()
+        if key not in seen:
+            seen.add(key)
+            result.append(kw)
+    return result
+
+
+def reciprocal_rank_fusion(result_lists, weights=None, k=RRF_K):
+    """
+    融合多个有序结果列表，返回 [(paper, score)]，按分数从高到低排列。
+    分数相同时，按论文第一次出现的位置排序 (稳定)。
+    """
+    sizes = [len(lst) for lst in result_lists]
+    if not sum(sizes):
+        return []
+    weights = weights or [1.0] * len(result_lists)
+
+    flat = [p for lst in result_lists for p in lst]
+    keys = np.array([paper_key(p) for p in flat], dtype=object)
+    ranks = np.concatenate([np.arange(1, n + 1) for n in sizes])
+    list_weights = np.concatenate([np.full(n, w, dtype=np.float64) for n, w in zip(sizes, weights)])
+
+    _, first_idx, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    scores = np.bincount(inverse, weights=list_weights / (k + ranks), minlength=len(first_idx))
+
+    order = np.lexsort((first_idx, -scores))
+    return [(flat[first_idx[i]], float(scores[i])) for i in order]
+
+
+def keyword_weights(keywords, expansions=None):
+    """去重后的 (关键词 + 扩展词, 对应的 RRF 权重)；与原始关键词重复的扩展词去掉"""
+    keywords = dedupe_keywords(keywords)
+    seen = {kw.casefold() for kw in keywords}
+    expansions = [kw for kw in dedupe_keywords(expansions or []) if kw.casefold() not in seen]
+    return keywords + expansions, [1.0] * len(keywords) + [EXPANSION_WEIGHT] * len(expansions)
+
+
+def stream_keyword(client, keyword, filters=None, limit=PER_KEYWORD):
+    """流式检索一个关键词 (iter_papers)，返回 (命中总数, 前 limit 篇符合 filters 的论文)"""
+    stream = client.iter_papers(keyword, filters, limit=limit)
+    papers = list(stream)
+    return stream.total, papers
+
+
+def fetch_lists(fetch, keywords, max_workers=None):
+    """
+    并发执行 fetch(keyword) -> [paper]，返回 (结果列表, 错误)：
+    结果列表与 keywords 对齐 (失败的关键词为空列表)，错误是 {keyword: message}。
+    """
+    if not keywords:
+        return [], {}
+    max_workers = max_workers or min(len(keywords), Config.ACEMAP_POOL_SIZE)
+
+    def run(kw):
+        try:
+            return fetch(kw), None
+        except AcemapError as e:
+            return [], str(e)
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="retrieval") as pool:
+        outcomes = list(pool.map(run, keywords))
+
+    lists = [papers for papers, _ in outcomes]
+    errors = {kw: err for kw, (_, err) in zip(keywords, outcomes) if err}
+    return lists, errors
+
+
+def fused_search(client, keywords, filters=None, expansions=None, per_keyword=PER_KEYWORD, limit=20,
+                 k=RRF_K, max_workers=None, sort_by=None):
+    """
+    对 keywords (+ 可选 expansions) 逐个流式检索并过滤 (iter_papers)，再用 RRF 融合，
+    按 sort_by (score / cited / year，默认 Config.RESULT_SORT) 从融合后的全部候选里取前 limit 篇。
+    返回 {"keywords", "papers", "scores", "totals", "errors"}；
+    所有关键词都失败时抛 AcemapError，部分失败只记录在 errors 里。
+    """
+    all_keywords, weights = keyword_weights(keywords, expansions)
+
+    totals = {}
+
+    def fetch(kw):
+        totals[kw], papers = stream_keyword(client, kw, filters, per_keyword)
+        return papers
+
+    lists, errors = fetch_lists(fetch, all_keywords, max_workers)
+    if all_keywords and len(errors) == len(all_keywords):
+        raise AcemapError("All keyword searches failed: " + "; ".join(errors.values()))
+
+    with tracing.span("retrieval.fuse"):
+        fused = reciprocal_rank_fusion(lists, weights, k)
+        ranked = ResultSet([p for p, _ in fused], [s for _, s in fused]).top_k(limit, sort_by or Config.RESULT_SORT)
+    return {
+        "keywords": all_keywords,
+        "papers": ranked.papers,
+        "scores": ranked.scores.tolist(),
+        # 按关键词顺序输出 (并发写入的顺序不确定)
+        "totals": {kw: totals[kw] for kw in all_keywords if kw in totals},
+        "errors": errors,
+    }
@@ -0,0 +1,98 @@
+# src/single_flight.py
+"""
+请求合并 (single-flight)：同一个键同时只执行一次，并发到达的相同请求等待并共享这一次的结果。
+
+热门查询在流量高峰时会同时到达很多份，每份都各自调一次 LLM、做一次模糊匹配、发一次 Acemap 请求。
+缓存只能挡住"之后"的重复，挡不住"同时"的重复 —— 第一份还没返回，缓存里还没有。
+这里只合并在途请求，结果一返回键就释放，下一次调用重新执行，所以不会引入陈旧数据。
+
+- SingleFlight:      线程版，do(key, fn, *args) 阻塞等待
+- AsyncSingleFlight: asyncio 版，await do(key, coro_fn, *args)；共享的任务用 shield 保护，
+                     某个等待者被取消不会影响其它等待者
+
+共享的结果是同一个对象，调用方应把它当只读数据使用 (与缓存命中时一样)。
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+
+from . import tracing
+
+
+class _Counters:
+    def __init__(self, name):
+        self.name = name
+        self.leaders = 0
+        self.shared = 0
+
+    def _record(self, leader):
+        if leader:
+            self.leaders += 1
+        else:
+            self.shared += 1
+            tracing.count(f"single_flight.{self.name}.shared")
+
+    def stats(self):
+        total = self.leaders + self.shared
+        return {
+            "executed": self.leaders,
+            "shared": self.shared,
+            "shared_ratio": round(self.shared / total, 4) if total else 0.0,
+        }
+
+
+class SingleFlight(_Counters):
+    def __init__(self, name):
+        super().__init__(name)
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        """执行 fn(*args, **kwargs)；相同 key 已在执行时等待其结果 (异常也一并共享)"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            self._record(leader)
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._forget(key)
+            future.set_exception(e)
+            raise
+        self._forget(key)
+        future.set_result(result)
+        return result
+
+    def _forget(self, key):
+        with self._lock:
+            self._calls.pop(key, None)
+
+
+class AsyncSingleFlight(_Counters):
+    def __init__(self, name):
+        super().__init__(name)
+        # (事件循环, key) -> Task；不同事件循环的任务互不共享
+        self._tasks = {}
+
+    async def do(self, key, coro_fn, *args):
+        loop = asyncio.get_running_loop()
+        slot = (loop, key)
+        task = self._tasks.get(slot)
+        leader = task is None
+        if leader:
+            task = self._tasks[slot] = asyncio.ensure_future(coro_fn(*args))
+            task.add_done_callback(lambda t: self._done(slot, t))
+        self._record(leader)
+        return await asyncio.shield(task)
+
+    def _done(self, slot, task):
+        if self._tasks.get(slot) is task:
+            del self._tasks[slot]
+        # 所有等待者都被取消时也要取走异常，避免 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,206 @@
+# src/tracing.py
+"""
+热路径埋点：分阶段耗时 (span)、计数器和直方图，可导出为 JSON 或 Prometheus 文本格式。
+
+用法:
+    from . import tracing
+    with tracing.span("llm.request"):
+        ...
+    tracing.count("intent_cache.hit")
+    tracing.observe("acemap.http", latency)
+
+    tracing.TRACER.snapshot()     # {"counters": {...}, "histograms": {name: {count, sum, p50, p95, p99, max}}}
+    tracing.TRACER.prometheus()   # GET /metrics 的响应体
+
+TRACING=off 时 span() 返回同一个空上下文管理器，count/observe 直接返回，几乎没有开销。
+调试输出走 logging (logger.debug("...: %s", x))：DEBUG_LOG=off 时日志级别高于 DEBUG，
+调用在 isEnabledFor 处就返回，参数不会被格式化。
+"""
+import bisect
+import logging
+import sys
+import threading
+import time
+from collections import deque
+
+from .config import Config
+
+# 直方图桶上界 (秒)，覆盖从微秒级的单词校准到几十秒的 LLM 调用
+BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# 每个直方图保留最近多少个样本用来算分位数
+WINDOW = 2048
+
+# Prometheus 指标名前缀
+METRIC_PREFIX = "search_agent"
+
+
+class Histogram:
+    """累计分桶计数 (给 Prometheus) + 最近 WINDOW 个样本 (算 p50/p95/p99)；由 Tracer 的锁保护"""
+
+    __slots__ = ("counts", "count", "sum", "max", "recent")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=WINDOW)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+        self.recent.append(value)
+
+    def summary(self):
+        lat = sorted(self.recent)
+        pick = lambda q: round(lat[min(len(lat) - 1, int(q * len(lat)))] * 1000, 3) if lat else None
+        return {
+            "count": self.count,
+            "sum_ms": round(self.sum * 1000, 3),
+            "p50_ms": pick(0.50),
+            "p95_ms": pick(0.95),
+            "p99_ms": pick(0.99),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "start")
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer.observe(self.name, time.perf_counter() - self.start)
+        if exc_type is not None:
+            self.tracer.count(self.name + ".errors")
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """线程安全的计数器 + 直方图集合；enabled=False 时所有记录操作都是空操作"""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def span(self, name):
+        """计时上下文管理器，退出时把耗时记入直方图 name；异常退出另计 name.errors"""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, name)
+
+    def observe(self, name, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            hist = self.histograms.get(name)
+            if hist is None:
+                hist = self.histograms[name] = Histogram()
+            hist.observe(seconds)
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self):
+        """JSON 友好的汇总 (耗时单位毫秒)"""
+        with self._lock:
+            return {
+                "counters": dict(sorted(self.counters.items())),
+                "histograms": {name: h.summary() for name, h in sorted(self.histograms.items())},
+            }
+
+    def prometheus(self):
+        """Prometheus 文本格式 (0.0.4)：计数器为 <name>_total，直方图单位秒"""
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = [(name, list(h.counts), h.count, h.sum) for name, h in sorted(self.histograms.items())]
+
+        lines = []
+        for name, value in counters:
+            metric = _metric_name(name) + "_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        for name, counts, total, seconds in histograms:
+            metric = _metric_name(name) + "_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, n in zip(BUCKETS, counts):
+                cumulative += n
+                lines.append(f'{metric}_bucket{{le="{bound:g}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {total}')
+            lines.append(f"{metric}_sum {seconds:.6f}")
+            lines.append(f"{metric}_count {total}")
+        return "\n".join(lines) + "\n"
+
+
+def _metric_name(name):
+    cleaned = "".join(ch if ch.isalnum() else "_" for ch in name)
+    return f"{METRIC_PREFIX}_{cleaned}"
+
+
+# 进程内全局的 Tracer，各模块直接用下面的模块级函数
+TRACER = Tracer(enabled=Config.TRACING)
+
+
+def span(name):
+    return TRACER.span(name)
+
+
+def observe(name, seconds):
+    TRACER.observe(name, seconds)
+
+
+def count(name, n=1):
+    TRACER.count(name, n)
+
+
+def _make_logger():
+    """调试日志：输出格式与原来的 print 一致 ([Debug] ...)，DEBUG_LOG=off 时整体关闭"""
+    log = logging.getLogger("search_agent")
+    if not log.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("[Debug] %(message)s"))
+        log.addHandler(handler)
+        log.propagate = False
+    log.setLevel(logging.DEBUG if Config.DEBUG_LOG else logging.WARNING)
+    return log
+
+
+logger = _make_logger()
+
+
+def set_debug(enabled):
+    """运行时打开/关闭调试日志 (例如服务端默认关闭)"""
+    logger.setLevel(logging.DEBUG if enabled else logging.WARNING)
@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.config import Config
+
+
+@pytest.fixture
+def kg_config(tmp_path, monkeypatch):
+    """让 Config 指向临时目录下的 KG 与缓存，不读写仓库里的 data/"""
+    monkeypatch.setattr(Config, "DATA_PATH", tmp_path / "kg.parquet")
+    monkeypatch.setattr(Config, "KG_CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(Config, "KG_SHARDS", [])
+    monkeypatch.setattr(Config, "GROUNDING_PROCESSES", 0)
+    monkeypatch.setattr(Config, "GROUNDING_MEMO", "off")
+    return Config
+
+
+@pytest.fixture
+def write_kg():
+    """把 (subject, relation, object) 三元组写成 KG parquet"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    def write(path, triples):
+        subjects, relations, objects = zip(*triples)
+        table = pa.table({"subject": list(subjects), "relation": list(relations), "object": list(objects)})
+        pq.write_table(table, path)
+        return path
+
+    return write
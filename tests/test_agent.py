@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from server import AgentService
+from src.agent import SearchAgent
+
+
+@pytest.fixture
+def agent(kg_config, write_kg, monkeypatch):
+    write_kg(kg_config.DATA_PATH, [("Granite", "is_a", "Igneous rock")])
+    monkeypatch.setattr(kg_config, "INTENT_CACHE", "off")
+    agent = SearchAgent(searcher=lambda keyword: (0, []))
+    yield agent
+    agent.close()
+
+
+def test_abatch_captures_per_query_errors(agent, monkeypatch):
+    async def aparse(query, search=False, stream=False):
+        if query == "bad":
+            raise RuntimeError("boom")
+        return {"query": query}
+
+    monkeypatch.setattr(agent, "aparse", aparse)
+    assert asyncio.run(agent.abatch(["a", "bad", "b"])) == [
+        {"query": "a"}, {"query": "bad", "error": "boom"}, {"query": "b"}]
+
+
+def test_service_reports_batch_errors(agent, monkeypatch):
+    async def abatch(queries, search=False, stream=False):
+        return [{"query": q, "error": "boom"} if q == "bad" else
+                {"results": {"papers": [1, 2, 3], "scores": [3, 2, 1]}} for q in queries]
+
+    monkeypatch.setattr(agent, "abatch", abatch)
+    service = AgentService(agent)
+    try:
+        body = service.handle("/search", {"queries": ["ok", "bad"], "limit": 2})
+        assert body == {"results": [{"results": {"papers": [1, 2], "scores": [3, 2]}},
+                                    {"query": "bad", "error": "boom"}]}
+        with pytest.raises(RuntimeError, match="boom"):
+            service.handle("/search", {"query": "bad"})
+    finally:
+        service.close()
+
+
+def tracked_client(agent, closed):
+    """在当前事件循环上取异步 LLM 客户端，并记录它什么时候被 aclose"""
+    client = agent._async_llm()
+    original = client.aclose
+
+    async def aclose():
+        closed.append(client)
+        await original()
+
+    client.aclose = aclose
+    return client
+
+
+def test_batch_closes_its_llm_client(agent, monkeypatch):
+    clients, closed = [], []
+
+    async def abatch(queries, **kwargs):
+        clients.append(tracked_client(agent, closed))
+        return []
+
+    monkeypatch.setattr(agent, "abatch", abatch)
+    agent.batch(["a"])
+    agent.batch(["b"])
+    assert len(clients) == 2 and clients[0] is not clients[1]
+    assert closed == clients
+    assert agent._allm is None
+
+
+def test_client_on_a_running_loop_is_closed_when_replaced(agent):
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    closed = []
+
+    async def take():
+        return tracked_client(agent, closed)
+
+    try:
+        old = asyncio.run_coroutine_threadsafe(take(), loop).result(5)
+        new = asyncio.run(take())
+        deadline = time.time() + 5
+        while not closed and time.time() < deadline:
+            time.sleep(0.01)
+        assert closed == [old] and agent._allm is new
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(5)
+        loop.close()
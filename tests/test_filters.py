@@ -0,0 +1,31 @@
+import pytest
+
+from src import filters as paper_filters
+from src.agent import SearchAgent
+from src.results import ResultSet
+
+
+def paper(year, author=None, institution=None):
+    p = {"publication_year": year}
+    if author or institution:
+        p["authorships"] = [{"author": {"display_name": author or ""},
+                             "institutions": [{"display_name": institution}] if institution else []}]
+    return p
+
+
+@pytest.mark.parametrize("value, expected", [
+    (2020, 2020), ("2020", 2020), (" 2019 ", 2019), (2018.0, 2018),
+    ("2020s", None), ("recent", None), (2019.5, None), (True, None), ("", None), (None, None), ([2020], None),
+])
+def test_parse_year(value, expected):
+    assert paper_filters.parse_year(value) == expected
+
+
+def test_build_output_drops_unparsable_years():
+    intent = {"keywords": ["granite"], "year_start": "2020s", "year_end": "2022", "author": "  ", "institution": 3}
+    filters = SearchAgent._build_output(intent, ["granite"], ["granite"])["filters"]
+    assert filters == {"institution": None, "author": None, "year_start": None, "year_end": 2022}
+
+    papers = [paper(2019), paper(2023), paper(None)]
+    assert [paper_filters.matches(p, filters) for p in papers] == [True, False, False]
+    assert ResultSet(papers).filter(filters).papers == [papers[0]]
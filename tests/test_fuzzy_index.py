@@ -0,0 +1,75 @@
+import random
+
+import numpy as np
+import pytest
+from fuzzywuzzy import fuzz, process
+
+from src.fuzzy_index import NgramIndex, normalize
+from src.kg_linker import KGLinker
+
+
+def granite_vocab():
+    """审阅里的例子：一千个 "Granite xxx dating" 加一个 "Zircon" """
+    rng = random.Random(7)
+    names = {"".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(3)) for _ in range(1000)}
+    return [f"Granite {name} dating" for name in sorted(names)] + ["Zircon", "Granite iro dating"]
+
+
+def random_vocab(seed, size=600):
+    """字母表很小的随机词：大量同分、重复 token、标点和预处理后为空的词"""
+    rng = random.Random(seed)
+    alphabet = rng.choice(["ab ", "abc  -", "abcd e", "xyz w-"])
+    vocab = ["".join(rng.choice(alphabet) for _ in range(rng.randint(1, 20))) for _ in range(size)]
+    return vocab + ["--", "ab", "ab"], alphabet, rng
+
+
+@pytest.mark.parametrize("query", ["granite zircon dating", "zircon granite dating", "granite iro datng",
+                                   "dating granite", "Zr", "zircon"])
+def test_extract_one_matches_linear_scan(query):
+    vocab = granite_vocab()
+    assert NgramIndex.build(vocab).extract_one(query) == process.extractOne(query, vocab)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_extract_one_matches_linear_scan_random(seed):
+    vocab, alphabet, rng = random_vocab(seed)
+    index = NgramIndex.build(vocab)
+    for _ in range(30):
+        query = "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 24)))
+        if not normalize(query):
+            continue
+        cutoff = rng.choice([0, 60, 85])
+        assert index.extract_one(query, cutoff) == process.extractOne(query, vocab, score_cutoff=cutoff), query
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_bounds_are_upper_bounds(seed):
+    vocab, alphabet, rng = random_vocab(seed, size=300)
+    index = NgramIndex.build(vocab)
+    processed = [normalize(term) for term in vocab]
+    for _ in range(10):
+        query = normalize("".join(rng.choice(alphabet) for _ in range(rng.randint(3, 24))))
+        if len(query) < 3:
+            continue
+        ids, bounds, rest = index.bounds(query)
+        upper = np.full(len(vocab), rest, dtype=np.float64)
+        upper[ids] = bounds
+        for term_id, term in enumerate(processed):
+            if term:
+                assert fuzz.WRatio(query, term, full_process=False) <= upper[term_id], (query, term)
+
+
+def test_extract_batch_matches_extract_one():
+    vocab = granite_vocab()
+    index = NgramIndex.build(vocab)
+    queries = ["granite zircon dating", "zircon", "granit abc datin", "Qz", "", "zzzz"]
+    assert index.extract_batch(queries, score_cutoff=85) == [index.extract_one(q, 85) for q in queries]
+
+
+def test_ground_keywords_matches_ground_keyword(kg_config, write_kg):
+    vocab = granite_vocab()
+    write_kg(kg_config.DATA_PATH, [(term, "related_to", "Zircon") for term in vocab])
+    linker = KGLinker()
+    keywords = ["granite zircon dating", "Zircon", "granite iro datng", "unrelated", "Zr",
+                "zircon granite dating", "granite iro datng", ""]
+    assert linker.ground_keywords(keywords) == [linker.ground_keyword(kw) for kw in keywords]
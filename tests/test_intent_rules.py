@@ -0,0 +1,44 @@
+import pytest
+
+from src.intent_rules import RECENT_YEAR, RuleIntentParser
+from src.kg_snapshot import TermTable
+
+VOCAB = TermTable.from_terms(["Basalt", "Granite", "Plate tectonics", "Zircon", "Origin of granite"])
+
+
+@pytest.fixture
+def rules():
+    return RuleIntentParser(VOCAB, current_year=2024)
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("Basalt papers from 2023", {"keywords": ["Basalt"], "year_start": 2023, "year_end": None}),
+    ("Find papers about Granite from MIT",
+     {"keywords": ["Granite"], "institution": "Massachusetts Institute of Technology"}),
+    ("plate tectonics between 2010 and 2015", {"keywords": ["Plate tectonics"], "year_start": 2010,
+                                                 "year_end": 2015}),
+    ("recent zircons", {"keywords": ["Zircon"], "year_start": RECENT_YEAR}),
+    ("最近三年 中科院 关于 Basalt 的论文", {"keywords": ["Basalt"], "year_start": 2022,
+                                   "institution": "Chinese Academy of Sciences"}),
+])
+def test_local_intent_has_llm_fields(rules, query, expected):
+    intent = rules.route(query)
+    # 与 LLM 输出的字段完全一致，没给出的字段为 None
+    assert intent == {"keywords": [], "institution": None, "author": None, "year_start": None,
+                      "year_end": None, **expected}
+
+
+@pytest.mark.parametrize("query", [
+    "Granite papers by John Smith",       # 作者交给 LLM
+    "Granite and unknown mineral",        # 有片段不在词表里
+    "papers from 2020",                   # 没有关键词
+    "",
+])
+def test_uncertain_queries_fall_back_to_llm(rules, query):
+    assert rules.route(query) is None
+
+
+def test_route_counts(rules):
+    rules.route("Basalt")
+    rules.route("Basalt by someone")
+    assert rules.stats() == {"local": 1, "llm": 1, "local_ratio": 0.5}
@@ -0,0 +1,43 @@
+import json
+import random
+
+import pytest
+
+from src.json_stream import StreamingJSONObject
+
+INTENTS = [
+    '{"keywords": ["Granite", "Plate tectonics"], "institution": null, "author": null, '
+    '"year_start": 2020, "year_end": null}',
+    '```json\n{"keywords": ["a \\"quoted\\" {brace}", "back\\\\slash"], "filters": {"nested": [1, {"x": "}"}]},'
+    ' "year_start": -1.5e3, "ok": true}\n```',
+    '{ "keywords" : "single" , "empty": {}, "list": [] }',
+]
+
+
+def feed_in_chunks(text, rng):
+    parser = StreamingJSONObject()
+    completed = []
+    pos = 0
+    while pos < len(text):
+        size = rng.randint(1, 7)
+        completed += parser.feed(text[pos:pos + size])
+        pos += size
+    return parser, completed
+
+
+@pytest.mark.parametrize("text", INTENTS)
+@pytest.mark.parametrize("seed", range(5))
+def test_streamed_fields_equal_full_parse(text, seed):
+    parser, completed = feed_in_chunks(text, random.Random(seed))
+    expected = json.loads(text.replace("```json", "").replace("```", ""))
+    assert parser.result() == expected
+    assert dict(completed) == expected
+    assert [key for key, _ in completed] == list(expected)
+
+
+def test_truncated_object_keeps_completed_fields():
+    parser = StreamingJSONObject()
+    completed = parser.feed('{"keywords": ["Basalt"], "institution": "Massachusetts Inst')
+    assert completed == [("keywords", ["Basalt"])]
+    assert parser.result() is None
+    assert parser.fields == {"keywords": ["Basalt"]}
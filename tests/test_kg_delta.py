@@ -0,0 +1,78 @@
+import numpy as np
+
+from src import kg_snapshot
+from src.kg_graph import GRAPH_ARRAYS
+from src.kg_linker import KGLinker
+from src.kg_snapshot import INDEX_ARRAYS
+
+BASE = [
+    ("Basalt", "is_a", "Igneous rock"),
+    ("Granite", "is_a", "Igneous rock"),
+    ("Zircon", "found_in", "Granite"),
+    ("Quartz", "found_in", "Granite"),
+]
+SHARDS = [
+    [("Andesite", "is_a", "Igneous rock"), ("Zircon", "found_in", "Andesite"), ("Olivine", "related_to", "Basalt")],
+    [("Peridotite", "is_a", "Ultramafic rock"), ("Olivine", "found_in", "Peridotite"),
+     ("Granite", "is_a", "Igneous rock")],
+]
+
+
+def neighbor_terms(linker, term):
+    """按词 (而不是下标) 比较邻接关系，增量层和全量构建的下标不同"""
+    node = linker.vocab.find(term)
+    return sorted((direction, linker.vocab[other])
+                  for direction in ("out", "in") for other in linker.graph.neighbors(node, direction=direction))
+
+
+def ingest_shards(kg_config, write_kg, tmp_path):
+    write_kg(kg_config.DATA_PATH, BASE)
+    paths = [write_kg(tmp_path / f"s{i}.parquet", shard) for i, shard in enumerate(SHARDS)]
+    linker = KGLinker()
+    assert linker.ingest(paths) == paths
+    return linker
+
+
+def full_build(write_kg, tmp_path):
+    path = write_kg(tmp_path / "full.parquet", BASE + [t for shard in SHARDS for t in shard])
+    return kg_snapshot.build(path)
+
+
+def test_delta_layers_match_full_build(kg_config, write_kg, tmp_path):
+    linker = ingest_shards(kg_config, write_kg, tmp_path)
+    terms, _, _ = full_build(write_kg, tmp_path)
+    assert len(linker.layers) == 3
+    assert sorted(linker.vocab) == list(terms)
+    # 增量层只有新词；旧词之间的新边 (Olivine -> Basalt 中的 Basalt) 指向基础层的下标
+    assert list(linker.layers[1].terms) == ["Andesite", "Olivine"]
+    assert neighbor_terms(linker, "Basalt") == [("in", "Olivine"), ("out", "Igneous rock")]
+    assert neighbor_terms(linker, "Olivine") == [("out", "Basalt"), ("out", "Peridotite")]
+    assert neighbor_terms(linker, "Granite") == [("in", "Quartz"), ("in", "Zircon"), ("out", "Igneous rock"),
+                                                 ("out", "Igneous rock")]
+
+
+def test_compact_matches_full_build(kg_config, write_kg, tmp_path):
+    linker = ingest_shards(kg_config, write_kg, tmp_path)
+    linker.compact()
+    terms, index, graph = full_build(write_kg, tmp_path)
+    assert len(linker.layers) == 1
+    assert list(linker.vocab) == list(terms)
+    for name in INDEX_ARRAYS:
+        np.testing.assert_array_equal(getattr(linker.index, name), getattr(index, name), err_msg=name)
+    assert linker.graph.relations == graph.relations
+    for name in GRAPH_ARRAYS:
+        np.testing.assert_array_equal(getattr(linker.graph, name), getattr(graph, name), err_msg=name)
+
+
+def test_grounding_pool_uses_delta_layers(kg_config, write_kg, tmp_path, monkeypatch):
+    linker = ingest_shards(kg_config, write_kg, tmp_path)
+    keywords = ["Peridotit", "Olivin", "Basalt", "Andesit", "granite", "unrelated"]
+    expected = linker.ground_keywords(keywords)
+    monkeypatch.setattr(kg_config, "GROUNDING_MIN_BATCH", 1)
+    linker.processes = 2
+    try:
+        assert linker.ground_keywords(keywords) == expected
+        assert linker._pool is not None
+    finally:
+        linker.close()
+    assert expected[:4] == ["Peridotite", "Olivine", "Basalt", "Andesite"]
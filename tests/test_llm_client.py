@@ -0,0 +1,100 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from src import intent_cache
+from src.config import Config
+from src.llm_client import INTENT_PROMPT_HASH, AsyncLLMClient, LLMClient, parse_intent
+
+INVALID_REPLIES = ['{"keywords": 42}', '["granite"]', '{"filters": {}}', 'not json']
+
+
+def reply(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def stream_reply(content, size=5):
+    return [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content[i:i + size]))])
+            for i in range(0, len(content), size)]
+
+
+class FakeCompletions:
+    def __init__(self, content):
+        self.content = content
+        self.calls = 0
+
+    def create(self, stream=False, **kwargs):
+        self.calls += 1
+        return stream_reply(self.content) if stream else reply(self.content)
+
+
+class FakeAsyncCompletions(FakeCompletions):
+    async def create(self, stream=False, **kwargs):
+        self.calls += 1
+        if not stream:
+            return reply(self.content)
+
+        async def chunks():
+            for chunk in stream_reply(self.content):
+                yield chunk
+        return chunks()
+
+
+def memory_cache():
+    return intent_cache.IntentCache(intent_cache.MemoryBackend())
+
+
+def sync_client(content):
+    llm = LLMClient(cache=memory_cache())
+    completions = FakeCompletions(content)
+    llm._client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return llm, completions
+
+
+@pytest.mark.parametrize("content", INVALID_REPLIES)
+def test_parse_intent_rejects_invalid(content):
+    assert parse_intent(content) is None
+
+
+@pytest.mark.parametrize("content", INVALID_REPLIES)
+@pytest.mark.parametrize("stream", [False, True])
+def test_invalid_intent_falls_back_uncached(content, stream):
+    llm, _ = sync_client(content)
+    fields = []
+    extract = (lambda q: llm.extract_intent_stream(q, lambda k, v: fields.append((k, v)))) if stream \
+        else llm.extract_intent
+    assert extract("granite dating") == {"keywords": ["granite dating"]}
+    assert len(llm.cache.backend) == 0
+    if stream:
+        # keywords 恰好回调一次，而且是降级后的值
+        assert [v for k, v in fields if k == "keywords"] == [["granite dating"]]
+
+
+@pytest.mark.parametrize("content", INVALID_REPLIES)
+def test_async_invalid_intent_falls_back_uncached(content):
+    async def run():
+        llm = AsyncLLMClient(cache=memory_cache())
+        llm.client = SimpleNamespace(chat=SimpleNamespace(completions=FakeAsyncCompletions(content)))
+        try:
+            return (await llm.extract_intent("granite"), await llm.extract_intent_stream("granite"),
+                    len(llm.cache.backend))
+        finally:
+            await llm.http_client.aclose()
+
+    assert asyncio.run(run()) == ({"keywords": ["granite"]}, {"keywords": ["granite"]}, 0)
+
+
+def test_valid_intent_is_cached():
+    llm, completions = sync_client('{"keywords": ["granite"], "filters": {}}')
+    assert llm.extract_intent("granite") == {"keywords": ["granite"], "filters": {}}
+    assert llm.extract_intent("granite") == {"keywords": ["granite"], "filters": {}}
+    assert completions.calls == 1
+
+
+def test_invalid_cached_intent_is_a_miss():
+    llm, completions = sync_client('{"keywords": ["granite"]}')
+    llm.cache.set(intent_cache.make_key("granite", Config.MODEL_NAME, INTENT_PROMPT_HASH), {"keywords": 42})
+    assert llm.extract_intent("granite") == {"keywords": ["granite"]}
+    assert completions.calls == 1
@@ -0,0 +1,22 @@
+import hashlib
+
+import pytest
+
+from src.llm_client import INTENT_PROMPT_TEMPLATE, batch_prompt
+
+# 原来 extract_intent 里用 f-string 渲染的 Prompt 的 sha256：模板化之后必须逐字节相同，
+# 否则意图缓存键 (INTENT_PROMPT_HASH) 变化，已有缓存全部失效
+ORIGINAL_PROMPT_SHA256 = {
+    "granite from MIT since 2015": "da6e81dc8fc5da074cdc39969fe694f1b2eee71492bdb28591000483d04777f1",
+    '帮我找关于"板块构造"的论文': "4d79e337eb63d2a4f8d5f5f421b5632a5c2c4940e8372ce9e9cbd307307518da",
+}
+
+
+@pytest.mark.parametrize("query, digest", ORIGINAL_PROMPT_SHA256.items())
+def test_single_prompt_is_byte_identical_to_original(query, digest):
+    assert hashlib.sha256(INTENT_PROMPT_TEMPLATE.format(user_query=query).encode("utf-8")).hexdigest() == digest
+
+
+def test_batch_prompt_lists_every_query_with_its_id():
+    prompt = batch_prompt(["granite", '"quoted" 板块'])
+    assert '[{"id": 0, "query": "granite"}, {"id": 1, "query": "\\"quoted\\" 板块"}]' in prompt
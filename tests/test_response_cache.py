@@ -0,0 +1,47 @@
+import time
+
+from src.response_cache import ResponseCache, make_key
+
+DATA = {"total": 2, "data": [{"title": "花岗岩 granite", "publication_year": 2020}, {"title": None}]}
+
+
+def test_make_key_ignores_parameter_order():
+    assert make_key({"keyword": "Granite", "page": 1, "size": 20}) == make_key({"size": 20, "page": 1,
+                                                                                 "keyword": "Granite"})
+    assert make_key({"keyword": "Granite", "page": 1}) != make_key({"keyword": "Granite", "page": 2})
+
+
+def test_disk_layer_round_trips_entries(tmp_path):
+    path = tmp_path / "acemap.sqlite"
+    ResponseCache(ttl=60, disk_path=path).set("k", DATA, etag='"v1"', last_modified="Mon")
+    entry = ResponseCache(ttl=60, disk_path=path).get("k")
+    assert entry.data == DATA
+    assert (entry.etag, entry.last_modified) == ('"v1"', "Mon")
+    assert entry.is_fresh() and entry.can_revalidate()
+
+
+def test_memory_lru_and_refresh(tmp_path):
+    cache = ResponseCache(max_entries=2, ttl=0.05)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None and cache.get("a").data == 1 and len(cache) == 2
+
+    entry = cache.get("a")
+    time.sleep(0.06)
+    assert not entry.is_fresh()
+    cache.ttl = 60
+    cache.refresh("a", entry)
+    assert cache.get("a").is_fresh() and cache.get("a").data == 1
+
+
+def test_disk_layer_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(max_entries=1, ttl=60, disk_path=tmp_path / "c.sqlite", max_disk_entries=2)
+    cache.set("a", 1)
+    time.sleep(0.01)
+    cache.set("b", 2)
+    time.sleep(0.01)
+    cache.set("c", 3)
+    reopened = ResponseCache(ttl=60, disk_path=tmp_path / "c.sqlite")
+    assert reopened.get("a") is None and reopened.get("b").data == 2 and reopened.get("c").data == 3
@@ -0,0 +1,48 @@
+import random
+
+import numpy as np
+import pytest
+
+from src import filters as paper_filters
+from src.results import NAMES_VECTORIZE_MIN, YEAR_VECTORIZE_MIN, ResultSet, top_indices
+
+FILTERS = [
+    {"year_start": 2019},
+    {"year_end": 2020},
+    {"author": "li"},
+    {"institution": "TSINGHUA"},
+    {"year_start": 2016, "year_end": 2022, "author": "li", "institution": "univ"},
+]
+
+
+def make_papers(n, seed=0):
+    """字段不规整的论文：年份缺失/是字符串，authorships 缺失/为空/名字为 None"""
+    rng = random.Random(seed)
+    papers = []
+    for i in range(n):
+        paper = {"title": f"paper {i}", "publication_year": rng.choice([None, 2015, 2019, 2021, "2023", ""]),
+                 "cited_by_count": rng.choice([None, 0, 3, 250])}
+        kind = rng.randrange(4)
+        if kind:
+            paper["authorships"] = [
+                {"author": {"display_name": rng.choice(["Li Wei", "Zhang San", None])},
+                 "institutions": [{"display_name": rng.choice(["Tsinghua University", "MIT", None])}]}
+                for _ in range(kind - 1)
+            ]
+        papers.append(paper)
+    return papers
+
+
+@pytest.mark.parametrize("n", [20, YEAR_VECTORIZE_MIN + 50, NAMES_VECTORIZE_MIN * 3])
+@pytest.mark.parametrize("filters", FILTERS)
+def test_filter_matches_scalar_filters(n, filters):
+    papers = make_papers(n)
+    expected = [p for p in papers if paper_filters.matches(p, filters)]
+    assert list(ResultSet(papers).mask(filters)) == [paper_filters.matches(p, filters) for p in papers]
+    assert ResultSet(papers).filter(filters).papers == expected
+
+
+@pytest.mark.parametrize("k", [0, 1, 5, 40])
+def test_top_indices_is_stable_sort(k):
+    values = np.array([3, 1, 3, 2, 3, 1, 2, 0] * 4)
+    assert list(top_indices(values, k)) == list(np.argsort(-values, kind="stable")[:k])
@@ -0,0 +1,62 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.single_flight import AsyncSingleFlight, SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight("test")
+    calls = []
+    release = threading.Event()
+
+    def work(x):
+        calls.append(x)
+        release.wait(5)
+        return {"value": x}
+
+    with ThreadPoolExecutor(8) as pool:
+        futures = [pool.submit(flight.do, "key", work, 1) for _ in range(8)]
+        deadline = time.time() + 5
+        while flight.leaders + flight.shared < 8 and time.time() < deadline:
+            time.sleep(0.01)
+        release.set()
+        results = [f.result() for f in futures]
+
+    assert calls == [1]
+    assert all(r is results[0] for r in results) and results[0] == {"value": 1}
+    assert flight.stats() == {"executed": 1, "shared": 7, "shared_ratio": 0.875}
+    # 结果返回后键就释放，下一次调用重新执行
+    assert flight.do("key", work, 2) == {"value": 2} and calls == [1, 2]
+
+
+def test_exceptions_are_shared_and_key_released():
+    flight = SingleFlight("test")
+    with pytest.raises(ValueError):
+        flight.do("key", lambda: (_ for _ in ()).throw(ValueError("boom")))
+    assert flight.do("key", lambda: 3) == 3
+
+
+def test_async_calls_share_one_task_and_survive_cancellation():
+    flight = AsyncSingleFlight("test")
+    calls = []
+
+    async def work(x):
+        calls.append(x)
+        await asyncio.sleep(0.05)
+        return x * 2
+
+    async def run():
+        waiters = [asyncio.ensure_future(flight.do("key", work, 21)) for _ in range(4)]
+        await asyncio.sleep(0.01)
+        # 一个等待者被取消不影响共享的任务和其它等待者
+        waiters[0].cancel()
+        results = await asyncio.gather(*waiters[1:])
+        return results, await flight.do("key", work, 1)
+
+    results, again = asyncio.run(run())
+    assert results == [42, 42, 42] and again == 2
+    assert calls == [21, 1]